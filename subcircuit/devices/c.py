@@ -15,6 +15,8 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import numpy as np
+
 import subcircuit.interfaces as inter
 import subcircuit.sandbox as sb
 
@@ -78,17 +80,25 @@ class C(inter.MNADevice):
         self.port2node = {0: self.get_node_index(npos),
                           1: self.get_node_index(nneg)}
 
+    def update(self):
+        g = self.value / self.netlist.dt
+        self.jac[0, 0] = g
+        self.jac[0, 1] = -g
+        self.jac[1, 0] = -g
+        self.jac[1, 1] = g
+
     def start(self, dt):
-        self.jac[0, 0] = self.value / dt
-        self.jac[0, 1] = -self.value / dt
-        self.jac[1, 0] = -self.value / dt
-        self.jac[1, 1] = self.value / dt
+        self.update()
 
     def step(self, dt, t):
         vc = self.get_across_history(0, 1)
         self.bequiv[0] = self.value / dt * vc
         self.bequiv[1] = -self.value / dt * vc
 
+    def get_linear_stamp(self):
+        c = self.value * np.array([[1.0, -1.0], [-1.0, 1.0]])
+        return np.zeros((2, 2)), c
+
 
 class CBlock(sb.Block):
     """Schematic graphical inteface for L device."""
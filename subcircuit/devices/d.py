@@ -24,6 +24,8 @@ import subcircuit.sandbox as sb
 class D(inter.MNADevice):
     """Represents a SPICE Diode device."""
 
+    nonlinear = True
+
     def __init__(self, nodes, model=None, area=None, off=None,
                  ic=None, temp=None, **parameters):
         """
@@ -56,6 +56,9 @@ class I(inter.MNADevice):
         current = 0.0
         if self.stimulus:
             current = self.stimulus.start(dt)
+            times = self.netlist.simulator.trans_time
+            if times is not None:
+                self.stimulus.prerender(dt, times)
         elif self.value:
             current = self.value
 
@@ -66,7 +69,7 @@ class I(inter.MNADevice):
         """Step the current source.
         """
         if self.stimulus:
-            current = self.stimulus.step(dt, t)
+            current = self.stimulus.value(dt, t)
         else:
             current = self.value
 
@@ -17,6 +17,8 @@ limitations under the License.
 
 import math
 
+import numpy as np
+
 import subcircuit.interfaces as inter
 import subcircuit.sandbox as sb
 
@@ -69,7 +71,10 @@ class L(inter.MNADevice, inter.CurrentSensor):
         self.jac[1, 2] = -1.0
         self.jac[2, 0] = 1.0
         self.jac[2, 1] = -1.0
-        self.jac[2, 2] = -(self.res + self.value / dt)
+        self.update()
+
+    def update(self):
+        self.jac[2, 2] = -(self.res + self.value / self.netlist.dt)
 
     def step(self,  dt, t):
         inductor_current = self.get_across_history(2)
@@ -78,6 +83,17 @@ class L(inter.MNADevice, inter.CurrentSensor):
     def get_current_node(self):
         return self.port2node[2], 1.0
 
+    def get_linear_stamp(self):
+        g = np.zeros((3, 3))
+        c = np.zeros((3, 3))
+        g[0, 2] = 1.0
+        g[1, 2] = -1.0
+        g[2, 0] = -1.0
+        g[2, 1] = 1.0
+        g[2, 2] = self.res
+        c[2, 2] = self.value
+        return g, c
+
 
 class LBlock(sb.Block):
     """Schematic graphical inteface for L device."""
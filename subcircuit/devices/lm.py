@@ -0,0 +1,100 @@
+"""LM (multi-winding coupled inductor) device.
+
+Copyright 2014 Joe Hood
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+import subcircuit.interfaces as inter
+
+
+class LM(inter.MNADevice, inter.CurrentSensor):
+    """Coupled inductor with N windings defined by an inductance matrix"""
+
+    def __init__(self, nodes, value, res=0.0, **parameters):
+        """
+        General form:
+        LM((N1+, N1-, N2+, N2-, ...), [[L11, L12, ...], [L21, L22, ...], ...])
+        Examples:
+        LM((1, 0, 2, 0), [[2000.0, 599.9], [599.9, 200.0]])
+        N1+, N1- ... are the positive and negative nodes of each winding (the
+        'dot' is on the positive node). VALUE is the NxN inductance matrix in
+        Henries: the diagonal holds the self inductances and the off-diagonal
+        terms the mutual inductances (M = K * sqrt(Li * Lj)). RES is the
+        winding resistance, either one value for all windings or a sequence
+        with one value per winding.
+
+        This replaces the L + K device combination for transformers with more
+        than two windings: all branch equations are stamped in one block
+        instead of N(N-1)/2 coupling devices.
+        """
+        value = np.array(value, dtype=float)
+        self.windings = value.shape[0]
+
+        if value.shape != (self.windings, self.windings):
+            raise ValueError("LM inductance matrix must be square.")
+
+        if len(nodes) != 2 * self.windings:
+            raise ValueError("LM requires two nodes per winding.")
+
+        inter.MNADevice.__init__(self, nodes, self.windings, **parameters)
+
+        self.value = value
+
+        self.res = np.zeros(self.windings)
+        self.res[:] = res
+
+        n = self.windings
+        self.positive = np.arange(0, 2 * n, 2)
+        self.negative = np.arange(1, 2 * n, 2)
+        self.currents = np.arange(2 * n, 3 * n)
+        self.current_nodes = None
+
+    def connect(self):
+        self.port2node = {}
+        for i, node in enumerate(self.nodes):
+            self.port2node[i] = self.get_node_index(node)
+        for k, port in enumerate(self.currents):
+            internal = "{0}_int{1}".format(self.name, k)
+            self.port2node[port] = self.create_internal(internal)
+
+    def start(self, dt):
+        i = self.currents
+        self.current_nodes = [self.port2node[port] for port in i]
+
+        self.jac[self.positive, i] = 1.0
+        self.jac[self.negative, i] = -1.0
+        self.jac[i, self.positive] = 1.0
+        self.jac[i, self.negative] = -1.0
+        self.jac[np.ix_(i, i)] = -(np.diag(self.res) + self.value / dt)
+
+    def step(self, dt, t):
+        currents = self.netlist.across_history[self.current_nodes]
+        self.bequiv[self.currents, 0] = -self.value.dot(currents) / dt
+
+    def get_current_node(self, winding=0):
+        return self.port2node[self.currents[winding]], 1.0
+
+    def get_linear_stamp(self):
+        i = self.currents
+        g = np.zeros((self.nnodes, self.nnodes))
+        c = np.zeros((self.nnodes, self.nnodes))
+        g[self.positive, i] = 1.0
+        g[self.negative, i] = -1.0
+        g[i, self.positive] = -1.0
+        g[i, self.negative] = 1.0
+        g[np.ix_(i, i)] = np.diag(self.res)
+        c[np.ix_(i, i)] = self.value
+        return g, c
@@ -24,6 +24,8 @@ import subcircuit.sandbox as sb
 class Q(inter.MNADevice):
     """Bipolar Junction Transistor (BJT)"""
 
+    nonlinear = True
+
     def __init__(self, nodes, model=None, pnp=False, area=None, off=True, ic=None,
                  temp=None, **parameters):
 
@@ -12,7 +12,8 @@ class LimBranch(qdl.Device):
 
     """QSS LIM Branch Device"""
 
-    def __init__(self, nodes, name, l, r=0.0, e=0.0, i0=0.0, dq=1e-4, **parameters):
+    def __init__(self, nodes, name, l, r=0.0, e=0.0, i0=0.0, dq=1e-4,
+                 atom_type=qdl.StateAtom, **parameters):
 
         self.l = l
         self.r = r
@@ -21,7 +22,7 @@ class LimBranch(qdl.Device):
 
         self.e = qdl.SourceAtom("e", u0=e, dq=dq, units="V")
 
-        self.current = qdl.StateAtom("current", x0=i0, coeffunc=self.aii, dq=dq, units="A")
+        self.current = atom_type("current", x0=i0, coeffunc=self.aii, dq=dq, units="A")
 
         self.add_atoms(self.e, self.current)
 
@@ -27,7 +27,8 @@ class LimNode(qdl.Device):
 
     """QSS LIM Node Device"""
 
-    def __init__(self, nodes, name, c, g=0.0, h=0.0, v0=0.0, dq=1e-4, **parameters):
+    def __init__(self, nodes, name, c, g=0.0, h=0.0, v0=0.0, dq=1e-4,
+                 atom_type=qdl.StateAtom, **parameters):
 
         self.c = c
         self.g = g
@@ -36,7 +37,7 @@ class LimNode(qdl.Device):
 
         self.h = qdl.SourceAtom("h", u0=h, dq=dq, units="A")
 
-        self.voltage = qdl.StateAtom("voltage", x0=v0, coeffunc=self.aii, dq=dq, units="V")
+        self.voltage = atom_type("voltage", x0=v0, coeffunc=self.aii, dq=dq, units="V")
 
         self.add_atoms(self.h, self.voltage)
 
@@ -15,6 +15,8 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import numpy as np
+
 import subcircuit.interfaces as inter
 import subcircuit.sandbox as sb
 
@@ -71,6 +73,10 @@ class R(inter.MNADevice):
         """Do nothing here. Linear and time-invariant device."""
         pass
 
+    def get_linear_stamp(self):
+        self.update()
+        return self.jac.copy(), np.zeros((2, 2))
+
 
 class RBlock(sb.Block):
     """Schematic graphical inteface for R device."""
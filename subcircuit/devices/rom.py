@@ -0,0 +1,124 @@
+"""ROM (reduced order model) device.
+
+Copyright 2014 Joe Hood
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+import subcircuit.interfaces as inter
+import subcircuit.mathutils.mor as mor
+
+
+class ROM(inter.MNADevice):
+    """Reduced order model of a linear multi-port network."""
+
+    def __init__(self, nodes, g, c, b, order=None, s0=None, **parameters):
+        """Creates a state-space MNA device from the descriptor model:
+
+            g*x + c*dx/dt = b*i
+            v = b'*x
+
+        where i are the currents flowing into the device at each port and v
+        are the port voltages with respect to ground. Usually created by
+        Netlist.reduce() rather than directly.
+        :param nodes: external port nodes (one per column of b)
+        :param g: (n, n) conductance matrix
+        :param c: (n, n) capacitance/inductance matrix
+        :param b: (n, p) port incidence matrix
+        :param order: If provided, (g, c, b) is reduced to this many states
+        with PRIMA when the simulation starts. Otherwise (g, c, b) is used
+        as given.
+        :param s0: Krylov expansion point in 1/s. Defaults to 0.1/dt, the
+        band the time step resolves.
+        """
+        self.g = np.asarray(g, dtype=float)
+        self.c = np.asarray(c, dtype=float)
+        self.b = np.asarray(b, dtype=float)
+        self.order = order
+        self.s0 = s0
+
+        n, self.nports = self.b.shape
+        self.nstates = n
+        if order is not None:
+            self.nstates = min(n, order)
+
+        inter.MNADevice.__init__(self, nodes, self.nstates + self.nports,
+                                 **parameters)
+
+        p = self.nports
+        q = self.nstates
+        self.terminals = np.arange(p)
+        self.states = np.arange(p, p + q)
+        self.currents = np.arange(p + q, p + q + p)
+        self.state_nodes = None
+        self.gr = None
+        self.cr = None
+        self.br = None
+
+    def connect(self):
+        self.port2node = {}
+        for i, node in enumerate(self.nodes):
+            self.port2node[i] = self.get_node_index(node)
+        for i in range(self.nstates):
+            name = "{0}_x{1}".format(self.name, i)
+            self.port2node[self.states[i]] = self.create_internal(name)
+        for i in range(self.nports):
+            name = "{0}_i{1}".format(self.name, i)
+            self.port2node[self.currents[i]] = self.create_internal(name)
+
+    def reduce(self, dt):
+        """Reduces the full model to the allocated number of states. States
+        left over when the krylov space is exhausted early are decoupled
+        (x = 0).
+        """
+        if self.order is None:
+            self.gr, self.cr, self.br = self.g, self.c, self.b
+            return
+
+        s0 = self.s0
+        if s0 is None:
+            s0 = 0.1 / dt
+
+        gr, cr, br = mor.prima(self.g, self.c, self.b, self.nstates, s0)
+        k = br.shape[0]
+
+        self.gr = np.eye(self.nstates)
+        self.cr = np.zeros((self.nstates, self.nstates))
+        self.br = np.zeros((self.nstates, self.nports))
+        self.gr[:k, :k] = gr
+        self.cr[:k, :k] = cr
+        self.br[:k, :] = br
+
+    def start(self, dt):
+        x = self.states
+        i = self.currents
+
+        self.reduce(dt)
+        self.state_nodes = [self.port2node[k] for k in x]
+
+        # port currents leave the external nodes into the model:
+        self.jac[self.terminals, i] = 1.0
+
+        # state equations (backward euler):
+        self.jac[np.ix_(x, x)] = self.gr + self.cr / dt
+        self.jac[np.ix_(x, i)] = -self.br
+
+        # port voltage constraints:
+        self.jac[np.ix_(i, x)] = self.br.T
+        self.jac[i, self.terminals] = -1.0
+
+    def step(self, dt, t):
+        xh = self.netlist.across_history[self.state_nodes]
+        self.bequiv[self.states, 0] = self.cr.dot(xh) / dt
@@ -87,6 +87,8 @@ class S(inter.MNADevice, inter.CurrentSensor):
     RON = 1.0E-6
     ROFF = 1.0E6
 
+    nonlinear = True
+
     def __init__(self, nodes, model=None, vsource=None, on=False,
                  **parameters):
         """
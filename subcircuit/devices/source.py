@@ -22,6 +22,10 @@ import subcircuit.stimuli as stim
 
 
 class SignalSource(inter.SignalDevice):
+
+    outputs = (0,)
+    feedthrough = False
+
     def __init__(self, nodes, value, **parameters):
         inter.SignalDevice.__init__(self, nodes, **parameters)
 
@@ -45,13 +49,16 @@ class SignalSource(inter.SignalDevice):
     def start(self, dt):
         if self.stimulus:
             output = self.stimulus.start(dt)
+            times = self.netlist.simulator.trans_time
+            if times is not None:
+                self.stimulus.prerender(dt, times)
         else:
             output = self.value
         self.set_port_value(0, output)
 
     def step(self, dt, t):
         if self.stimulus:
-            output = self.stimulus.step(dt, t)
+            output = self.stimulus.value(dt, t)
         else:
             output = self.value
         self.set_port_value(0, output)
@@ -26,6 +26,8 @@ from subcircuit.mathutils.pprint import equ2bmp
 
 class Sum(inter.SignalDevice):
 
+    outputs = (0,)
+
     def __init__(self, nodes, signs=None, **parameters):
 
         inter.SignalDevice.__init__(self, nodes, **parameters)
@@ -0,0 +1,172 @@
+"""T (transmission line) device.
+
+Copyright 2014 Joe Hood
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+import subcircuit.interfaces as inter
+import subcircuit.sandbox as sb
+
+
+class T(inter.MNADevice):
+    """SPICE transmission line device (Bergeron model)"""
+
+    def __init__(self, nodes, z0, td=None, f=None, nl=0.25, r=0.0,
+                 **parameters):
+        """
+        General form:
+        TXXXXXXX N1 N2 N3 N4 Z0=VALUE <TD=VALUE> <F=FREQ <NL=NRMLEN>>
+        Examples:
+        T1 1 0 2 0 Z0=50 TD=10NS
+        N1 and N2 are the nodes at port 1; N3 and N4 are the nodes at port 2.
+        Z0 is the characteristic impedance. The length of the line may be
+        expressed in either of two forms. The transmission delay, TD, may be
+        specified directly (as TD=10ns, for example). Alternatively, a
+        frequency F may be given, together with NL, the normalized electrical
+        length of the transmission line with respect to the wavelength in the
+        line at the frequency F. If a frequency is specified but NL is
+        omitted, 0.25 is assumed (that is, the frequency is assumed to be the
+        quarter-wave frequency).
+
+        Non-standard:
+        R is the total series resistance of the line. When given, it is
+        lumped as R/4 at each end and R/2 at the middle of the line (the
+        EMTP approximation of a low-loss line).
+
+        The line is solved with the method of characteristics: each port is
+        a constant conductance 1/Zc in parallel with a history current
+        source computed from the waves that left the other end one delay
+        ago. The delay (TD) must be at least one timestep.
+        """
+        inter.MNADevice.__init__(self, nodes, 0, **parameters)
+
+        if td is None:
+            if f is None:
+                raise ValueError("T device requires either TD or F.")
+            td = nl / f
+
+        self.z0 = z0
+        self.td = td
+        self.r = r
+
+        self.zc = z0 + r / 4.0
+        self.h = (z0 - r / 4.0) / (z0 + r / 4.0)
+
+        self.delay = None  # whole timesteps of delay
+        self.frac = None  # fractional part of the delay
+        self.waves = None  # ring buffer of (v/Zc + h*i) for each end
+        self.head = 0  # buffer index of the most recent wave sample
+        self.ihist = np.zeros(2)  # history currents for the current step
+
+    def connect(self):
+        n1p, n1m, n2p, n2m = self.nodes
+        self.port2node = {0: self.get_node_index(n1p),
+                          1: self.get_node_index(n1m),
+                          2: self.get_node_index(n2p),
+                          3: self.get_node_index(n2m)}
+
+    def start(self, dt):
+        steps = self.td / dt
+        if steps < 1.0:
+            msg = ("Transmission line {0} delay ({1}s) is less than the "
+                   "timestep ({2}s).".format(self.name, self.td, dt))
+            raise ValueError(msg)
+
+        self.delay = int(steps)
+        self.frac = steps - self.delay
+        self.waves = np.zeros((self.delay + 2, 2))
+        self.head = 0
+
+        g = 1.0 / self.zc
+        for p, m in ((0, 1), (2, 3)):
+            self.jac[p, p] = g
+            self.jac[p, m] = -g
+            self.jac[m, p] = -g
+            self.jac[m, m] = g
+
+    def step(self, dt, t):
+        # waves at t - td, interpolated between the two samples around it:
+        n = len(self.waves)
+        w0 = self.waves[(self.head - self.delay + 1) % n]
+        w1 = self.waves[(self.head - self.delay) % n]
+        w = (1.0 - self.frac) * w0 + self.frac * w1
+
+        # w[0] is the wave leaving end 1, w[1] the wave leaving end 2:
+        a = 0.5 * (1.0 + self.h)
+        b = 0.5 * (1.0 - self.h)
+        self.ihist[0] = -a * w[1] - b * w[0]
+        self.ihist[1] = -a * w[0] - b * w[1]
+
+        self.bequiv[0] = -self.ihist[0]
+        self.bequiv[1] = self.ihist[0]
+        self.bequiv[2] = -self.ihist[1]
+        self.bequiv[3] = self.ihist[1]
+
+    def post_step(self, dt, t):
+        v = np.array((self.get_across(0, 1), self.get_across(2, 3)))
+        i = v / self.zc + self.ihist
+
+        self.head = (self.head + 1) % len(self.waves)
+        self.waves[self.head] = v / self.zc + self.h * i
+
+    def get_port_currents(self):
+        """Gets the currents flowing into the line at each end (from the
+        positive node) for the last solved timestep.
+        :return: (i1, i2) in Amps
+        """
+        v = np.array((self.get_across(0, 1), self.get_across(2, 3)))
+        return v / self.zc + self.ihist
+
+
+class TBlock(sb.Block):
+    """Schematic graphical inteface for T device."""
+    friendly_name = "Transmission Line"
+    family = "Elementary"
+    label = "T"
+    engine = T
+
+    symbol = sb.Symbol()
+
+    # leads:
+    symbol.lines.append(((0, 40), (20, 40)))
+    symbol.lines.append(((100, 40), (120, 40)))
+    symbol.lines.append(((0, 80), (20, 80)))
+    symbol.lines.append(((100, 80), (120, 80)))
+
+    # conductors:
+    symbol.lines.append(((20, 40), (100, 40)))
+    symbol.lines.append(((20, 80), (100, 80)))
+    symbol.rects.append((20, 50, 80, 20, 1))
+
+    def __init__(self, name):
+        # init super:
+        sb.Block.__init__(self, name, T)
+
+        # ports:
+        self.ports['positive 1'] = sb.Port(self, 0, (0, 40))
+        self.ports['negative 1'] = sb.Port(self, 1, (0, 80))
+        self.ports['positive 2'] = sb.Port(self, 2, (120, 40))
+        self.ports['negative 2'] = sb.Port(self, 3, (120, 80))
+
+        # properties:
+        self.properties['Impedance (Ohm)'] = 50.0
+        self.properties['Delay (s)'] = 0.001
+        self.properties['Resistance (Ohm)'] = 0.0
+
+    def get_engine(self, nodes):
+        return T(nodes, self.properties['Impedance (Ohm)'],
+                 td=self.properties['Delay (s)'],
+                 r=self.properties['Resistance (Ohm)'])
@@ -42,6 +42,9 @@ def sub_operators(expr):
 
 
 class TF(inter.SignalDevice):
+
+    outputs = (1,)
+
     def __init__(self, nodes, equation=None, **parameters):
         inter.SignalDevice.__init__(self, nodes, **parameters)
 
@@ -58,6 +61,10 @@ class TF(inter.SignalDevice):
             self.port2node = {0: self.get_node_index(input),
                               1: self.get_node_index(output)}
 
+    @property
+    def feedthrough(self):
+        return bool(np.any(self.tf.ss.d))
+
     def update(self):
         pass
 
@@ -72,6 +79,9 @@ class TF(inter.SignalDevice):
     def post_step(self, dt, t):
         pass
 
+    def get_state_space(self):
+        return self.tf.ss, (0,), (1,)
+
 
 class TFBlock(sb.Block):
     """Schematic graphical interface for State Space device."""
@@ -111,9 +121,6 @@ class TFBlock(sb.Block):
         self.equation = None
         self.design_update()
 
-        # debug:
-        tf = self.get_engine((0, 1))
-
     def design_update(self):
         self.equation = self.properties["H(s)"]
         self.bmp = equ2bmp(self.equation)
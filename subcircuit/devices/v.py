@@ -102,6 +102,9 @@ class V(inter.MNADevice, inter.CurrentSensor):
         volt = 0.0
         if self.stimulus:
             volt = self.stimulus.start(dt)
+            times = self.netlist.simulator.trans_time
+            if times is not None:
+                self.stimulus.prerender(dt, times)
         elif self.value:
             volt = self.value
 
@@ -110,7 +113,7 @@ class V(inter.MNADevice, inter.CurrentSensor):
     def step(self, dt, t):
 
         if self.stimulus:
-            volt = self.stimulus.step(dt, t)
+            volt = self.stimulus.value(dt, t)
         else:
             volt = self.value
 
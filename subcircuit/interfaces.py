@@ -1,6 +1,8 @@
 """interfaces.py
 """
 
+import bisect
+
 import numpy as np
 
 class Device(object):
@@ -195,6 +197,10 @@ class MNADevice(Device):
 
     """A Modified Nodal Analysis Device (circuit element) base object."""
 
+    # True if the device only stamps its jacobian in minor_step, so the
+    # jacobian after start() does not show which ports it couples:
+    nonlinear = False
+
     def __init__(self, nodes, internals, **parameters):
 
         """Creates a device base.
@@ -226,13 +232,37 @@ class MNADevice(Device):
 
         return self.netlist.create_internal(name)
 
+    def get_linear_stamp(self):
+
+        """Virtual method. May be implemented by linear, time-invariant
+        devices so they can be collected into a reduced order model.
+        :return: (g, c) matrices over the device ports (including internals)
+        for the descriptor form g*x + c*dx/dt = injected port currents, or None
+        if the device is not linear.
+        """
+
+        return None
+
 
 class SignalDevice(Device):
 
-    def __init__(self, nodes, **parameters):
+    # ports driven by this device (all other ports are inputs):
+    outputs = ()
+
+    # True if the outputs depend on the inputs of the same step. Signal loops
+    # must pass through at least one device without feedthrough:
+    feedthrough = True
+
+    def __init__(self, nodes, sample_period=None, **parameters):
 
         Device.__init__(self, nodes, **parameters)
 
+        # If set, the device only steps every sample_period seconds (ex. a
+        # discrete controller running slower than the electrical network), and
+        # its outputs are held between sample hits:
+
+        self.sample_period = sample_period
+
         self.portvalues = []
 
         # note that numnodes must == numports in signal devices
@@ -240,21 +270,37 @@ class SignalDevice(Device):
         for n in range(len(nodes)):
             self.portvalues.append(0.0)
 
+        # index of each port's value in portvalues. When the netlist compiles
+        # the signal schedule, portvalues is replaced by the netlist's shared
+        # value array, and connected ports share the same slot:
+
+        self.slots = list(range(len(nodes)))
+
     def set_port_value(self, i, value):
 
-        if i < len(self.portvalues):
-            self.portvalues[i] = value
+        if i < len(self.slots):
+            self.portvalues[self.slots[i]] = value
             return True
         else:
             return False
 
     def get_port_value(self, i):
 
-        if i < len(self.portvalues):
-            return self.portvalues[i]
+        if i < len(self.slots):
+            return self.portvalues[self.slots[i]]
         else:
             return None
 
+    def get_state_space(self):
+
+        """Virtual method. May be implemented by linear time-invariant signal
+        devices whose step() only advances a StateSpace system, so the netlist
+        can step them together (see lti.LTIBatch) instead of calling step().
+        :return: (state space, input ports, output ports) or None
+        """
+
+        return None
+
 
 class QssDevice(SignalDevice):
 
@@ -346,6 +392,10 @@ class Stimulus(object):
     must be derived from and setup() and step() methods must be implemented.
     """
 
+    # waveform pre-rendered on the simulation time grid:
+    wave = None
+    wave_dt = None
+
     def __init__(self):
 
         self.device = None
@@ -362,6 +412,46 @@ class Stimulus(object):
 
         raise NotImplementedError
 
+    def render(self, dt, t):
+
+        """Virtual method. May be implemented by derived class with a
+        vectorized version. Computes the stimulus over a whole time grid.
+        :param dt: timestep
+        :param t: array of times
+        :return: array of stimulus values at the given times
+        """
+
+        return np.array([self.step(dt, ti) for ti in t], dtype=float)
+
+    def prerender(self, dt, t):
+
+        """Renders the waveform over the (fixed step) time grid of the
+        simulation, to be read by value() during the run. Called by the
+        source device after start().
+        :param dt: timestep
+        :param t: array of grid times (t[i] = i * dt)
+        :return: None
+        """
+
+        self.wave = self.render(dt, t)
+        self.wave_dt = dt
+
+    def value(self, dt, t):
+
+        """Gets the stimulus value at time t, from the pre-rendered waveform
+        when t is on its grid, or else from step().
+        :param dt: timestep
+        :param t: time
+        :return: stimulus value
+        """
+
+        if self.wave is not None and dt == self.wave_dt:
+            i = int(round(t / dt))
+            if 0 <= i < len(self.wave) and abs(t - i * dt) <= 1.0e-6 * dt:
+                return self.wave[i]
+
+        return self.step(dt, t)
+
 
 class Table(object):
 
@@ -372,45 +462,72 @@ class Table(object):
         """Creates a new table instance.
         :param device: Parent device.
         :param pairs: Sequences of length 2 mapping dependant source inputs to
-        outputs.
+        outputs, in order of increasing input.
         :return: None
         """
 
         self.xp = []
         self.yp = []
         for x, y in pairs:
-            self.xp.append(x)
-            self.yp.append(y)
+            self.xp.append(float(x))
+            self.yp.append(float(y))
+
+        # slope of each segment, so an output is one multiply-add:
+
+        self.slopes = []
+        for i in range(len(self.xp) - 1):
+            dx = self.xp[i + 1] - self.xp[i]
+            if dx:
+                self.slopes.append((self.yp[i + 1] - self.yp[i]) / dx)
+            else:  # step in the table
+                self.slopes.append(0.0)
+
+        # arrays for batch lookups:
+        self.xarray = np.array(self.xp)
+        self.yarray = np.array(self.yp)
+
         self.cursor = 0  # this is to save the interp cursor state for speed
 
     def output(self, input_):
 
         """Gets the corresponding output value for the provided input.
-        :param input_: Input value
-        :return: Output mapped to provided input
+        :param input_: Input value, or array of input values
+        :return: Output mapped to provided input (array for array input)
         """
 
+        if np.ndim(input_):
+            return np.interp(input_, self.xarray, self.yarray)
+
         return self._interp_(input_)
 
     def _interp_(self, x):
 
-        if x <= self.xp[0]:
+        xp = self.xp
+
+        if x <= xp[0]:
             return self.yp[0]
 
-        elif x >= self.xp[-1]:
+        elif x >= xp[-1]:
             return self.yp[-1]
 
         else:
-            i = self.cursor
 
-            while x > self.xp[i] and i < (len(self.xp) - 1):
-                i += 1
+            # segment i spans xp[i] <= x < xp[i + 1]. Inputs usually move
+            # little between calls, so try the cursor's segment and its
+            # neighbors before bisecting:
+
+            i = self.cursor
 
-            self.cursor = i
-            x0, y0 = self.xp[i - 1], self.yp[i - 1]
-            x1, y1 = self.xp[i], self.yp[i]
+            if not xp[i] <= x < xp[i + 1]:
+                if i + 2 < len(xp) and xp[i + 1] <= x < xp[i + 2]:
+                    i += 1
+                elif i > 0 and xp[i - 1] <= x < xp[i]:
+                    i -= 1
+                else:
+                    i = bisect.bisect_right(xp, x) - 1
+                self.cursor = i
 
-            return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+            return self.yp[i] + self.slopes[i] * (x - xp[i])
 
 
 class Plottable:
@@ -1,7 +1,10 @@
 
+import functools
 import math
 import numpy as np
 import numpy.linalg as la
+import scipy.linalg as sla
+import scipy.sparse as sparse
 import matplotlib.pyplot as plt
 import sympy
 from sympy.parsing.sympy_parser import parse_expr
@@ -23,7 +26,7 @@ class LTISystem(object):
 
 class StateSpace(LTISystem):
 
-    def __init__(self, a, b, c, d=None, xo=None):
+    def __init__(self, a, b, c, d=None, xo=None, method="zoh"):
 
         """TODO
         :param a:
@@ -31,6 +34,9 @@ class StateSpace(LTISystem):
         :param c:
         :param d:
         :param xo:
+        :param method: discretization method. "zoh" (default) is exact for
+        inputs that are constant over each step and stable for any dt.
+        "euler" is the explicit forward euler method.
         :return:
         """
 
@@ -42,6 +48,12 @@ class StateSpace(LTISystem):
         self.c = c
         self.d = d
         self.xo = xo
+        self.method = method
+
+        # discretized system (cached for the last dt):
+        self.dt = None
+        self.ad = None
+        self.bd = None
 
         # get system size:
         self.n, x = a.shape
@@ -54,8 +66,10 @@ class StateSpace(LTISystem):
         if not self.xo:
             self.xo = np.zeros((self.n, 1))
 
-        self.x = self.xo[:, :]
-        self.xh = self.xo[:, :]
+        # the state is updated in place (an LTIBatch may hold a view of it),
+        # so it must not share memory with xo:
+        self.x = np.array(self.xo, dtype=float)
+        self.xh = self.x[:, :]
 
         self.u = np.zeros((self.n, 1))
         self.y = np.zeros((self.m, 1))
@@ -63,17 +77,46 @@ class StateSpace(LTISystem):
 
     def reset(self, dt):
 
-        self.x = self.xo[:, :]
-        self.xh = self.xo[:, :]
+        self.x[:] = self.xo
+        self.xh = self.x[:, :]
         self.u = np.zeros((self.n, 1))
 
+    def discretize(self, dt):
+
+        """Computes the discrete system x(k+1) = ad * x(k) + bd * u(k) for the
+        timestep, using zero-order hold (see zoh()) or forward euler
+        depending on the method. The result is cached until dt changes.
+        :param dt: timestep
+        :return: ad, bd
+        """
+
+        if dt != self.dt:
+            if self.method == "euler":
+                self.ad = np.eye(self.n) + self.a * dt
+                self.bd = self.b * dt
+            else:
+                self.ad, self.bd = zoh(self.a, self.b, dt)
+            self.dt = dt
+
+        return self.ad, self.bd
+
     def step(self, u, dt, t):
 
         self.u = u
 
-        dx = self.a.dot(self.x) + self.b.dot(u)
-        self.x = self.x + dx.dot(dt)
-        self.y = self.c.dot(self.x) + self.d.dot(u)
+        if self.method == "euler":
+            dx = self.a.dot(self.x) + self.b.dot(u)
+            self.x[:] = self.x + dx.dot(dt)
+        else:
+            ad, bd = self.discretize(dt)
+            self.x[:] = ad.dot(self.x) + bd.dot(u)
+
+        y = self.c.dot(self.x) + self.d.dot(u)
+
+        if self.y is None or self.y.shape != y.shape:
+            self.y = y
+        else:
+            self.y[:] = y
 
         self.xh = self.x[:, :]
 
@@ -84,89 +127,128 @@ class StateSpace(LTISystem):
         pass
 
 
-class TransferFunction(LTISystem):
-    def __init__(self, equation):
-        LTISystem.__init__(self)
+class LTIBatch(object):
 
-        self.is_gain = False
+    """Steps a group of independent state space systems as one block
+    diagonal sparse system, so the per-step cost is a few sparse mat-vecs
+    instead of several numpy calls per system. Inputs are gathered from, and
+    outputs scattered to, a flat value array by index. The state (and
+    output) of each system becomes a view into the batch arrays, so the
+    systems stay inspectable as usual.
+    """
 
-        self.equation = equation
-        self.ss = None
-        self.reset(0.0)
+    def __init__(self, systems, inputs, outputs, dt):
 
-    def reset(self, dt):
+        """Creates a batch.
+        :param systems: list of StateSpace systems
+        :param inputs: per system, the value array indices of its inputs
+        :param outputs: per system, the value array indices of its outputs
+        :param dt: timestep
+        :return: None
+        """
 
-        equ = parse_expr(self.equation)
+        self.systems = systems
+        self.inputs = np.concatenate(inputs).astype(int)
+        self.outputs = np.concatenate(outputs).astype(int)
 
-        num, den = equ.as_numer_denom()
+        self.xoffsets = np.cumsum([0] + [ss.n for ss in systems])
+        self.uoffsets = np.cumsum([0] + [len(i) for i in inputs])
+        self.yoffsets = np.cumsum([0] + [len(o) for o in outputs])
 
-        self.is_gain = False
+        self.x = np.zeros((self.xoffsets[-1], 1))
+        self.y = np.zeros((self.yoffsets[-1], 1))
 
-        if str(den).find("s") >= 0:  # if s domain expr:
-            a = self.expr2poly(den)
-            self.is_gain = False
-        else:
-            a = [eval(str(den))]
+        for k, ss in enumerate(systems):
+            x0, x1 = self.xoffsets[k], self.xoffsets[k + 1]
+            y0, y1 = self.yoffsets[k], self.yoffsets[k + 1]
+            self.x[x0:x1] = ss.x
+            ss.x = self.x[x0:x1]
+            ss.xh = ss.x
+            ss.y = self.y[y0:y1]
 
-        if str(num).find("s") >= 0:  # if s domain expr:
-            b = self.expr2poly(num)
-            self.is_gain = False
-        else:
-            b = [eval(str(num))]
+        self.c = self.stack([ss.c for ss in systems], self.yoffsets,
+                            self.xoffsets)
+        self.d = self.stack([ss.d for ss in systems], self.yoffsets,
+                            self.uoffsets)
 
-        if self.is_gain:
-            A = np.zeros((1, 1))
-            B = np.zeros((1, 1))
-            C = np.zeros((1, 1))
-            D = np.zeros((1, 1))
+        self.dt = None
+        self.ad = None
+        self.bd = None
+        self.discretize(dt)
 
-        else:
-            n = len(a)
+    def stack(self, blocks, row_offsets, col_offsets):
+
+        """Assembles a block diagonal sparse matrix from dense blocks (which
+        may have no rows or columns).
+        """
+
+        rows = []
+        cols = []
+        data = []
+
+        for k, block in enumerate(blocks):
+            i, j = np.nonzero(block)
+            rows.append(i + row_offsets[k])
+            cols.append(j + col_offsets[k])
+            data.append(block[i, j])
+
+        shape = (row_offsets[-1], col_offsets[-1])
+        coo = sparse.coo_matrix((np.concatenate(data),
+                                 (np.concatenate(rows),
+                                  np.concatenate(cols))), shape=shape)
+
+        return coo.tocsr()
+
+    def discretize(self, dt):
+
+        discrete = [ss.discretize(dt) for ss in self.systems]
+
+        self.ad = self.stack([ad for ad, bd in discrete], self.xoffsets,
+                             self.xoffsets)
+        self.bd = self.stack([bd for ad, bd in discrete], self.xoffsets,
+                             self.uoffsets)
+        self.dt = dt
 
-            # now convert tf to ss (CCF):
+    def step(self, values, dt):
 
-            n = len(a)
-            ao = a[0]
+        """Steps all the systems.
+        :param values: value array to read the inputs from and write the
+        outputs to
+        :param dt: timestep
+        :return: None
+        """
 
-            b2 = np.zeros(n)
-            b2[(n - len(b)):] = b
-            bo = b2[0]
-            b = b2[:]
+        if dt != self.dt:
+            self.discretize(dt)
 
-            # truncate:
+        u = values[self.inputs][:, None]
 
-            a = a[1:]
-            b = b[1:]
-            n -= 1
+        self.x[:] = self.ad.dot(self.x) + self.bd.dot(u)
+        self.y[:] = self.c.dot(self.x) + self.d.dot(u)
 
-            # normalize:
+        values[self.outputs] = self.y[:, 0]
 
-            for i in range(n):
-                a[i] /= ao
-                b[i] /= ao
 
-            A = np.zeros((n, n))
-            B = np.zeros((n, 1))
-            C = np.zeros((1, n))
-            D = np.zeros((1, 1))
+class TransferFunction(LTISystem):
+    def __init__(self, equation, method="zoh"):
+        LTISystem.__init__(self)
 
-            # a matrix and c vector:
+        self.is_gain = False
 
-            for i in range(n):
-                for j in range(n):
-                    if j == i+1:
-                            A[i, j] = 1.0
-                    elif i == n-1:
-                        A[i, j] = -a[j]
-                C[0, i] = b[-(i+1)] - a[-(i+1)] * bo
+        self.equation = equation
+        self.method = method
+        self.ss = None
+        self.reset(0.0)
+
+    def reset(self, dt):
 
-            # b vector:
-            B[-1, 0] = 1.0
+        a, b, c, d = tf2ss(self.equation)
 
-            # d matrix:
-            D[0, 0] = bo
+        self.ss = StateSpace(a, b, c, d, method=self.method)
 
-        self.ss = StateSpace(A, B, C, D)
+        if dt and self.method == "zoh":
+            self.ss.ad, self.ss.bd = discretize_tf(self.equation, dt)
+            self.ss.dt = dt
 
     def step(self, u, dt, t):
         return self.ss.step(u, dt, t)
@@ -183,6 +265,137 @@ class TransferFunction(LTISystem):
         return coeffs
 
 
+def normalize(equation):
+
+    """Normalizes a transfer function equation string for use as a cache
+    key (case and whitespace do not change the parsed expression).
+    """
+
+    return "".join(equation.lower().split())
+
+
+def zoh(a, b, dt):
+
+    """Zero-order-hold discretization of the continuous system (a, b):
+
+        ad = e^(a*dt), bd = integral(e^(a*tau), tau=0..dt) * b
+
+    from the exponential of the augmented matrix [[a, b], [0, 0]] * dt.
+    :return: ad, bd
+    """
+
+    n, m = b.shape
+    aug = np.zeros((n + m, n + m))
+    aug[:n, :n] = a
+    aug[:n, n:] = b
+    phi = sla.expm(aug * dt)
+
+    return phi[:n, :n], phi[:n, n:]
+
+
+def tf2ss(equation):
+
+    """Converts a transfer function equation in s to a state space
+    realization (controllable canonical form). Results are cached for the
+    process, so identical blocks are only parsed once.
+    :param equation: sympy expression string in s. Ex: "1 / (s + 1)"
+    :return: read-only (a, b, c, d) matrices
+    """
+
+    return _tf2ss(normalize(equation))
+
+
+def discretize_tf(equation, dt):
+
+    """Gets the zero-order-hold discretization of a transfer function for
+    the timestep dt. Results are cached for the process.
+    :return: read-only (ad, bd) matrices
+    """
+
+    return _discretize_tf(normalize(equation), dt)
+
+
+@functools.lru_cache(maxsize=1024)
+def _tf2ss(equation):
+
+    equ = parse_expr(equation)
+
+    num, den = equ.as_numer_denom()
+
+    if str(den).find("s") >= 0:  # if s domain expr:
+        a = TransferFunction.expr2poly(den)
+    else:
+        a = [eval(str(den))]
+
+    if str(num).find("s") >= 0:  # if s domain expr:
+        b = TransferFunction.expr2poly(num)
+    else:
+        b = [eval(str(num))]
+
+    n = len(a)
+
+    # now convert tf to ss (CCF):
+
+    ao = a[0]
+
+    b2 = np.zeros(n)
+    b2[(n - len(b)):] = b
+    bo = b2[0]
+    b = b2[:]
+
+    # truncate:
+
+    a = a[1:]
+    b = b[1:]
+    n -= 1
+
+    # normalize:
+
+    for i in range(n):
+        a[i] /= ao
+        b[i] /= ao
+    bo /= ao
+
+    A = np.zeros((n, n))
+    B = np.zeros((n, 1))
+    C = np.zeros((1, n))
+    D = np.zeros((1, 1))
+
+    # a matrix and c vector:
+
+    for i in range(n):
+        for j in range(n):
+            if j == i+1:
+                    A[i, j] = 1.0
+            elif i == n-1:
+                A[i, j] = -a[-(j+1)]
+        C[0, i] = b[-(i+1)] - a[-(i+1)] * bo
+
+    # b vector:
+    B[-1, 0] = 1.0
+
+    # d matrix:
+    D[0, 0] = bo
+
+    for matrix in (A, B, C, D):
+        matrix.setflags(write=False)
+
+    return A, B, C, D
+
+
+@functools.lru_cache(maxsize=1024)
+def _discretize_tf(equation, dt):
+
+    a, b, c, d = _tf2ss(equation)
+
+    ad, bd = zoh(a, b, dt)
+
+    ad.setflags(write=False)
+    bd.setflags(write=False)
+
+    return ad, bd
+
+
 if __name__ == "__main__":
 
     A = np.mat([[0, 1], [-1, -1]])
@@ -0,0 +1,56 @@
+"""Model-order reduction of linear MNA networks.
+"""
+
+import numpy as np
+import numpy.linalg as la
+import scipy.linalg as sla
+
+
+def prima(g, c, b, order, s0=0.0):
+
+    """Reduces the MNA descriptor system (g + s*c) x = b u, y = b' x using
+    the PRIMA block Arnoldi algorithm. The reduced model is obtained by a
+    congruence transform, so it stays passive when the full model is
+    passive (RLC networks).
+    :param g: (n, n) conductance matrix
+    :param c: (n, n) capacitance/inductance matrix
+    :param b: (n, p) port incidence matrix
+    :param order: requested number of reduced states (limited to n). Fewer
+    are returned if the krylov space is exhausted first.
+    :param s0: Krylov expansion point (1/s). A non-zero value is needed for
+    networks without a DC path to ground (ex. an LC ladder driven by port
+    currents), where g alone is singular.
+    :return: reduced (gr, cr, br) matrices
+    """
+
+    n, p = b.shape
+    order = min(n, int(order))
+
+    lu = sla.lu_factor(g + s0 * c)
+
+    q = np.zeros((n, 0))
+    block = sla.lu_solve(lu, b)
+
+    while q.shape[1] < order:
+
+        # orthogonalize the new block against the basis (twice, for
+        # numerical robustness) and drop deflated directions:
+
+        for i in range(2):
+            block = block - q.dot(q.T.dot(block))
+
+        qb, rb = la.qr(block)
+        keep = np.abs(np.diag(rb)) > 1.0e-12 * max(1.0, np.abs(rb).max())
+        qb = qb[:, keep]
+
+        if not qb.shape[1]:
+            break  # krylov space exhausted
+
+        q = np.hstack((q, qb[:, :order - q.shape[1]]))
+        block = sla.lu_solve(lu, c.dot(qb))
+
+    gr = q.T.dot(g).dot(q)
+    cr = q.T.dot(c).dot(q)
+    br = q.T.dot(b)
+
+    return gr, cr, br
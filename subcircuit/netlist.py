@@ -6,11 +6,18 @@ from copy import deepcopy as clone
 
 import numpy as np
 import numpy.linalg as la
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sla
+from scipy.sparse.csgraph import (reverse_cuthill_mckee, structural_rank,
+                                  maximum_bipartite_matching,
+                                  connected_components)
 
 import subcircuit.interfaces as inter
 import subcircuit.simulator as sim
 import subcircuit.loader as loader
 import subcircuit.qdl as qdl
+import subcircuit.devices.rom as rom
+from subcircuit.mathutils.lti import LTIBatch
 
 
 class Netlist():
@@ -37,9 +44,34 @@ class Netlist():
         self.across = None  # across at current time and iteration
         self.across_last = None  # across at last iteration
         self.across_history = None  # across at end of last time step
-        self.jac = None
-        self.sjac = None  # sparse jacobian for fast factorization
+        self.sjac = None  # reordered sparse (csc) system matrix
         self.bequiv = None
+        self.perm = None  # fill-reducing ordering of the non-ground nodes
+
+        # stamp assembly (see build_pattern):
+        self.mna_devices = []  # devices stamped into sjac, in stamp order
+        self.stamp_jac = None  # device jac values (devices hold views)
+        self.stamp_bequiv = None  # device bequiv values (devices hold views)
+        self.stamp_take = None  # device jac entries that are stamped
+        self.stamp_slot = None  # sjac.data index of each stamped entry
+        self.stamp_cols = None  # sjac column of each sjac.data entry
+        self.stamp_sum = None  # sums stamped entries into sjac.data slots
+        self.stamp_values = None  # stamped entry values, to find changes
+        self.pattern_perm = None  # node ordering of the sjac pattern
+        self.bequiv_take = None  # device bequiv entries that are stamped
+        self.bequiv_nodes = None  # node of each stamped bequiv entry
+
+        # factorization cache:
+        self.lu = None  # sparse LU of the factored sjac values
+        self.lu_data = None  # sjac.data that was factored
+        self.lu_update = None  # low-rank (woodbury) correction to lu
+        self.max_update_rank = 8  # refactor if more rows than this change
+
+        # signal device schedule:
+        self.signal_schedule = []  # levels of signal devices in update order
+        self.signal_values = None  # port values, one slot per signal net
+        self.signal_plan = []  # (period, lti batch, other devices) groups
+        self.signal_hits = []  # next sample hit time of each plan group
 
         # simulator:
         self.simulator = sim.Simulator(self)
@@ -56,7 +88,7 @@ class Netlist():
         # now loop through and grab all the subcircuit instances and remove from
         # device list:
 
-        for x_name, x_device in self.devices.items():
+        for x_name, x_device in list(self.devices.items()):
 
             if x_name[0] == "X":  # if subckt instance device:
 
@@ -72,20 +104,17 @@ class Netlist():
 
                     for sub_name, sub_device in subckt.devices.items():
                         mangled_name = "{0}_{1}".format(x_name, sub_name)
-                        new_device = clone(sub_device)
+                        # (memo keeps the back-references to the subckt
+                        # definition and netlist from being deep copied)
+                        memo = {id(subckt): subckt, id(self): self}
+                        new_device = clone(sub_device, memo)
 
                         # replace subckt instance device node names with
                         # external node names & mangle the internal node names:
 
-                        new_device.nodes = list(new_device.nodes)
-                        for i, node in enumerate(new_device.nodes):
-                            if node == 0 or node == 'ground' or node == 'gnd':
-                                new_device.nodes[i] = 0
-                            elif node in x_device.port2node:
-                                new_device.nodes[i] = x_device.port2node[node]
-                            else:
-                                mangled_port = "{0}_{1}".format(x_name, node)
-                                new_device.nodes[i] = mangled_port
+                        new_device.nodes = [
+                            self.subckt_node(x_name, x_device, node)
+                            for node in new_device.nodes]
 
                         # add device to top level:
                         self.device(mangled_name, new_device)
@@ -101,6 +130,103 @@ class Netlist():
                     msg.format(x_device.subckt, x_name)
                     raise SubCircuitError(msg)
 
+    def subckt_node(self, x_name, x_device, node):
+
+        """Maps a node name inside a subckt definition to the top level node
+        name for the subckt instance x_name. Ports map to the instance's
+        external nodes and internal nodes are mangled with the instance name.
+        """
+
+        if node == 0 or node == 'ground' or node == 'gnd':
+            return 0
+        elif node in x_device.port2node:
+            return x_device.port2node[node]
+        else:
+            return "{0}_{1}".format(x_name, node)
+
+    def reduce(self, name, *x_names, order=None, s0=None):
+
+        """Replaces a group of subckt instances made only of linear devices
+        (ex. the sections of a distributed line) with a single reduced order
+        model device. Only the nodes shared with the rest of the netlist are
+        kept as terminals; the internal nodes of the group are eliminated and
+        can no longer be plotted. Must be called before trans().
+        :param name: Name of the new ROM device
+        :param x_names: Names of the X (subckt instance) devices to reduce
+        :param order: Number of reduced states (default: 20 per terminal)
+        :param s0: Krylov expansion point in 1/s (default: 0.1/tstep)
+        :return: The new ROM device
+        """
+
+        index = {}
+        stamps = []
+
+        for x_name in x_names:
+
+            x_device = self.devices[x_name]
+            subckt = self.subckts[x_device.subckt]
+
+            for sub_name, sub_device in subckt.devices.items():
+
+                stamp = sub_device.get_linear_stamp()
+
+                if stamp is None:
+                    msg = "Device {0} in subcircuit {1} is not linear."
+                    msg = msg.format(sub_name, x_device.subckt)
+                    raise SubCircuitError(msg)
+
+                nports = stamp[0].shape[0]
+                keys = [self.subckt_node(x_name, x_device, node)
+                        for node in sub_device.nodes]
+                for i in range(len(keys), nports):
+                    keys.append((x_name, sub_name, i))  # device internals
+
+                for key in keys:
+                    if key != 0 and key not in index:
+                        index[key] = len(index)
+
+                stamps.append((keys, stamp))
+
+        # terminals are the group nodes used by any other device:
+
+        terminals = []
+        for device_name, device in self.devices.items():
+            if device_name not in x_names:
+                for node in device.nodes:
+                    if node in index and node not in terminals:
+                        terminals.append(node)
+
+        if not terminals:
+            msg = "Reduced model {0} has no terminals.".format(name)
+            raise SubCircuitError(msg)
+
+        n = len(index)
+        g = np.zeros((n, n))
+        c = np.zeros((n, n))
+        b = np.zeros((n, len(terminals)))
+
+        for keys, (gd, cd) in stamps:
+            for i, ki in enumerate(keys):
+                if ki != 0:
+                    for j, kj in enumerate(keys):
+                        if kj != 0:
+                            g[index[ki], index[kj]] += gd[i, j]
+                            c[index[ki], index[kj]] += cd[i, j]
+
+        for k, node in enumerate(terminals):
+            b[index[node], k] = 1.0
+
+        if order is None:
+            order = 20 * len(terminals)
+
+        for x_name in x_names:
+            del self.devices[x_name]
+
+        device = rom.ROM(terminals, g, c, b, order=order, s0=s0)
+        self.device(name, device)
+
+        return device
+
     def start(self, dt):
 
         """Calls setup() on all of this subcircuit devices.
@@ -108,6 +234,8 @@ class Netlist():
         intial stamps to be applied.
         """
 
+        self.dt = dt
+
         # determine if electrical devices (or only signal)
         self.electrical = False
         for device in self.devices.values():
@@ -121,30 +249,282 @@ class Netlist():
             self.across = np.zeros(n)
             self.across_last = np.zeros(n)
             self.across_history = np.zeros(n)
-            self.jac = np.zeros((n, n))
             self.bequiv = np.zeros(n)
+            self.perm = self.order_nodes()
+
+        self.compile_signals()
 
         # call start on devices:
         for device in self.devices.values():
             device.start(dt)
 
+        self.batch_signals()
+
         # stamp the ciruit:
         if self.electrical:
+            self.check_topology()
+            self.build_pattern()
             self.stamp()
 
-    def stamp(self):
+    def check_topology(self):
+
+        """Checks the circuit structure before the first solve so that a
+        floating node or a loop of voltage sources (or inductors) is reported
+        by name instead of as a singular matrix during the simulation. Uses
+        the device port2node maps and the sparsity pattern of the device
+        jacobians after start(). Ports are only connected where the jacobian
+        couples them, so ideal current sources (all-zero jacobian) do not
+        count as a path; nonlinear devices that only stamp in minor_step are
+        assumed to couple all of their ports.
+        :return: None. Raises SubCircuitError if the topology is invalid.
+        """
+
+        n = self.nodenum
+
+        names = {}
+        for key, index in self.nodes.items():
+            names.setdefault(index, key)
+
+        node_devices = [[] for i in range(n)]
+
+        # union-find over the device connections:
+
+        parent = list(range(n))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        rows = []
+        cols = []
+
+        for name, device in self.devices.items():
+
+            if not isinstance(device, inter.MNADevice):
+                continue
+
+            ports = list(device.port2node.items())
+
+            for pi, ni in ports:
+                if name not in node_devices[ni]:
+                    node_devices[ni].append(name)
+
+            pattern = device.jac != 0.0
+            if device.nonlinear and not pattern.any():
+                pattern[:, :] = True
 
-        """Stamps the main subcircuit devices.
+            for pi, ni in ports:
+                for pj, nj in ports:
+                    if pattern[pi, pj]:
+                        parent[find(nj)] = find(ni)
+                        if ni and nj:
+                            rows.append(ni - 1)
+                            cols.append(nj - 1)
+
+        # every node needs a path to ground:
+
+        ground = find(0)
+        floating = [i for i in range(1, n)
+                    if node_devices[i] and find(i) != ground]
+
+        if floating:
+            msg = "Node(s) {0} have no path to ground.".format(
+                self.describe_nodes(floating, names, node_devices))
+            raise SubCircuitError(msg)
+
+        # every node (and branch current) needs an equation that can be
+        # matched to it:
+
+        used = np.array([i for i in range(1, n) if node_devices[i]]) - 1
+
+        data = np.ones(len(rows))
+        graph = sparse.csr_matrix((data, (rows, cols)), shape=(n - 1, n - 1))
+        graph = graph[used][:, used]
+
+        if structural_rank(graph) < len(used):
+            match = maximum_bipartite_matching(graph, perm_type="column")
+            singular = [used[i] + 1 for i in np.flatnonzero(match < 0)]
+            msg = ("Circuit is structurally singular at node(s) {0}. Check "
+                   "for loops of voltage sources or inductors, or cutsets of "
+                   "current sources.").format(
+                self.describe_nodes(singular, names, node_devices))
+            raise SubCircuitError(msg)
+
+    def describe_nodes(self, indices, names, node_devices):
+
+        """Formats node indices as names along with the devices connected to
+        them, for error messages.
+        """
+
+        items = []
+        for i in indices:
+            if node_devices[i]:
+                items.append("{0} ({1})".format(names[i],
+                                                ", ".join(node_devices[i])))
+            else:
+                items.append("{0} (no devices)".format(names[i]))
+
+        return ", ".join(items)
+
+    def order_nodes(self):
+
+        """Computes a fill-reducing (reverse Cuthill-McKee) ordering of the
+        non-ground nodes from the connectivity of the MNA devices. The ordering
+        is only applied when the system is factored, so node indices (and
+        therefore Voltage/Current lookups and trans_data rows) are unchanged.
+        Nodes that no MNA device connects to (signal nodes, or nodes left over
+        by remove_device) are left out of the solved system.
+        :return: permutation array p, such that jac[1:, 1:][p][:, p] is the
+        reordered system matrix
         """
 
-        self.jac[:, :] = 0.0
-        self.bequiv[:] = 0.0
+        rows = []
+        cols = []
+
         for device in self.devices.values():
             if isinstance(device, inter.MNADevice):
-                for pi, ni in device.port2node.items():
-                    self.bequiv[ni] += device.bequiv[pi]
-                    for pj, nj in device.port2node.items():
-                        self.jac[ni, nj] += device.jac[pi, pj]
+                nodes = [n - 1 for n in device.port2node.values() if n]
+                for ni in nodes:
+                    for nj in nodes:
+                        rows.append(ni)
+                        cols.append(nj)
+
+        n = self.nodenum - 1
+        data = np.ones(len(rows))
+        graph = sparse.csr_matrix((data, (rows, cols)), shape=(n, n))
+
+        used = np.zeros(n, dtype=bool)
+        used[rows] = True
+
+        p = reverse_cuthill_mckee(graph, symmetric_mode=True)
+
+        return p[used[p]]
+
+    def build_pattern(self):
+
+        """Builds the sparse (csc) system matrix in the fill-reducing node
+        order, along with the index maps that scatter the device stamps into
+        it. The pattern holds every port pair of every MNA device, whatever
+        its value, so it is kept between steps and only rebuilt when devices
+        or nodes are added or removed. The device jac and bequiv arrays are
+        moved into two shared buffers (the devices keep views of them), so
+        stamping does not gather them device by device. If the rebuilt
+        pattern is the same as before (ex. a device added in parallel with
+        another), the cached factorization is kept and the new values are
+        applied to it as a low-rank update.
+        :return: None
+        """
+
+        n = len(self.perm)
+
+        position = np.zeros(self.nodenum, dtype=int)
+        position[self.perm + 1] = np.arange(n)
+
+        self.mna_devices = [device for device in self.devices.values()
+                            if isinstance(device, inter.MNADevice)]
+
+        self.stamp_jac = np.zeros(sum(device.jac.size
+                                      for device in self.mna_devices))
+        self.stamp_bequiv = np.zeros(sum(device.bequiv.size
+                                         for device in self.mna_devices))
+
+        take = []
+        rows = []
+        cols = []
+        btake = []
+        bnodes = []
+        offset = 0
+        boffset = 0
+
+        for device in self.mna_devices:
+
+            jac = self.stamp_jac[offset:offset + device.jac.size]
+            bequiv = self.stamp_bequiv[boffset:boffset + device.bequiv.size]
+            jac[:] = device.jac.ravel()
+            bequiv[:] = device.bequiv.ravel()
+            device.jac = jac.reshape(device.jac.shape)
+            device.bequiv = bequiv.reshape(device.bequiv.shape)
+
+            m = device.jac.shape[1]
+            ports = list(device.port2node.items())
+            for pi, ni in ports:
+                btake.append(boffset + pi)
+                bnodes.append(ni)
+                if not ni:
+                    continue
+                for pj, nj in ports:
+                    if nj:
+                        take.append(offset + pi * m + pj)
+                        rows.append(position[ni])
+                        cols.append(position[nj])
+
+            offset += jac.size
+            boffset += bequiv.size
+
+        # entries sorted by column then row give the csc layout:
+
+        keys = np.array(cols, dtype=int) * n + np.array(rows, dtype=int)
+        keys, slot = np.unique(keys, return_inverse=True)
+
+        self.stamp_cols = keys // n
+        indptr = np.searchsorted(self.stamp_cols, np.arange(n + 1))
+
+        sjac = sparse.csc_matrix((np.zeros(len(keys)), keys % n, indptr),
+                                 shape=(n, n))
+
+        same = (self.sjac is not None
+                and np.array_equal(self.pattern_perm, self.perm)
+                and np.array_equal(self.sjac.indptr, sjac.indptr)
+                and np.array_equal(self.sjac.indices, sjac.indices))
+
+        self.sjac = sjac
+        self.pattern_perm = self.perm.copy()
+
+        self.stamp_take = np.array(take, dtype=int)
+        self.stamp_slot = slot.ravel()
+        self.bequiv_take = np.array(btake, dtype=int)
+        self.bequiv_nodes = np.array(bnodes, dtype=int)
+
+        m = len(take)
+        self.stamp_sum = sparse.csr_matrix(
+            (np.ones(m), (self.stamp_slot, np.arange(m))),
+            shape=(len(keys), m))
+        self.stamp_values = None  # nothing stamped into the new pattern yet
+
+        if not same:
+            self.lu = None
+
+    def stamp(self):
+
+        """Stamps the main subcircuit devices into the sparse system matrix
+        (values only, the pattern comes from build_pattern) and the bequiv
+        vector. Only the matrix entries whose device values changed since the
+        last stamp are summed again (ex. the device edited by set_value, or
+        the nonlinear devices), unless most of them changed.
+        """
+
+        values = self.stamp_jac[self.stamp_take]
+
+        if self.stamp_values is None:
+            changed = None
+        else:
+            changed = np.flatnonzero(values != self.stamp_values)
+
+        if changed is None or 4 * len(changed) > len(values):
+            self.sjac.data = np.bincount(self.stamp_slot, weights=values,
+                                         minlength=len(self.stamp_cols))
+
+        elif len(changed):
+            slots = np.unique(self.stamp_slot[changed])
+            self.sjac.data[slots] = self.stamp_sum[slots].dot(values)
+
+        self.stamp_values = values
+
+        self.bequiv = np.bincount(self.bequiv_nodes,
+                                  weights=self.stamp_bequiv[self.bequiv_take],
+                                  minlength=self.nodenum)
 
     def step(self, dt, t):
 
@@ -172,14 +552,12 @@ class Netlist():
             # save off across history
             self.across_history = np.copy(self.across)
 
+        # now step the signal devices after the electrical system is converged:
         self.signal_step(dt, t)
 
         for device in self.devices.values():
             device.post_step(dt, t)
 
-        # now step the signal devices after the electrical system is converged:
-        self.signal_step(dt, t)
-
         # debug:
         # self.print_matrices()
 
@@ -205,11 +583,15 @@ class Netlist():
         print(row)
         print(" " * 14 + "." + (len(row) - 9) * '-' + ".")
 
+        jac = np.zeros((self.nodenum, self.nodenum))
+        p = self.perm + 1
+        jac[np.ix_(p, p)] = self.sjac.toarray()
+
         for i in range(1, self.nodenum):
             row = "{0:>12}  |".format(names[i])
             for j in range(1, self.nodenum):
                 s = "{0:12.2g}  "
-                row += s.format(self.jac[i, j].astype(float))
+                row += s.format(jac[i, j])
             s = "    |     {0:12.2g}"
             row += s.format(self.across[i].astype(float))
             s = "    |     {0:12.2g}"
@@ -229,9 +611,11 @@ class Netlist():
 
         success = True
 
-        # minor step all devices in this subcircuit:
+        # minor step the electrical devices in this subcircuit (the signal
+        # devices step once per step, in signal_step):
         for device in self.devices.values():
-            device.minor_step(dt, t, k)
+            if not self.is_signal_device(device):
+                device.minor_step(dt, t, k)
 
         # re-stamp the subcircuit matrices with the updated information:
         self.stamp()
@@ -239,47 +623,452 @@ class Netlist():
         # solve across vector from linear system:
         # jacobian * across = b-equivalent (Ax = B):
 
+        p = self.perm + 1
+
         try:
-            #lu = sla.splu(self.sjac)
-            #self.across[1:] = lu.solve(self.bequiv[1:])
-            self.across[1:] = la.solve(self.jac[1:, 1:], self.bequiv[1:])
+            self.across[p] = self.solve(self.sjac, self.bequiv[p])
 
-        except la.LinAlgError as laerr:
+        except RuntimeError as laerr:  # splu raises on a singular matrix
             print("Linear algebra error occured while attempting to solve "
                   "circuit. Circuit not solved. Error details: ", str(laerr))
             success = False
 
         # check convergence criteria:
         if success:
-            self.converged = True
-            for v0, v1 in zip(self.across_last, self.across):
-                if abs(v1 - v0) > self.simulator.tol:
-                    self.converged = False
-                    break
+            change = np.abs(self.across - self.across_last)
+            self.converged = not np.any(change > self.simulator.tol)
 
         # save off across vector state for this iteration:
         self.across_last = np.copy(self.across)
 
         return success
 
+    def factor(self, a):
+
+        """Factors the (reordered) system matrix and caches the factorization.
+        :param a: sparse (csc) system matrix with the build_pattern layout
+        :return: None
+        """
+
+        self.lu = sla.splu(a, permc_spec="NATURAL")
+        self.lu_data = a.data.copy()
+        self.lu_update = None
+
+    def solve(self, a, b):
+
+        """Solves a * x = b, reusing the cached factorization when possible.
+        If a differs from the factored matrix in only a few rows (ex. after
+        set_value, or a nonlinear device updating its stamp), the change is
+        applied as a low-rank (Woodbury) correction to the cached
+        factorization instead of refactoring:
+
+            (A + U*V)^-1 = A^-1 - A^-1*U * (I + V*A^-1*U)^-1 * V*A^-1
+
+        where U selects the changed rows and V holds the row changes. The
+        change is found by comparing the values of the shared sparsity
+        pattern, so it costs O(nnz).
+        :param a: sparse (csc) system matrix with the build_pattern layout
+        :param b: right-hand side vector
+        :return: solution vector x
+        """
+
+        if self.lu is None or len(self.lu_data) != len(a.data):
+            self.factor(a)
+            return self.lu.solve(b)
+
+        changed = np.flatnonzero(a.data != self.lu_data)
+
+        if not len(changed):
+            return self.lu.solve(b)
+
+        rows, row = np.unique(a.indices[changed], return_inverse=True)
+        k = len(rows)
+
+        if k > self.max_update_rank or 4 * k > len(b):
+            self.factor(a)
+            return self.lu.solve(b)
+
+        delta = a.data[changed] - self.lu_data[changed]
+
+        if (self.lu_update is None
+                or not np.array_equal(changed, self.lu_update[0])
+                or not np.array_equal(delta, self.lu_update[1])):
+
+            v = sparse.csr_matrix((delta, (row.ravel(),
+                                           self.stamp_cols[changed])),
+                                  shape=(k, len(b)))
+            u = np.zeros((len(b), k))
+            u[rows, np.arange(k)] = 1.0
+            z = self.lu.solve(u)
+            s = np.eye(k) + v.dot(z)
+            self.lu_update = (changed, delta, v, z, s)
+
+        changed, delta, v, z, s = self.lu_update
+        y = self.lu.solve(b)
+
+        try:
+            return y - z.dot(la.solve(s, v.dot(y)))
+
+        except la.LinAlgError:  # update is singular, refactor
+            self.factor(a)
+            return self.lu.solve(b)
+
+    def set_value(self, name, value):
+
+        """Changes the value of a device in a started netlist. The device
+        restamps itself in update(); on the next stamp() only its entries of
+        the system matrix are patched, and the changed rows are applied to
+        the cached factorization as a low-rank update.
+        :param name: Name of the device
+        :param value: New device value (ex. resistance for R)
+        :return: None
+        """
+
+        device = self.devices[name]
+        device.value = value
+
+        if self.dt:
+            device.update()
+
+    def add_device(self, name, device):
+
+        """Adds a device to a started netlist, without restarting the
+        existing devices. The system arrays are resized if the device adds
+        nodes.
+        :param name: Name of the device
+        :param device: Device to add
+        :return: True if successful. False if failed.
+        """
+
+        if not self.device(name, device):
+            return False
+
+        if not self.dt:  # not started, nothing else to do
+            return True
+
+        if not self.is_signal_device(device):
+            self.electrical = True
+
+        if self.electrical:
+            self.resize()
+
+        if self.is_signal_device(device):
+            self.compile_signals()
+
+        device.start(self.dt)
+
+        if self.is_signal_device(device):
+            self.batch_signals()
+
+        if self.electrical:
+            self.perm = self.order_nodes()
+            self.check_topology()
+            self.build_pattern()
+
+        return True
+
+    def resize(self):
+
+        """Grows the system arrays to the current number of nodes, keeping
+        the existing values.
+        :return: None
+        """
+
+        n = self.nodenum
+        m = 0
+        if self.across is not None:
+            m = len(self.across)
+
+        if n > m:
+            for key in ("across", "across_last", "across_history", "bequiv"):
+                array = np.zeros(n)
+                if m:
+                    array[:m] = getattr(self, key)
+                setattr(self, key, array)
+
+        self.simulator.resize(n)
+
+    def remove_device(self, name):
+
+        """Removes a device from a started netlist. Nodes that are no longer
+        connected to any device are dropped from the solved system (their
+        indices stay allocated so recorded data lines up).
+        :param name: Name of the device
+        :return: The removed device
+        """
+
+        device = self.devices.pop(name)
+
+        if self.dt and self.is_signal_device(device):
+            self.compile_signals()
+            self.batch_signals()
+
+        if self.dt and self.electrical:
+            self.perm = self.order_nodes()
+            self.check_topology()
+            self.build_pattern()
+
+            unused = np.ones(self.nodenum, dtype=bool)
+            unused[0] = False
+            unused[self.perm + 1] = False
+            self.across[unused] = 0.0
+            self.across_last[unused] = 0.0
+            self.across_history[unused] = 0.0
+
+        return device
+
     def is_signal_device(self, device):
 
         return isinstance(device, inter.SignalDevice)
 
+    def compile_signals(self):
+
+        """Compiles the signal devices into a schedule. Each signal net gets
+        one slot in a flat value array shared by all signal devices, so an
+        output is seen by the connected inputs as soon as it is set. Devices
+        are then ordered (in levels of independent devices) so that each one
+        steps after the devices driving it. Loops are broken at a device
+        without feedthrough, which sees the previous step's value of its
+        input; a loop made only of feedthrough devices is an algebraic loop
+        and raises a SubCircuitError.
+
+        Connections are taken from the device port2port maps when they are
+        set (schematic netlists), or else from the shared port2node nodes.
+        :return: None
+        """
+
+        devices = [device for device in self.devices.values()
+                   if self.is_signal_device(device)]
+
+        nodeports = {}
+        for device in devices:
+            for port, node in device.port2node.items():
+                if node:  # ground is not a signal net
+                    nodeports.setdefault(node, []).append((device, port))
+
+        # assign value slots (an input shares its driver's slot):
+
+        slots = {}
+        drivers = {}
+        n = 0
+
+        for device in devices:
+            for port in device.outputs:
+                slots[(device, port)] = n
+                n += 1
+
+        for device in devices:
+            for port in device.outputs:
+                slot = slots[(device, port)]
+                if device.port2port is not None:
+                    links = device.port2port.get(port, [])
+                else:
+                    links = nodeports.get(device.port2node[port], [])
+                for device2, port2 in links:
+                    if (not self.is_signal_device(device2)
+                            or port2 in device2.outputs):
+                        continue
+                    key = (device2, port2)
+                    if key in slots and slots[key] != slot:
+                        msg = ("Port {0} of device {1} is driven by more than"
+                               " one output.".format(port2, device2.name))
+                        raise SubCircuitError(msg)
+                    slots[key] = slot
+                    drivers[key] = device
+
+        for device in devices:
+            for port in range(len(device.slots)):
+                if (device, port) not in slots:  # unconnected input
+                    slots[(device, port)] = n
+                    n += 1
+
+        # move the port values to the shared array (keeping the current
+        # values if the schedule is recompiled during a simulation):
+
+        values = np.zeros(n)
+
+        for (device, port), slot in slots.items():
+            if port not in device.outputs:
+                values[slot] = device.get_port_value(port)
+        for (device, port), slot in slots.items():
+            if port in device.outputs:
+                values[slot] = device.get_port_value(port)
+
+        for device in devices:
+            device.slots = [slots[(device, port)]
+                            for port in range(len(device.slots))]
+            device.portvalues = values
+
+        # order the devices:
+
+        index = {device: i for i, device in enumerate(devices)}
+        m = len(devices)
+        succ = [set() for i in range(m)]
+
+        for (device2, port2), device in drivers.items():
+            succ[index[device]].add(index[device2])
+
+        # find the devices that are on a loop:
+
+        rows = [i for i in range(m) for j in succ[i]]
+        cols = [j for i in range(m) for j in succ[i]]
+        graph = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                  shape=(m, m))
+        ncomp, labels = connected_components(graph, connection="strong")
+        sizes = np.bincount(labels, minlength=ncomp)
+        looped = [sizes[labels[i]] > 1 or i in succ[i] for i in range(m)]
+
+        # a loop with feedthrough all the way around has no start point:
+
+        direct = [[j for j in succ[i] if devices[j].feedthrough]
+                  for i in range(m)]
+        levels, loop = self.levelize(direct)
+        loop = [i for i in loop if looped[i]]
+
+        if loop:
+            names = ", ".join(devices[i].name for i in loop)
+            msg = "Algebraic loop in signal devices: {0}.".format(names)
+            raise SubCircuitError(msg)
+
+        # otherwise, loops are broken at a device without feedthrough:
+
+        breaks = [i for i in range(m)
+                  if looped[i] and not devices[i].feedthrough]
+
+        levels, loop = self.levelize([list(s) for s in succ], breaks)
+
+        self.signal_schedule = [[devices[i] for i in level]
+                                for level in levels]
+        self.signal_values = values
+
+    @staticmethod
+    def levelize(succ, breaks=()):
+
+        """Orders the vertices of a directed graph in levels (Kahn's
+        algorithm), so that every vertex comes after its predecessors and the
+        vertices in a level are independent.
+        :param succ: successor lists, by vertex
+        :param breaks: vertices that may be released before their
+        predecessors to break a cycle
+        :return: (levels, remaining) where remaining lists the vertices left
+        on (or downstream of) a cycle that could not be broken
+        """
+
+        m = len(succ)
+        indegree = [0] * m
+        for i in range(m):
+            for j in succ[i]:
+                indegree[j] += 1
+
+        done = [False] * m
+        frontier = [i for i in range(m) if not indegree[i]]
+        levels = []
+        breaks = list(breaks)
+
+        while True:
+
+            if not frontier:
+                while breaks and done[breaks[0]]:
+                    breaks.pop(0)
+                if not breaks:
+                    break
+                frontier = [breaks.pop(0)]
+
+            for i in frontier:
+                done[i] = True
+
+            level = frontier
+            levels.append(level)
+            frontier = []
+
+            for i in level:
+                for j in succ[i]:
+                    if not done[j]:
+                        indegree[j] -= 1
+                        if not indegree[j]:
+                            frontier.append(j)
+
+        remaining = [i for i in range(m) if not done[i]]
+
+        return levels, remaining
+
+    def batch_signals(self):
+
+        """Groups the signal devices of each schedule level by sample period,
+        and the LTI devices (see SignalDevice.get_state_space) of each group
+        into one block diagonal system. The devices in a level are
+        independent, so they can be stepped together. Must be called after
+        the devices are started.
+        :return: None
+        """
+
+        self.signal_plan = []
+
+        for level in self.signal_schedule:
+
+            groups = {}
+            for device in level:
+                groups.setdefault(device.sample_period, []).append(device)
+
+            for period, group in groups.items():
+
+                systems = []
+                inputs = []
+                outputs = []
+                others = []
+
+                for device in group:
+                    lti = device.get_state_space()
+                    if lti:
+                        ss, inports, outports = lti
+                        systems.append(ss)
+                        inputs.append([device.slots[i] for i in inports])
+                        outputs.append([device.slots[i] for i in outports])
+                    else:
+                        others.append(device)
+
+                batch = None
+                if len(systems) > 1:
+                    batch = LTIBatch(systems, inputs, outputs,
+                                     period or self.dt)
+                else:
+                    others = group
+
+                self.signal_plan.append((period, batch, others))
+
+        self.signal_hits = [0.0] * len(self.signal_plan)
+
     def signal_step(self, dt, t):
 
-        # propogate output values:
-        for device1 in self.devices.values():
-            if self.is_signal_device(device1):
-                for port1, connected_ports in device1.port2port.items():
-                    value = device1.get_port_value(port1)
-                    for device2, port2 in connected_ports:
-                        device2.set_port_value(port2, value)
+        """Steps the signal devices. Devices with a sample period only step
+        when a sample hit is due (and are passed the period as their
+        timestep); their outputs are held in between. A period shorter than
+        dt steps them once per hit elapsed since the last step.
+        """
 
-        # update outputs:
-        for device in self.devices.values():
-            if self.is_signal_device(device):
-                device.step(dt, t)
+        tol = 1.0e-6 * dt
+
+        for k, (period, batch, devices) in enumerate(self.signal_plan):
+
+            if period:
+                hit = self.signal_hits[k]
+                steps = 0
+                while hit <= t + tol:
+                    hit += period
+                    steps += 1
+                if not steps:
+                    continue
+                self.signal_hits[k] = hit
+                h = period
+            else:
+                h = dt
+                steps = 1
+
+            for i in range(steps):
+                if batch:
+                    batch.step(self.signal_values, h)
+                for device in devices:
+                    device.step(h, t)
 
     def get_node_index(self, key):
 
@@ -339,7 +1128,8 @@ class Netlist():
         subckt.netlist = self
         return subckt
 
-    def trans(self, tstep, tstop, tstart=None, tmax=None, uic=False):
+    def trans(self, tstep, tstop, tstart=None, tmax=None, uic=False,
+              resume=False):
 
         """ Run transient simulation.
         :param tstep: Time step in seconds
@@ -347,11 +1137,13 @@ class Netlist():
         :param tstart: TODO
         :param tmax: TODO
         :param uic: Flag for use initial conditions
+        :param resume: Continue the last run up to tstop without restarting
+        the devices (ex. after set_value or add_device between runs)
         :return: None
         """
 
         self.flatten()
-        self.simulator.trans(tstep, tstop, tstart, tmax, uic)
+        self.simulator.trans(tstep, tstop, tstart, tmax, uic, resume)
 
     def plot(self, *variables, **kwargs):
 
@@ -12,7 +12,9 @@ from math import sqrt  as SQRT
 from math import floor as FLOOR
 
 from collections import OrderedDict as odict
+from collections import deque
 from array import array
+import multiprocessing as mp
 
 import pandas as pd
 
@@ -24,6 +26,8 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 mpl.rc('axes.formatter', useoffset=False)
 
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sla
 from scipy.integrate import solve_ivp
 from scipy.optimize import fsolve
 from scipy.interpolate import interp1d
@@ -80,6 +84,319 @@ class SourceType:
     FUNCTION = "FUNCTION"
 
 
+class RecordMode:
+
+    OFF = "OFF"               # no output (qss, ss or ode)
+    QSS = "QSS"               # every quantized output change
+    DECIMATED = "DECIMATED"   # every record_every-th change of each atom
+    WINDOW = "WINDOW"         # changes within record_window (tstart, tstop)
+
+
+# ============================ Event Scheduling ================================
+
+
+class EventQueue(object):
+
+    """Indexed binary min-heap of atom next-event times. Each atom holds one
+    entry (keyed by atom.id), so a changed tnext is re-positioned in place
+    (decrease or increase key) in O(log n) instead of rescanning all atoms.
+    """
+
+    def __init__(self, n=0):
+
+        self.times = [_INF] * n     # event time for each key
+        self.heap = list(range(n))  # keys in heap order
+        self.pos = list(range(n))   # heap position of each key (-1 if popped)
+
+    def __len__(self):
+
+        return len(self.heap)
+
+    def peek(self):
+
+        """Returns the earliest event time (inf if the queue is empty).
+        """
+
+        if self.heap:
+            return self.times[self.heap[0]]
+
+        return _INF
+
+    def update(self, key, time):
+
+        """Sets the event time of key, re-inserting it if it was popped.
+        """
+
+        told = self.times[key]
+        self.times[key] = time
+
+        i = self.pos[key]
+
+        if i < 0:
+            i = len(self.heap)
+            self.heap.append(key)
+            self.pos[key] = i
+            self._siftup(i)
+
+        elif time < told:
+            self._siftup(i)
+
+        elif time > told:
+            self._siftdown(i)
+
+    def pop_due(self, time):
+
+        """Removes and returns the keys with event times at or before time.
+        """
+
+        keys = []
+
+        while self.heap and self.times[self.heap[0]] <= time:
+
+            key = self.heap[0]
+            last = self.heap.pop()
+            self.pos[key] = -1
+
+            if last != key:
+                self.heap[0] = last
+                self.pos[last] = 0
+                self._siftdown(0)
+
+            keys.append(key)
+
+        return keys
+
+    def _siftup(self, i):
+
+        heap, pos, times = self.heap, self.pos, self.times
+
+        key = heap[i]
+        time = times[key]
+
+        while i > 0:
+            parent = (i - 1) >> 1
+            other = heap[parent]
+            if times[other] <= time:
+                break
+            heap[i] = other
+            pos[other] = i
+            i = parent
+
+        heap[i] = key
+        pos[key] = i
+
+    def _siftdown(self, i):
+
+        heap, pos, times = self.heap, self.pos, self.times
+
+        n = len(heap)
+        key = heap[i]
+        time = times[key]
+
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and times[heap[child + 1]] < times[heap[child]]:
+                child += 1
+            other = heap[child]
+            if times[other] >= time:
+                break
+            heap[i] = other
+            pos[other] = i
+            i = child
+
+        heap[i] = key
+        pos[key] = i
+
+
+# ============================== Atom Storage ==================================
+
+
+class Recorder(object):
+
+    """Columnar store of (time, atom id, value) output rows shared by all
+    atoms of a system. Rows are written into fixed-size chunks, so growing
+    the store never copies the rows already recorded.
+    """
+
+    def __init__(self, chunk_size=65536):
+
+        self.chunk_size = chunk_size
+        self.chunks = []   # (time, atom, value) ndarrays of previous chunks
+        self.size = 0      # rows used in the current chunk
+        self.columns = None  # cached (time, atom, value, order, bounds)
+
+        self.new_chunk()
+
+    def __len__(self):
+
+        return sum(len(chunk[0]) for chunk in self.chunks) + self.size
+
+    def new_chunk(self):
+
+        n = self.chunk_size
+        self.time = array("d", [0.0]) * n
+        self.atom = array("i", [0]) * n
+        self.value = array("d", [0.0]) * n
+        self.size = 0
+
+    def append(self, time, atom, value):
+
+        i = self.size
+
+        if i == self.chunk_size:
+            self.chunks.append((np.frombuffer(self.time),
+                                np.frombuffer(self.atom, dtype=np.intc),
+                                np.frombuffer(self.value)))
+            self.new_chunk()
+            i = 0
+
+        self.time[i] = time
+        self.atom[i] = atom
+        self.value[i] = value
+        self.size = i + 1
+        self.columns = None
+
+    def extend(self, times, atoms, values):
+
+        """Appends a block of rows given as equal length arrays.
+        """
+
+        self.seal()
+        self.chunks.append((np.array(times, dtype=float),
+                            np.array(atoms, dtype=np.intc),
+                            np.array(values, dtype=float)))
+        self.columns = None
+
+    def seal(self):
+
+        """Moves the rows of the current chunk to the chunk list.
+        """
+
+        n = self.size
+
+        if n:
+            self.chunks.append(
+                (np.frombuffer(self.time)[:n].copy(),
+                 np.frombuffer(self.atom, dtype=np.intc)[:n].copy(),
+                 np.frombuffer(self.value)[:n].copy()))
+            self.size = 0
+
+    def rows(self):
+
+        """Returns all recorded rows as (time, atom, value) arrays.
+        """
+
+        self.seal()
+
+        if not self.chunks:
+            return np.zeros(0), np.zeros(0, np.intc), np.zeros(0)
+
+        if len(self.chunks) > 1:
+            self.chunks = [tuple(np.concatenate(column) for column
+                                 in zip(*self.chunks))]
+
+        return self.chunks[0]
+
+    def select(self, atom):
+
+        """Returns the (time, value) arrays recorded for an atom id.
+        """
+
+        if self.columns is None:
+
+            time, atoms, value = self.rows()
+
+            order = np.argsort(atoms, kind="stable")
+            bounds = np.searchsorted(atoms[order], np.arange(atoms.max(initial=-1) + 2))
+
+            self.columns = time, atoms, value, order, bounds
+
+        time, atoms, value, order, bounds = self.columns
+
+        if atom + 1 >= len(bounds):
+            return np.zeros(0), np.zeros(0)
+
+        rows = order[bounds[atom]:bounds[atom + 1]]
+
+        return time[rows], value[rows]
+
+
+class AtomStore(object):
+
+    """Struct-of-arrays storage of the atom simulation variables. Each field
+    is a contiguous array('d') indexed by atom.id, so system-wide operations
+    can work on whole NumPy views (see view) instead of looping over atoms,
+    while scalar access from the atoms stays cheap.
+    """
+
+    fields = ("x", "q", "qlo", "qhi", "d", "tnext", "dq", "qsave", "xsave")
+
+    def __init__(self, n=0):
+
+        for field in self.fields:
+            setattr(self, field, array("d", bytes(8 * n)))
+
+    def __len__(self):
+
+        return len(self.x)
+
+    def append(self, values):
+
+        """Adds a row of field values and returns its index.
+        """
+
+        for field, value in zip(self.fields, values):
+            getattr(self, field).append(value)
+
+        return len(self.x) - 1
+
+    def row(self, i):
+
+        return [getattr(self, field)[i] for field in self.fields]
+
+    def view(self, field):
+
+        """Returns a writable ndarray sharing memory with the field. Drop the
+        view before adding atoms (the array cannot grow while it is shared).
+        """
+
+        values = getattr(self, field)
+
+        if not values:
+            return np.zeros(0)
+
+        return np.frombuffer(values)
+
+
+def _slot_values(atom):
+
+    """Returns the numeric slot values (scalar simulation state) of an atom.
+    """
+
+    values = {}
+
+    for cls in type(atom).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            value = getattr(atom, name, None)
+            if isinstance(value, (bool, int, float)):
+                values[name] = value
+
+    return values
+
+
+def _stored(field):
+
+    def fget(self):
+        return getattr(self.store, field)[self.id]
+
+    def fset(self, value):
+        getattr(self.store, field)[self.id] = value
+
+    return property(fget, fset)
+
+
 # ============================= Qdl Model ======================================
 
 
@@ -97,14 +414,38 @@ def print_matrix_dots(m):
 
 class Atom(object):
 
+    __slots__ = ("name", "x0", "dqmin", "dqmax", "dqerr", "dtmin", "dmax",
+                 "units", "dq0", "time", "tlast", "d0", "q0", "triggered",
+                 "tsaved", "nsaves", "updates", "updates_ss",
+                 "updates_ode", "broadcast_to", "connections",
+                 "jacfuncs", "derargfunc", "sys", "device", "store", "id",
+                 "index", "implicit", "xf", "mq", "tq")
+
+    # variables kept in the (system) AtomStore:
+
+    x = _stored("x")
+    q = _stored("q")
+    qlo = _stored("qlo")
+    qhi = _stored("qhi")
+    d = _stored("d")
+    tnext = _stored("tnext")
+    dq = _stored("dq")
+    qsave = _stored("qsave")
+    xsave = _stored("xsave")
+
     def __init__(self, name, x0=0.0, dq=None, dqmin=None, dqmax=None,
                  dqerr=None, dtmin=None, dmax=1e10, units=""):
 
+        # storage (the atom's own until it is added to a System):
+
+        self.store = AtomStore(1)
+        self.id = 0  # store index (position in sys.atoms once added)
+
         # params:
 
         self.name = name
         self.x0 = x0
-        self.dq = dq
+        self.dq = dq or 0.0
         self.dqmin = dqmin
         self.dqmax = dqmax
         self.dqerr = dqerr
@@ -114,7 +455,7 @@ class Atom(object):
 
         # simulation variables:
 
-        self.dq0 = self.dq
+        self.dq0 = dq
         self.qlo = 0.0   
         self.qhi = 0.0 
         self.time = 0.0
@@ -125,25 +466,22 @@ class Atom(object):
         self.d0 = 0.0     
         self.q = x0      
         self.q0 = x0     
+        self.mq = 0.0  # quantized output slope (QSS2 atoms)
+        self.tq = 0.0  # time of the quantized output (QSS2 atoms)
         self.triggered = False
 
-        # results data storage:
+        # results data storage (the output rows are kept in the system
+        # recorders, see the tout, qout, ... properties):
 
         # qss:
-        self.tout = None  # output times quantized output
-        self.qout = None  # quantized output 
-        self.tzoh = None  # zero-order hold output times quantized output
-        self.qzoh = None  # zero-order hold quantized output 
+        self.tsaved = 0.0  # time of the last saved quantized output
+        self.nsaves = 0  # quantized output changes (for decimation)
         self.updates = 0  # qss updates
 
         # state space:
-        self.tout_ss = None  # state space time output
-        self.xout_ss = None  # state space value output
         self.updates_ss = 0  # state space update count
 
         # non-linear ode:
-        self.tout_ode = None  # state space time output
-        self.xout_ode = None  # state space value output
         self.updates_ode = 0  # state space update count
 
         # atom connections:
@@ -160,11 +498,76 @@ class Atom(object):
 
         self.sys = None
         self.device = None
+        self.index = None  # state or source vector index
+        self.xf = None  # steady state value
 
         # other:
 
         self.implicit = True
 
+    @property
+    def tout(self):
+        return self.sys.qss_out.select(self.id)[0]
+
+    @property
+    def qout(self):
+        return self.sys.qss_out.select(self.id)[1]
+
+    @property
+    def tout_ss(self):
+        return self.sys.ss_out.select(self.id)[0]
+
+    @property
+    def xout_ss(self):
+        return self.sys.ss_out.select(self.id)[1]
+
+    @property
+    def tout_ode(self):
+        return self.sys.ode_out.select(self.id)[0]
+
+    @property
+    def xout_ode(self):
+        return self.sys.ode_out.select(self.id)[1]
+
+    def zoh(self):
+
+        """Returns the (time, value) staircase of the quantized output, with
+        each change drawn as a vertical step at its event time. This is only
+        the output of first order atoms, which hold q constant between events
+        (see hold()).
+        """
+
+        tout, qout = self.sys.qss_out.select(self.id)
+
+        return np.repeat(tout, 2)[1:], np.repeat(qout, 2)[:-1]
+
+    def foh(self):
+
+        """Returns the (time, value) points of the quantized output, to be
+        joined by straight lines (first-order hold). This is the output of
+        QSS2 atoms, which is linear between events. The lines differ from it
+        only by the re-quantization jumps (within a few quanta).
+        """
+
+        return self.sys.qss_out.select(self.id)
+
+    def hold(self):
+
+        """Returns the (time, value) trace of the quantized output as it is
+        held between events by this type of atom (zoh or foh).
+        """
+
+        return self.zoh()
+
+    def attach(self, store):
+
+        """Moves the atom variables to the end of store (the System store) and
+        re-points the atom to them.
+        """
+
+        self.id = store.append(self.store.row(self.id))
+        self.store = store
+
     def add_connection(self, other, coefficient=1.0, coeffunc=None):
         
         connection = Connection(self, other, coefficient=coefficient,
@@ -178,8 +581,26 @@ class Atom(object):
 
     def add_jacfunc(self, other, func):
 
+        """Registers the jacobian cell function d f / d other.q. It is called
+        with the derivative function arguments (func(*derargfunc(device)))
+        when the atom has a derargfunc, otherwise like a coefficient function
+        (func(device)).
+        """
+
         self.jacfuncs.append((other, func))
 
+    def get_jacobian_row(self):
+
+        """Evaluates the registered jacobian cell functions, in jacfuncs
+        order.
+        """
+
+        if self.derargfunc:
+            args = self.derargfunc(self.device)
+            return [func(*args) for other, func in self.jacfuncs]
+        else:
+            return [func(self.device) for other, func in self.jacfuncs]
+
     def set_state(self, value, quantize=False):
 
         self.x = float(value)
@@ -198,6 +619,9 @@ class Atom(object):
         self.tlast = t0
         self.time = t0
         self.tnext = _INF
+        self.triggered = False
+        self.mq = 0.0
+        self.tq = t0
 
         # init state:                        
 
@@ -220,37 +644,19 @@ class Atom(object):
 
         # init output:
 
-        typecode = "d"
-
-        self.tout     = array(typecode)
-        self.qout     = array(typecode)
-        self.nupd     = array(typecode)
-        self.tzoh     = array(typecode)
-        self.qzoh     = array(typecode)
-        self.tout_ss  = array(typecode)
-        self.xout_ss  = array(typecode)
-        self.nupd_ss  = array(typecode)
-        self.tout_ode = array(typecode)
-        self.xout_ode = array(typecode)
-        self.nupd_ode = array(typecode)
-
         self.updates = 0
         self.updates_ss = 0
         self.updates_ode = 0
 
-        self.tout.append(self.time)
-        self.qout.append(self.q0)
-        self.nupd.append(0)
-        self.tzoh.append(self.time)
-        self.qzoh.append(self.q0)
+        self.tsaved = self.time
+        self.nsaves = 0
 
-        self.tout_ss.append(self.time)
-        self.xout_ss.append(self.q0)
-        self.nupd_ss.append(0)
+        if self.sys.records(self.time, force=True):
+            self.sys.qss_out.append(self.time, self.id, self.q0)
 
-        self.tout_ode.append(self.time)
-        self.xout_ode.append(self.q0)
-        self.nupd_ode.append(0)
+        if self.sys.record_mode != RecordMode.OFF:
+            self.sys.ss_out.append(self.time, self.id, self.q0)
+            self.sys.ode_out.append(self.time, self.id, self.q0)
 
     def update(self, time):
 
@@ -268,11 +674,15 @@ class Atom(object):
         self.quantize()
         self.ta()
 
+        self.sys.queue.update(self.id, self.tnext)
+
         # trigger external update if quantized output changed:
         
-        if self.q != self.q0:
+        q = self.q
+
+        if q != self.q0:
             self.save()
-            self.q0 = self.q
+            self.q0 = q
             self.broadcast()
             self.update_dq()
 
@@ -304,9 +714,13 @@ class Atom(object):
 
     def broadcast(self):
 
+        # push dependents onto the system worklist (triggered doubles as the
+        # in-queue flag, so each atom is queued at most once):
+
         for atom in self.broadcast_to:
-            if atom is not self:
+            if atom is not self and not atom.triggered:
                 atom.triggered = True
+                self.sys.worklist.append(atom)
 
     def update_dq(self):
 
@@ -329,29 +743,25 @@ class Atom(object):
 
     def save(self, force=False):
     
-        if self.time != self.tout[-1] or force:
+        if self.time != self.tsaved or force:
+
+            self.tsaved = self.time
+            self.nsaves += 1
 
-            self.tout.append(self.time)           
-            self.qout.append(self.q)
-            self.nupd.append(self.updates)
+            if self.sys.records(self.time, self.nsaves, force):
 
-            self.tzoh.append(self.time)           
-            self.qzoh.append(self.q0)
-            self.tzoh.append(self.time)           
-            self.qzoh.append(self.q)
+                self.sys.qss_out.append(self.time, self.id, self.q)
 
     def save_ss(self, t, x):
 
-        self.tout_ss.append(t)           
-        self.xout_ss.append(x)
-        self.nupd_ss.append(self.updates_ss)
+        if self.sys.record_mode != RecordMode.OFF:
+            self.sys.ss_out.append(t, self.id, x)
         self.updates_ss += 1
 
     def save_ode(self, t, x):
 
-        self.tout_ode.append(t)           
-        self.xout_ode.append(x)
-        self.nupd_ode.append(self.updates_ss)
+        if self.sys.record_mode != RecordMode.OFF:
+            self.sys.ode_out.append(t, self.id, x)
         self.updates_ode += 1
 
     def get_error(self, typ="l2"):
@@ -432,11 +842,10 @@ class Atom(object):
 
     def get_previous_state(self):
 
-        if self.qout:
-            if len(self.qout) >= 2:
-                return self.qout[-2]
-            else:
-                return self.x0
+        qout = self.qout
+
+        if len(qout) >= 2:
+            return qout[-2]
         else:
             return self.x0
 
@@ -455,6 +864,10 @@ class Atom(object):
 
 class SourceAtom(Atom):
 
+    __slots__ = ("source_type", "u0", "u1", "u2", "ua", "freq", "phi", "duty",
+                 "t1", "t2", "srcfunc", "u", "u_prev", "omega", "T",
+                 "ramp_slope")
+
     def __init__(self, name, source_type=SourceType.CONSTANT, u0=0.0, u1=0.0,
                  u2=0.0, ua=0.0, freq=0.0, phi=0.0, duty=0.0, t1=0.0, t2=0.0,
                  srcfunc=None, dq=None, dqmin=None, dqmax=None, dqerr=None,
@@ -495,44 +908,7 @@ class SourceAtom(Atom):
 
         self.u_prev = self.u
 
-        if self.source_type == SourceType.FUNCTION:
-
-            u = self.srcfunc(self.device, self.time)
-
-        elif self.source_type == SourceType.CONSTANT:
-
-            u = self.u0
-
-        elif self.source_type == SourceType.STEP:
-
-            if self.time < self.t1:
-                u = self.u0
-            else:
-                u = self.u1
-
-        elif self.source_type == SourceType.SINE:
-
-            if self.time >= self.t1:
-                u = self.u0 + self.ua * sin(self.omega * self.time + self.phi)
-            else:
-                u = self.u0
-
-        elif self.source_type == SourceType.PWM:
-
-            pass # todo
-
-        elif self.source_type == SourceType.RAMP:
-
-            if self.time <= self.t1:
-                u = self.u1
-            elif self.time <= self.t2:
-                u = self.u1 + (self.time - self.t1) * self.d 
-            else:
-                u = self.u2
-
-        elif self.source_type == SourceType.FUNCTION:
-
-            u = self.srcfunc()
+        u = self.value(self.time)
 
         if self.sys.enable_slewrate:
             if u > self.u_prev:
@@ -627,8 +1003,11 @@ class SourceAtom(Atom):
 
         elif self.source_type == SourceType.FUNCTION:
 
-            pass
-            #self.tnext = self.time + self.srcdt # <-- should we do this?
+            # next quantum change along the (finite difference) slope:
+
+            d = self.slope(self.time)
+            if d:
+                self.tnext = self.time + self.dq / abs(d)
 
         self.tnext = max(self.tnext, self.tlast + self.dtmin)
 
@@ -657,16 +1036,75 @@ class SourceAtom(Atom):
 
         elif self.source_type == SourceType.FUNCTION:
 
-            d = 0.0  # todo: add a time derivative function delegate
+            d = self.slope(self.time)
 
         return d
 
+    def slope(self, time):
+
+        """Returns the source time derivative du/dt at time (the first order
+        output used by QSS2 atoms).
+        """
+
+        if self.source_type == SourceType.RAMP:
+
+            if self.t1 <= time < self.t2:
+                return self.ramp_slope
+
+        elif self.source_type == SourceType.SINE:
+
+            if time >= self.t1:
+                return self.omega * self.ua * COS(self.omega * time + self.phi)
+
+        elif self.source_type == SourceType.FUNCTION:
+
+            # central difference over a thousandth of the system timestep:
+
+            h = 1.0e-3 * self.sys.dt
+            return (self.srcfunc(self.device, time + h) -
+                    self.srcfunc(self.device, time - h)) / (2.0 * h)
+
+        return 0.0
+
+    def value(self, time):
+
+        """Returns the source value u(time) without the slew rate limit and
+        without changing the atom state (used by the vectorized ode).
+        """
+
+        if self.source_type == SourceType.FUNCTION:
+
+            return self.srcfunc(self.device, time)
+
+        elif self.source_type == SourceType.STEP:
+
+            if time >= self.t1:
+                return self.u1
+
+        elif self.source_type == SourceType.SINE:
+
+            if time >= self.t1:
+                return self.u0 + self.ua * sin(self.omega * time + self.phi)
+
+        elif self.source_type == SourceType.RAMP:
+
+            if time <= self.t1:
+                return self.u1
+            elif time <= self.t2:
+                return self.u1 + (time - self.t1) * self.ramp_slope
+            else:
+                return self.u2
+
+        return self.u0
+
 
 class StateAtom(Atom):
 
     """ Qdl State Atom.
     """
 
+    __slots__ = ("coefficient", "coeffunc", "derfunc")
+
     def __init__(self, name, x0=0.0, coefficient=0.0, coeffunc=None,
                  derfunc=None, dq=None, dqmin=None, dqmax=None, dqerr=None,
                  dtmin=None, dmax=1e10, units=""):
@@ -680,11 +1118,12 @@ class StateAtom(Atom):
 
     def dint(self):
 
-        self.x += self.d * (self.time - self.tlast)
+        x = self.x + self.d * (self.time - self.tlast)
+        self.x = x
 
         self.tlast = self.time
 
-        return self.x
+        return x
 
     def quantize(self, implicit=True):
         
@@ -693,21 +1132,26 @@ class StateAtom(Atom):
 
         self.d0 = self.d
 
-        # derivative based:
+        # derivative based (read once from the store):
+
+        x = self.x
+        qlo = self.qlo
+        dq = self.dq
 
-        if self.x >= self.qhi:
+        if x >= self.qhi:
 
             self.q = self.qhi
-            self.qlo += self.dq
+            qlo += dq
             change = True
 
-        elif self.x <= self.qlo:
+        elif x <= qlo:
 
-            self.q = self.qlo
-            self.qlo -= self.dq
+            self.q = qlo
+            qlo -= dq
             change = True
 
-        self.qhi = self.qlo + 2.0 * self.dq
+        self.qlo = qlo
+        self.qhi = qlo + 2.0 * dq
 
         if change and self.implicit and implicit:  # we've ventured out of (qlo, qhi) bounds
 
@@ -725,50 +1169,375 @@ class StateAtom(Atom):
                     self.q = self.qhi - a * fhi
                     interp = True
 
-        return interp
+        return interp
+
+    def ta(self):
+
+        d = self.d
+
+        if d > _EPS:
+            tnext = self.time + (self.qhi - self.x) / d
+        elif d < -_EPS:
+            tnext = self.time + (self.qlo - self.x) / d
+        else:
+            tnext = _INF
+            
+        self.tnext = max(tnext, self.tlast + self.dtmin)
+
+    def compute_coefficient(self):
+
+        if self.coeffunc:
+            return self.coeffunc(self.device)
+        else:
+            return self.coefficient
+
+    def f(self, q=None):
+
+        if not q:
+            q = self.q
+
+        if self.derfunc:
+            if self.derargfunc:
+                args = self.derargfunc(self.device)
+                return self.derfunc(*args)
+            else:
+                return self.derfunc(self.device, q)
+
+        d = self.compute_coefficient() * q
+
+        for connection in self.connections:
+            d += connection.value()
+
+        return d
+
+
+class Qss2StateAtom(StateAtom):
+
+    """Second order (QSS2) state atom. The state is tracked as a quadratic
+    x(t) = x + d*h + dd*h**2/2 and the quantized output as a line
+    q(t) = q + mq*(t - tq), which is re-quantized when the two drift dq
+    apart. For the same accuracy this takes far fewer events than the first
+    order StateAtom.
+
+    The slope of f along the input trajectories (dd) is computed from the
+    connection coefficients, the input atom slopes (mq) and the source
+    slopes (SourceAtom.slope), or by a directional difference when the atom
+    has a derivative function. Inputs from QSS2 atoms are read at the update
+    time; first order atoms that read a QSS2 atom see its output as of its
+    last update.
+    """
+
+    __slots__ = ("dd",)
+
+    def __init__(self, name, x0=0.0, coefficient=0.0, coeffunc=None,
+                 derfunc=None, dq=None, dqmin=None, dqmax=None, dqerr=None,
+                 dtmin=None, dmax=1e10, units=""):
+
+        StateAtom.__init__(self, name, x0=x0, coefficient=coefficient,
+                           coeffunc=coeffunc, derfunc=derfunc, dq=dq,
+                           dqmin=dqmin, dqmax=dqmax, dqerr=dqerr, dtmin=dtmin,
+                           dmax=dmax, units=units)
+
+        self.dd = 0.0  # second derivative of the state
+
+    def initialize(self, t0):
+
+        StateAtom.initialize(self, t0)
+
+        self.d = 0.0
+        self.dd = 0.0
+
+    def set_state(self, value, quantize=False):
+
+        StateAtom.set_state(self, value, quantize=quantize)
+
+        self.q = self.x
+        self.mq = 0.0
+        self.tq = self.time
+
+    def update(self, time):
+
+        self.time = time
+        self.updates += 1
+        self.triggered = False  # reset triggered flag
+
+        # move the quantized lines of this atom and its QSS2 inputs to the
+        # current time (same trajectories, re-anchored at time):
+
+        self.anchor(time)
+
+        for connection in self.connections:
+            other = connection.other
+            if isinstance(other, Qss2StateAtom):
+                other.anchor(time)
+
+        self.dint()
+        change = self.quantize()
+
+        self.d = self.f()
+
+        if change:
+            self.mq = self.d
+
+        self.dd = self.dfdt(time)
+
+        self.ta()
+
+        self.sys.queue.update(self.id, self.tnext)
+
+        # trigger external update if quantized output changed:
+
+        if change:
+            self.save()
+            self.q0 = self.q
+            self.broadcast()
+            self.update_dq()
+
+    def zoh(self):
+
+        raise TypeError("{0} has a piecewise linear quantized output, use "
+                        "foh() or hold().".format(self.full_name()))
+
+    def hold(self):
+
+        return self.foh()
+
+    def anchor(self, time):
+
+        if self.mq:
+            self.q += self.mq * (time - self.tq)
+        self.tq = time
+
+    def dint(self):
+
+        h = self.time - self.tlast
+        d = self.d
+        dd = self.dd
+
+        x = self.x + (d + 0.5 * dd * h) * h
+        self.x = x
+        self.d = d + dd * h
+
+        self.tlast = self.time
+
+        return x
+
+    def quantize(self, implicit=True):
+
+        """Re-quantizes (q = x) if the state reached the quantum or the
+        scheduled event time.
+        :return: True if the quantized output changed
+        """
+
+        if self.time >= self.tnext or abs(self.x - self.q) >= self.dq:
+            self.requantize()
+            return True
+
+        return False
+
+    def requantize(self):
+
+        x = self.x
+
+        self.q = x
+        self.tq = self.time
+        self.qlo = x - self.dq
+        self.qhi = x + self.dq
+
+    def dfdt(self, time):
+
+        """Returns the slope of the derivative along the quantized input
+        trajectories.
+        """
+
+        if not self.derfunc and type(self).f is StateAtom.f:
+
+            dd = self.compute_coefficient() * self.mq
+
+            for connection in self.connections:
+                other = connection.other
+                if isinstance(other, SourceAtom):
+                    dd += connection.compute_coefficient() * other.slope(time)
+                elif other is not None and not connection.valfunc:
+                    dd += connection.compute_coefficient() * other.mq
+
+            return dd
+
+        # central difference of f along the input slopes:
+
+        inputs = [self] + [connection.other for connection in self.connections
+                           if isinstance(connection.other, StateAtom)
+                           and connection.other is not self]
+
+        inputs = [atom for atom in inputs if atom.mq]
+
+        if not inputs:
+            return 0.0
+
+        scale = max(1.0, max(abs(atom.q) for atom in inputs))
+        h = 1.0e-7 * scale / max(abs(atom.mq) for atom in inputs)
+
+        q = [atom.q for atom in inputs]
+
+        for atom, qi in zip(inputs, q):
+            atom.q = qi + atom.mq * h
+        fhi = self.f()
+
+        for atom, qi in zip(inputs, q):
+            atom.q = qi - atom.mq * h
+        flo = self.f()
+
+        for atom, qi in zip(inputs, q):
+            atom.q = qi
+
+        return (fhi - flo) / (2.0 * h)
+
+    def ta(self):
+
+        # first time the state and quantized lines drift dq apart:
+        #   dd/2 * h**2 + (d - mq) * h + (x - q) = +/- dq
+
+        a = 0.5 * self.dd
+        b = self.d - self.mq
+        c = self.x - self.q
+        dq = self.dq
+
+        h = min(_root(a, b, c - dq), _root(a, b, c + dq))
+
+        self.tnext = max(self.time + h, self.tlast + self.dtmin)
+
+
+class Liqss2StateAtom(Qss2StateAtom):
+
+    """Linearly implicit second order (LIQSS2) state atom for stiff systems.
+    The derivative is modeled as a*q(t) + u(t), with a the diagonal jacobian
+    entry of the atom. On re-quantization q is placed dq above or below x in
+    the direction the second derivative of x will have at that q, or where
+    that second derivative is zero when the direction changes within the
+    quantum. x then moves toward q instead of oscillating around it, which
+    removes the spurious events of stiff (fast, strongly damped) states.
+    The next event is when x drifts dq past its position after the
+    re-quantization, so x stays within 2*dq of q.
+
+    a is taken from the jacobian cell registered for the atom itself (see
+    add_jacfunc), else from the coefficient of a coefficient-connected atom.
+    Atoms without either behave like Qss2StateAtom.
+    """
+
+    __slots__ = ()
+
+    def aii(self):
+
+        """Returns the diagonal jacobian entry d f / d q of this atom.
+        """
+
+        for other, func in self.jacfuncs:
+            if other is self:
+                if self.derargfunc:
+                    return func(*self.derargfunc(self.device))
+                return func(self.device)
+
+        if not self.derfunc and type(self).f is StateAtom.f:
+            return self.compute_coefficient()
+
+        return 0.0
+
+    def quantize(self, implicit=True):
+
+        if self.time >= self.tnext or abs(self.x - self.q) > 2.0 * self.dq:
+            self.requantize()
+            return True
+
+        return False
+
+    def requantize(self):
+
+        a = self.aii()
+
+        if not a:
+            Qss2StateAtom.requantize(self)
+            return
+
+        x = self.x
+        dq = self.dq
+
+        # affine derivative model, from the previous quantized line:
+
+        u = self.f() - a * self.q
+        du = self.dfdt(self.time) - a * self.mq
+
+        # second derivative of x with the quantized output at x -/+ dq:
+
+        ddlo = a * (a * (x - dq) + u) + du
+        ddhi = a * (a * (x + dq) + u) + du
+
+        if ddlo * ddhi < 0.0:
+            q = -(u + du / a) / a  # second derivative is zero here
+        elif ddhi > 0.0 or (ddhi == 0.0 and ddlo > 0.0):
+            q = x + dq
+        elif ddlo < 0.0 or ddhi < 0.0:
+            q = x - dq
+        else:
+            q = x
+
+        self.q = q
+        self.tq = self.time
+        self.qlo = q - dq
+        self.qhi = q + dq
+
+    def ta(self):
+
+        a = 0.5 * self.dd
+        b = self.d - self.mq
+        c = self.x - self.q
+        dq = self.dq
+
+        lo = min(-dq, c - dq)
+        hi = max(dq, c + dq)
+
+        h = min(_root(a, b, c - hi), _root(a, b, c - lo))
 
-    def ta(self):
+        self.tnext = max(self.time + h, self.tlast + self.dtmin)
 
-        if self.d > _EPS:
-            self.tnext = self.time + (self.qhi - self.x) / self.d
-        elif self.d < -_EPS:
-            self.tnext = self.time + (self.qlo - self.x) / self.d
-        else:
-            self.tnext = _INF
-            
-        self.tnext = max(self.tnext, self.tlast + self.dtmin)
 
-    def compute_coefficient(self):
+def _root(a, b, c):
 
-        if self.coeffunc:
-            return self.coeffunc(self.device)
-        else:
-            return self.coefficient
+    """Returns the smallest positive root of a*h**2 + b*h + c (inf if none).
+    """
 
-    def f(self, q=None):
+    if abs(a) < _EPS:
+        if abs(b) < _EPS:
+            return _INF
+        h = -c / b
+        return h if h > 0.0 else _INF
 
-        if not q:
-            q = self.q
+    disc = b * b - 4.0 * a * c
 
-        if self.derfunc:
-            if self.derargfunc:
-                args = self.derargfunc(self.device)
-                return self.derfunc(*args)
-            else:
-                return self.derfunc(self.device, q)
+    if disc < 0.0:
+        return _INF
 
-        d = self.compute_coefficient() * q
+    if b >= 0.0:
+        s = -0.5 * (b + SQRT(disc))
+    else:
+        s = -0.5 * (b - SQRT(disc))
 
-        for connection in self.connections:
-            d += connection.value()
+    roots = [s / a]
+    if s != 0.0:
+        roots.append(c / s)
 
-        return d
+    positive = [h for h in roots if h > 0.0]
+
+    if positive:
+        return min(positive)
+
+    return _INF
 
 
 class System(object):
 
     def __init__(self, name="sys", dq=None, dqmin=None, dqmax=None, dqerr=None,
-                 dtmin=None, dmax=None, print_time=False):
+                 dtmin=None, dmax=None, print_time=False,
+                 record=RecordMode.QSS, record_every=10, record_window=None):
         
         global sys
         sys = self
@@ -823,8 +1592,22 @@ class System(object):
         self.print_time = print_time
         self.dt = 1e-4
         self.enable_slewrate = False
-        self.jacobian = None
+        self.jacobian = None  # cached jacobian pattern
         self.Km = 1.2
+        self.store = AtomStore()  # simulation variables of all atoms
+        self.state_ids = np.zeros(0, dtype=int)  # store indices of states
+        self.queue = None  # next-event times of all atoms
+        self.worklist = deque()  # atoms triggered by broadcasts
+
+        # output recording:
+
+        self.record_mode = record
+        self.record_every = record_every  # for RecordMode.DECIMATED
+        self.record_window = record_window  # (tstart, tstop) for WINDOW
+
+        self.qss_out = Recorder()  # quantized outputs
+        self.ss_out = Recorder()   # state space solution
+        self.ode_out = Recorder()  # ode solution
 
         # events:
 
@@ -863,6 +1646,7 @@ class System(object):
 
             atom.device = device
             atom.sys = self
+            atom.attach(self.store)
             self.atoms.append(atom)
 
             if isinstance(atom, StateAtom):
@@ -875,6 +1659,11 @@ class System(object):
                 self.source_atoms.append(atom)
                 self.m += 1
 
+        self.state_ids = np.array([atom.id for atom in self.state_atoms],
+                                  dtype=int)
+
+        self.jacobian = None
+
         setattr(self, device.name, device)
 
     def add_devices(self, *devices):
@@ -888,13 +1677,34 @@ class System(object):
         for device in devices:
             self.add_device(device)
 
+    def records(self, time, count=0, force=False):
+
+        """Returns True if a quantized output change at time (the count-th
+        of its atom) is recorded in the current record mode. Forced saves
+        (initial and final values) are kept when decimating.
+        """
+
+        mode = self.record_mode
+
+        if mode == RecordMode.QSS:
+            return True
+
+        elif mode == RecordMode.DECIMATED:
+            return force or not count % self.record_every
+
+        elif mode == RecordMode.WINDOW:
+            tstart, tstop = self.record_window
+            return tstart <= time <= tstop
+
+        return False
+
     def save_state(self):
 
         self.tsave = self.time
 
-        for atom in self.atoms:
-            atom.qsave = atom.q
-            atom.xsave = atom.x
+        store = self.store
+        store.qsave[:] = store.q
+        store.xsave[:] = store.x
 
     def connect(self, from_electrical_port, to_electrical_port):
 
@@ -913,29 +1723,231 @@ class System(object):
 
         self.time = self.tsave
 
-        for atom in self.atoms:
-            atom.q = atom.qsave
-            atom.x = atom.xsave
+        store = self.store
+        store.q[:] = store.qsave
+        store.x[:] = store.xsave
 
-            atom.qhi = atom.q + atom.dq
-            atom.qlo = atom.q - atom.dq
+        q = store.view("q")
+        dq = store.view("dq")
+        np.add(q, dq, out=store.view("qhi"))
+        np.subtract(q, dq, out=store.view("qlo"))
 
-    def get_jacobian(self):
+    def get_jacobian_pattern(self):
+
+        """Builds the CSR structure of the jacobian from the registered
+        jacobian cells. When a cell is registered more than once the last
+        registration is used.
+        :return: (order, indices, indptr), where order maps the values of all
+        cells (state atom, then jacfuncs order) to the CSR data array
+        """
 
-        jacobian = np.zeros((self.n, self.n))
+        rows = []
+        cols = []
 
         for atom in self.state_atoms:
             for other, func in atom.jacfuncs:
-                if atom.derargfunc:
-                    args = atom.derargfunc(atom.device)
-                    jacobian[atom.index, other.index] = func(*args)
-                else:
-                    if atom is other:
-                        jacobian[atom.index, other.index] = func(atom.device, atom.q)
-                    else:
-                        jacobian[atom.index, other.index] = func(atom.device, atom.q, other.index)
+                rows.append(atom.index)
+                cols.append(other.index)
+
+        rows = np.array(rows, dtype=int)
+        cols = np.array(cols, dtype=int)
+
+        keys = rows * self.n + cols
+        k = len(keys)
+
+        # last occurrence of each cell, sorted by (row, col):
+        unique, first = np.unique(keys[::-1], return_index=True)
+        order = k - 1 - first
+
+        indices = cols[order]
+        indptr = np.searchsorted(rows[order], np.arange(self.n + 1))
+
+        return order, indices, indptr
+
+    def get_jacobian(self):
+
+        """Evaluates the jacobian of the state derivatives.
+        :return: (n, n) CSR matrix
+        """
+
+        if self.jacobian is None:
+            self.jacobian = self.get_jacobian_pattern()
+
+        order, indices, indptr = self.jacobian
+
+        values = []
+        for atom in self.state_atoms:
+            if atom.jacfuncs:
+                values.extend(atom.get_jacobian_row())
+
+        data = np.array(values, dtype=float)[order]
+
+        return sparse.csr_matrix((data, indices, indptr),
+                                 shape=(self.n, self.n))
+
+    def build_ode(self):
+
+        """Builds a vectorized derivative function f(t, x) and its sparse
+        jacobian jac(t, x) for all state atoms. Atoms defined by coefficient
+        connections are collected into sparse matrices (dx/dt = a*x + b*u),
+        each SymbolicDevice is evaluated with one lambdified vector
+        expression, and any other atoms fall back to atom.f(). Sources are
+        evaluated at the integrator time t. Coefficient functions (coeffunc)
+        are re-evaluated with the current states on every call; the jacobian
+        uses their values and does not include their derivatives, unless the
+        atom is an "other" with registered jacfuncs. Constant coefficients
+        and symbolic parameters are read here, so the functions must be
+        rebuilt after they change.
+        :return: (f, jac) functions for scipy.integrate.solve_ivp
+        """
 
-        return jacobian
+        n = self.n
+
+        arows, acols, avals = [], [], []  # state coupling
+        brows, bcols, bvals = [], [], []  # source inputs
+        afuncs, bfuncs = [], []  # (entry, coeffunc, device) re-evaluated
+        sources = []  # source atoms in b column order
+        blocks = []   # symbolic device evaluators
+        others = []   # atoms evaluated with atom.f()
+
+        done = set()
+
+        for device in self.devices:
+            block = device.get_ode_block() if isinstance(
+                device, SymbolicDevice) else None
+            if block:
+                blocks.append(block)
+                done.update(block[0])
+
+        for atom in self.state_atoms:
+
+            if atom.index in done:
+                continue
+
+            linear = (not atom.derfunc and type(atom).f is StateAtom.f and
+                      all(not c.valfunc and (c.other is None or
+                          isinstance(c.other, (StateAtom, SourceAtom)))
+                          for c in atom.connections))
+
+            if not linear:
+                others.append(atom)
+                continue
+
+            if atom.coeffunc:
+                afuncs.append((len(avals), atom.coeffunc, atom.device))
+
+            arows.append(atom.index)
+            acols.append(atom.index)
+            avals.append(atom.compute_coefficient())
+
+            for connection in atom.connections:
+
+                other = connection.other
+
+                if isinstance(other, StateAtom):
+                    if connection.coeffunc:
+                        afuncs.append((len(avals), connection.coeffunc,
+                                       connection.device))
+                    arows.append(atom.index)
+                    acols.append(other.index)
+                    avals.append(connection.compute_coefficient())
+
+                elif isinstance(other, SourceAtom):
+                    if other not in sources:
+                        sources.append(other)
+                    if connection.coeffunc:
+                        bfuncs.append((len(bvals), connection.coeffunc,
+                                       connection.device))
+                    brows.append(atom.index)
+                    bcols.append(sources.index(other))
+                    bvals.append(connection.compute_coefficient())
+
+        avals = np.array(avals, dtype=float)
+        bvals = np.array(bvals, dtype=float)
+
+        def assemble(rows, cols, vals, shape):
+
+            # csr matrix plus the data slot of each (row, col, val) entry, so
+            # the values can be re-summed in place:
+
+            keys = np.array(rows, dtype=np.int64) * shape[1] + np.array(
+                cols, dtype=np.int64)
+            keys, slots = np.unique(keys, return_inverse=True)
+            indptr = np.searchsorted(keys // max(shape[1], 1),
+                                     np.arange(shape[0] + 1))
+            data = np.bincount(slots, weights=vals, minlength=len(keys))
+            matrix = sparse.csr_matrix((data, keys % max(shape[1], 1), indptr),
+                                       shape=shape)
+            return matrix, slots
+
+        a, aslots = assemble(arows, acols, avals, (n, n))
+        b, bslots = assemble(brows, bcols, bvals, (n, len(sources)))
+
+        def update(x):
+
+            # re-evaluates the coefficient functions with q = x:
+
+            self.store.view("q")[self.state_ids] = x
+
+            if afuncs:
+                for k, func, device in afuncs:
+                    avals[k] = func(device)
+                a.data[:] = np.bincount(aslots, weights=avals,
+                                        minlength=len(a.data))
+
+            if bfuncs:
+                for k, func, device in bfuncs:
+                    bvals[k] = func(device)
+                b.data[:] = np.bincount(bslots, weights=bvals,
+                                        minlength=len(b.data))
+
+        dynamic = bool(afuncs or bfuncs or others)
+
+        def f(t, x):
+
+            if dynamic:
+                update(x)
+
+            dx_dt = a.dot(x)
+
+            if sources:
+                u = np.array([atom.value(t) for atom in sources], dtype=float)
+                dx_dt += b.dot(u)
+
+            for rows, fixed, args, func, jrows, jcols, jfunc in blocks:
+                dx_dt[rows] = func(*fixed, *x[args])
+
+            for atom in others:
+                dx_dt[atom.index] = atom.f()
+
+            return dx_dt
+
+        def jac(t, x):
+
+            if dynamic:
+                update(x)
+
+            rows = [arows]
+            cols = [acols]
+            vals = [avals]
+
+            for _, fixed, args, _, jrows, jcols, jfunc in blocks:
+                rows.append(jrows)
+                cols.append(jcols)
+                vals.append(np.array(jfunc(*fixed, *x[args]), dtype=float))
+
+            for atom in others:
+                if atom.jacfuncs:
+                    rows.append([atom.index] * len(atom.jacfuncs))
+                    cols.append([other.index for other, func
+                                 in atom.jacfuncs])
+                    vals.append(atom.get_jacobian_row())
+
+            return sparse.csr_matrix((np.concatenate(vals),
+                                      (np.concatenate(rows),
+                                       np.concatenate(cols))), shape=(n, n))
+
+        return f, jac
 
     @staticmethod
     def fode(t, x, sys):
@@ -945,15 +1957,9 @@ class System(object):
         scipy ode integrator function. Note that sys is a global module variable.
         """
 
-        dx_dt = [0.0] * sys.n
-
-        for atom in sys.state_atoms:
-            atom.q = x[atom.index]
+        sys.store.view("q")[sys.state_ids] = x
 
-        for atom in sys.state_atoms:
-            dx_dt[atom.index] = atom.f()
-
-        return dx_dt
+        return [atom.f() for atom in sys.state_atoms]
 
     @staticmethod
     def fode2(x, t=0.0, sys=None):
@@ -963,27 +1969,21 @@ class System(object):
         scipy ode integrator function. Note that sys is a global module variable.
         """
 
-        y = [0.0] * sys.n
-
-        for atom in sys.state_atoms:
-            atom.q = x[atom.index]
+        sys.store.view("q")[sys.state_ids] = x
 
-        for atom in sys.state_atoms:
-            y[atom.index] = atom.f()
-
-        return y
+        return [atom.f() for atom in sys.state_atoms]
 
     def solve_dc(self, init=True, set=True):
 
-        xi = [0.0]*self.n
+        if init:
+            xi = [atom.x0 for atom in self.state_atoms]
+        else:
+            xi = self.store.view("x")[self.state_ids]
 
-        for atom in self.state_atoms:
-            if init:
-                xi[atom.index] = atom.x0
-            else:
-                xi[atom.index] = atom.x
+        xdc = self.solve_newton(xi)
 
-        xdc = fsolve(self.fode2, xi, args=(0, sys), xtol=1e-12)
+        if xdc is None:
+            xdc = fsolve(self.fode2, xi, args=(0, self), xtol=1e-12)
 
         for atom in self.state_atoms:
             if init:
@@ -994,6 +1994,66 @@ class System(object):
 
         return xdc
 
+    def solve_newton(self, xi, xtol=1e-12, maxiter=50):
+
+        """Solves f(x) = 0 for the state derivatives with Newton's method,
+        using the analytic sparse jacobian from build_ode and a backtracking
+        line search on the residual norm.
+        :param xi: initial state vector
+        :param xtol: relative step size for convergence
+        :param maxiter: maximum Newton iterations
+        :return: solution vector, or None if Newton did not converge (ex.
+        singular jacobian)
+        """
+
+        f, jac = self.build_ode()
+
+        x = np.array(xi, dtype=float)
+        r = f(0.0, x)
+        rnorm = la.norm(r)
+
+        for i in range(maxiter):
+
+            if rnorm == 0.0:
+                return x
+
+            try:
+                dx = sla.splu(jac(0.0, x).tocsc()).solve(-r)
+            except RuntimeError:
+                return None  # singular jacobian
+
+            if not np.all(np.isfinite(dx)):
+                return None
+
+            # backtrack until the residual decreases:
+
+            alpha = 1.0
+            while True:
+                xn = x + alpha * dx
+                rn = f(0.0, xn)
+                rnorm_n = la.norm(rn)
+                if rnorm_n < (1.0 - 1.0e-4 * alpha) * rnorm:
+                    break
+                alpha *= 0.5
+                if alpha < 1.0e-8:
+                    break
+
+            step = la.norm(alpha * dx)
+
+            if alpha < 1.0e-8:
+                # no decrease possible: converged only if already at the
+                # rounding level of x:
+                if la.norm(dx) <= xtol * (1.0 + la.norm(x)):
+                    return x
+                return None
+
+            x, r, rnorm = xn, rn, rnorm_n
+
+            if step <= xtol * (1.0 + la.norm(x)):
+                return x
+
+        return None
+
     def initialize(self, t0=0.0, dt=1e-4, dc=False):
 
         self.time = t0
@@ -1007,6 +2067,13 @@ class System(object):
         if dc:
             self.solve_dc()
 
+        self.queue = EventQueue(len(self.atoms))
+        self.worklist = deque()
+
+        self.qss_out = Recorder()
+        self.ss_out = Recorder()
+        self.ode_out = Recorder()
+
         for atom in self.state_atoms:   
             atom.initialize(self.time)
 
@@ -1014,7 +2081,12 @@ class System(object):
             atom.initialize(self.time)
 
     def run(self, tstop, ode=True, qss=True, verbose=True, qss_fixed_dt=None,
-            ode_method="RK45", optimize_dq=False, chk_ss_delay=None):
+            ode_method="RK45", optimize_dq=False, chk_ss_delay=None,
+            partitions=None, sync_window=None):
+
+        if partitions and not sync_window:
+            raise ValueError("A partitioned run needs an explicit "
+                             "sync_window (see run_partitions).")
 
         self.verbose = verbose
         self.calc_ss = False
@@ -1051,31 +2123,42 @@ class System(object):
                 self.save_state()
                 self.enable_slewrate = False
 
-                xi = [0.0]*self.n
-                for atom in self.state_atoms:
-                    xi[atom.index] = atom.x
+                xi = self.store.view("x")[self.state_ids]
 
                 tspan = (self.time, self.tstop)
 
-                soln = solve_ivp(self.fode, tspan, xi, ode_method, args=(sys,),
-                                 max_step=self.dt)
+                f, jac = self.build_ode()
+
+                # analytic jacobian for the implicit (stiff) methods:
+
+                options = {}
+
+                if ode_method in ("BDF", "Radau"):
+                    options["jac"] = jac
+                elif ode_method == "LSODA":
+                    options["jac"] = lambda t, x: jac(t, x).toarray()
+
+                soln = solve_ivp(f, tspan, xi, ode_method, max_step=self.dt,
+                                 **options)
 
                 t = soln.t
                 x = soln.y
 
-                for i in range(len(t)):
+                if self.record_mode != RecordMode.OFF:
+                    self.ode_out.extend(np.repeat(t, self.n),
+                                        np.tile(self.state_ids, len(t)),
+                                        x.T.ravel())
+
+                for atom in self.state_atoms:
+                    atom.updates_ode += len(t)
 
-                    for atom in self.state_atoms:
-                        atom.q = x[atom.index, i]
-                        atom.save_ode(t[i], atom.q)
+                for i in range(len(t)):
 
                     for atom in self.source_atoms:
-                        atom.save_ode(t[i], atom.dint())
+                        atom.save_ode(t[i], atom.value(t[i]))
 
-                for atom in self.state_atoms:
-                    xf = x[atom.index, -1]
-                    atom.x = xf
-                    atom.q = xf
+                self.store.view("x")[self.state_ids] = x[:, -1]
+                self.store.view("q")[self.state_ids] = x[:, -1]
 
                 for atom in self.source_atoms:
                     atom.dint()
@@ -1110,19 +2193,15 @@ class System(object):
 
                         self.time += qss_fixed_dt
 
+                elif partitions:
+
+                    self.propagate()
+                    self.run_partitions(partitions, sync_window)
+
                 else:
-                    # now iterate over atoms until nothing triggered:
-
-                    i = 0
-                    while i < _MAXITER:
-                        triggered = False
-                        for atom in self.atoms:
-                            if atom.triggered:
-                                triggered = True
-                                atom.update(self.time)
-                        if not triggered:
-                            break
-                        i += 1
+                    # now update the triggered atoms until nothing triggered:
+
+                    self.propagate()
 
                     # main simulation loop:
 
@@ -1165,6 +2244,281 @@ class System(object):
                 for event in events:
                     event(self)
 
+    def partition_devices(self, n):
+
+        """Splits the devices into n partitions of about the same number of
+        atoms. Devices are taken in breadth-first order of their coupling
+        (broadcasts between their atoms), so coupled devices tend to share a
+        partition and the partitions are mostly connected.
+        :return: list of device lists
+        """
+
+        n = max(1, min(n, len(self.devices)))
+
+        neighbors = {device: [] for device in self.devices}
+
+        for atom in self.atoms:
+            for other in atom.broadcast_to:
+                if other.device is not atom.device:
+                    neighbors[atom.device].append(other.device)
+
+        order = []
+        visited = set()
+
+        for root in self.devices:
+            if root in visited:
+                continue
+            visited.add(root)
+            pending = deque([root])
+            while pending:
+                device = pending.popleft()
+                order.append(device)
+                for other in neighbors[device]:
+                    if other not in visited:
+                        visited.add(other)
+                        pending.append(other)
+
+        size = float(len(self.atoms)) / n
+
+        partitions = [[] for i in range(n)]
+        count = 0
+
+        for device in order:
+            k = min(int(count / size), n - 1)
+            partitions[k].append(device)
+            count += len(device.atoms)
+
+        return [devices for devices in partitions if devices]
+
+    def run_partitions(self, partitions, window):
+
+        """Runs the QSS simulation from the current time to tstop with the
+        atoms split into partitions, each advanced by its own worker process
+        (forked, so POSIX only). The quantized outputs of atoms read across
+        partitions are exchanged at the end of every sync window and held
+        (QSS2 atoms: their quantized lines extended) within a window.
+
+        The scheme is approximate. It is not a conservative synchronization:
+        no lookahead bounds the window, so the coupling between partitions
+        lags by up to one window, like an explicit (forward Euler) step of
+        size window on the cut connections. The results depend on the window
+        and differ from the unpartitioned run by up to about
+        window * max|dx/dt| of the exchanged outputs (plus a few quanta);
+        a window near the time constants of the cut connections can make the
+        coupling unstable. Small windows cost one round trip to every worker
+        per window, so choose the largest window the coupling error allows.
+        Partitions that read nothing from each other run to tstop in one
+        window.
+        :param partitions: number of partitions (see partition_devices) or a
+        sequence of device sequences covering all devices once
+        :param window: sync window in seconds (required, > 0)
+        """
+
+        if not window or window <= 0.0:
+            raise ValueError("run_partitions needs an explicit sync window "
+                             "(> 0); the coupling between partitions lags by "
+                             "up to one window.")
+
+        if "fork" not in mp.get_all_start_methods():
+            raise RuntimeError("run_partitions forks its worker processes, "
+                               "which this platform does not support.")
+
+        if isinstance(partitions, int):
+            partitions = self.partition_devices(partitions)
+
+        partitions = [devices for devices in partitions if devices]
+
+        owner = {}
+
+        for p, devices in enumerate(partitions):
+            for device in devices:
+                for atom in device.atoms:
+                    if atom.id in owner:
+                        raise ValueError("Device {} is in more than one "
+                                         "partition.".format(device.name))
+                    owner[atom.id] = p
+
+        if len(owner) != len(self.atoms):
+            raise ValueError("The partitions do not cover all devices.")
+
+        # atoms read by other partitions (exports) and the remote atoms each
+        # partition reads (imports):
+
+        exports = [set() for devices in partitions]
+        imports = [set() for devices in partitions]
+
+        for atom in self.atoms:
+            p = owner[atom.id]
+            for other in atom.broadcast_to:
+                k = owner[other.id]
+                if k != p:
+                    exports[p].add(atom.id)
+                    imports[k].add(atom.id)
+
+        if not any(imports):
+            window = _INF  # uncoupled, nothing to exchange
+
+        context = mp.get_context("fork")
+
+        pipes = []
+        workers = []
+
+        try:
+
+            for p in range(len(partitions)):
+                local = sorted(i for i in owner if owner[i] == p)
+                pipe, child = context.Pipe()
+                worker = context.Process(target=self.partition_worker,
+                                         args=(child, local,
+                                               sorted(exports[p])))
+                worker.start()
+                pipes.append(pipe)
+                workers.append(worker)
+
+            outputs = {}
+            time = self.time
+
+            while True:
+
+                tstop = None
+                if time < self.tstop:
+                    tstop = min(time + window, self.tstop)
+
+                for p, pipe in enumerate(pipes):
+                    pipe.send((tstop, {i: outputs[i] for i in imports[p]
+                                       if i in outputs}))
+
+                replies = [pipe.recv() for pipe in pipes]
+
+                for reply in replies:
+                    if isinstance(reply, Exception):
+                        raise reply
+
+                if tstop is None:
+                    break
+
+                outputs = {}
+                for reply in replies:
+                    outputs.update(reply)
+
+                time = tstop
+
+        finally:
+
+            for pipe in pipes:
+                pipe.close()
+
+            for worker in workers:
+                worker.join()
+
+        # merge the final states and outputs of the partitions:
+
+        for local, rows, slots, qss_rows, ss_rows in replies:
+
+            for field in AtomStore.fields:
+                self.store.view(field)[local] = rows[field]
+
+            for i, values in zip(local, slots):
+                atom = self.atoms[i]
+                for name, value in values.items():
+                    setattr(atom, name, value)
+
+            if len(qss_rows[0]):
+                self.qss_out.extend(*qss_rows)
+
+            if len(ss_rows[0]):
+                self.ss_out.extend(*ss_rows)
+
+        for atom in self.atoms:
+            self.queue.update(atom.id, atom.tnext)
+
+        self.time = self.tstop
+
+    def partition_worker(self, pipe, local, exports):
+
+        """Worker process loop of run_partitions. Advances the local atoms
+        (ids) one sync window at a time and sends back the exported atoms
+        whose quantized output changed. A window end of None finishes the
+        run and sends back the local states and recorded outputs.
+        """
+
+        try:
+
+            atoms = self.atoms
+            store = self.store
+            fields = AtomStore.fields
+            queue = self.queue
+
+            # broadcasts only reach local atoms, remote atoms never fire:
+
+            members = set(local)
+
+            for atom in atoms:
+                atom.broadcast_to = [other for other in atom.broadcast_to
+                                     if other.id in members]
+                if atom.id not in members:
+                    queue.update(atom.id, _INF)
+
+            self.qss_out = Recorder()
+            self.ss_out = Recorder()
+
+            sent = {}
+
+            while True:
+
+                tstop, inputs = pipe.recv()
+
+                # take the remote outputs of the last window and update the
+                # local atoms that read them:
+
+                for i, (row, mq, tq) in inputs.items():
+                    atom = atoms[i]
+                    for field, value in zip(fields, row):
+                        getattr(store, field)[i] = value
+                    atom.mq = mq
+                    atom.tq = tq
+                    atom.broadcast()
+
+                self.propagate()
+
+                if tstop is None:
+                    break
+
+                while queue.peek() <= tstop:
+                    self.time = min(max(queue.peek(), self.time + _EPS), tstop)
+                    for i in sorted(queue.pop_due(self.time)):
+                        atoms[i].update(self.time)
+                    self.propagate()
+
+                self.time = tstop
+
+                outputs = {}
+
+                for i in exports:
+                    atom = atoms[i]
+                    key = (atom.q0, atom.mq)
+                    if sent.get(i) != key:
+                        sent[i] = key
+                        outputs[i] = (store.row(i), atom.mq, atom.tq)
+
+                pipe.send(outputs)
+
+            for i in local:
+                atoms[i].update(self.time)
+                atoms[i].save()
+
+            rows = {field: self.store.view(field)[local] for field in fields}
+            slots = [_slot_values(atoms[i]) for i in local]
+
+            pipe.send((local, rows, slots, self.qss_out.rows(),
+                       self.ss_out.rows()))
+
+        except Exception as error:
+            pipe.send(error)
+
+        finally:
+            pipe.close()
+
     def calc_steadystate(self):
         
         self.jac1 = self.get_jacobian()
@@ -1209,53 +2563,23 @@ class System(object):
         if 1:
 
             factor = 0.5
-            
-            E = np.zeros((self.n, self.n))
 
-            dq1 = np.zeros((self.n, 1))
-            dq2 = np.zeros((self.n, 1))
-        
-            for atom in self.state_atoms:
-                for j in range(self.n):
-                    if atom.index == j:
-                        E[atom.index, atom.index] = (atom.dq0*factor)**2
-                    else:
-                        pass
-                        E[atom.index, j] = (atom.dq0*factor)     
-                 
-            JTJ = self.jac1.transpose().dot(self.jac1)
-            Q = la.solve(JTJ, E)
+            # E[i, j] = dq0_i * factor, with (dq0_i * factor)**2 on the
+            # diagonal:
 
-            for atom in self.state_atoms:
-                dq = 999999.9
-                for j in range(self.n):
-                    if atom.index == j:
-                       dqii = sqrt(abs(Q[atom.index, j]))
-                       dqii = abs(Q[atom.index, j])
-                       if dqii < dq:
-                           dq = dqii
-                    else:
-                       dqij = abs(Q[atom.index, j])
-                       if dqij < dq:
-                           dq = dqij  
-                dq1[atom.index, 0] = dq
+            e = self.dq0 * factor
+            E = np.repeat(e, self.n, axis=1)
+            np.fill_diagonal(E, np.square(e[:, 0]))
+
+            # dq is the smallest |Q[i, j]| of each row (capped):
+
+            JTJ = self.jac1.transpose().dot(self.jac1)
+            Q = sla.splu(JTJ.tocsc()).solve(E)
+            dq1 = np.minimum(np.abs(Q).min(axis=1, keepdims=True), 999999.9)
 
             JTJ = self.jac2.transpose().dot(self.jac2)
-            Q = la.solve(JTJ, E)
-            
-            for atom in self.state_atoms:
-                dq = 999999.9
-                for j in range(self.n):
-                    if atom.index == j:
-                        dqii = sqrt(abs(Q[atom.index, j]))
-                        dqii = abs(Q[atom.index, j])
-                        if dqii < dq:
-                            dq = dqii
-                    else:
-                        dqij = abs(Q[atom.index, j])
-                        if dqij < dq:
-                            dq = dqij  
-                dq2[atom.index, 0] = dq
+            Q = sla.splu(JTJ.tocsc()).solve(E)
+            dq2 = np.minimum(np.abs(Q).min(axis=1, keepdims=True), 999999.9)
 
         if self.verbose:
             print("at t=inf:")
@@ -1278,11 +2602,9 @@ class System(object):
 
         is_ss = False
 
-        q = [0.0]*self.n
-        for atom in self.state_atoms:
-            q[atom.index] = atom.q
+        q = self.store.view("q")[self.state_ids]
 
-        qe = la.norm(np.add(q, -self.xf))
+        qe = la.norm(q - self.xf)
 
         if (qe < self.steadystate_distance):
             is_ss = True
@@ -1300,28 +2622,39 @@ class System(object):
 
     def advance(self):
 
-        tnext = _INF
-
-        for atom in self.atoms:
-            tnext = min(atom.tnext, tnext)
+        tnext = self.queue.peek()
 
         self.time = max(tnext, self.time + _EPS)
         self.time = min(self.time, self.tstop)
 
-        for atom in self.atoms:
-            if atom.tnext <= self.time or self.time >= self.tstop:
-                atom.update(self.time)
+        if self.time >= self.tstop:
+            due = self.atoms
+        else:
+            # update the due atoms in system order:
+            due = [self.atoms[i] for i in sorted(self.queue.pop_due(self.time))]
+
+        for atom in due:
+            atom.update(self.time)
+
+        self.propagate()
+
+    def propagate(self):
+
+        """Updates the atoms triggered by broadcasts (and the atoms they
+        trigger in turn) at the current time. Atoms already updated since
+        they were queued are skipped. Stops after _MAXITER updates per atom
+        if the system does not settle.
+        """
+
+        worklist = self.worklist
+        limit = _MAXITER * len(self.atoms)
 
         i = 0
-        while i < _MAXITER:
-            triggered = False
-            for atom in self.atoms:
-                if atom.triggered:
-                    triggered = True
-                    atom.update(self.time)
-            if not triggered:
-                break
-            i += 1
+        while worklist and i < limit:
+            atom = worklist.popleft()
+            if atom.triggered:
+                atom.update(self.time)
+                i += 1
 
     def plot_devices(self, *devices, plot_qss=True, plot_ss=False,
              plot_qss_updates=False, plot_ss_updates=False, legend=False):
@@ -1362,7 +2695,7 @@ class System(object):
                 ax2.set_ylabel('updates', color='r')
 
             if plot_qss:
-                ax1.plot(atom.tzoh, atom.qzoh, 'b-', label="qss_q")
+                ax1.plot(*atom.hold(), 'b-', label="qss_q")
 
             if plot_ss:
                 ax1.plot(atom.tout_ss, atom.xout_ss, 'c--', label="ss_x")
@@ -1508,9 +2841,9 @@ class System(object):
 
             if plot_zoh:
                 
-                lbl = "qss (zoh)"
+                lbl = "qss (hold)"
 
-                ax1.plot(atom.tzoh, atom.qzoh, color="tab:red", linestyle="-",
+                ax1.plot(*atom.hold(), color="tab:red", linestyle="-",
                          alpha=0.5, label=lbl)
 
             if plot_ss:
@@ -1945,6 +3278,8 @@ class SymbolicDevice(Device):
 
         self.ports = odict()
 
+        self.argsyms = None  # derivative function arguments (see get_args)
+
     def add_state(self, name, dername, desc="", units="", x0=0.0, dq=1e-3):
 
         self.states[name] = odict()
@@ -2187,6 +3522,8 @@ class SymbolicDevice(Device):
         argstr = " ".join(argstrs)
         argsyms = sp.var(argstr)
 
+        self.argsyms = argsyms
+
         for name, state in self.states.items():
 
             expr = state["expr"]
@@ -2246,6 +3583,54 @@ class SymbolicDevice(Device):
 
                     statex["atom"].add_jacfunc(statey["atom"], func)
 
+    def get_ode_block(self):
+
+        """Returns the vectorized evaluator of this device for
+        System.build_ode: (state indices, constant and parameter values,
+        state argument indices, derivatives function, jacobian rows,
+        jacobian columns, jacobian function). The argument order follows
+        get_args. Returns None if an input is not connected to a state atom.
+        """
+
+        if self.argsyms is None:
+            return None
+
+        syms = self.argsyms
+        if isinstance(syms, sp.Symbol):
+            syms = (syms,)
+
+        fixed = ([float(constant["value"]) for constant in self.constants.values()]
+                 + [float(parameter["value"]) for parameter in self.parameters.values()])
+
+        rows = [state["atom"].index for state in self.states.values()]
+        args = list(rows)
+
+        for port in self.input_ports.values():
+            for port2 in port["ports"]:
+                if not isinstance(port2["atom"], StateAtom):
+                    return None
+                args.append(port2["atom"].index)
+
+        exprs = [state["expr"] for state in self.states.values()]
+
+        jrows = []
+        jcols = []
+        jexprs = []
+
+        for row, expr in zip(rows, exprs):
+            for col, sym in zip(args, syms[len(fixed):]):
+                df_dy = sp.diff(expr, sym)
+                if df_dy != 0:
+                    jrows.append(row)
+                    jcols.append(col)
+                    jexprs.append(df_dy)
+
+        func = lambdify(syms, exprs, dummify=False)
+        jfunc = lambdify(syms, jexprs, dummify=False)
+
+        return (rows, fixed, np.array(args, dtype=int), func,
+                jrows, jcols, jfunc)
+
     @staticmethod
     def get_args(self):
 
@@ -61,7 +61,8 @@ class Simulator():
     def tf(self):
         raise NotImplementedError()
 
-    def trans(self, tstep, tstop, tstart=None, tmax=None, uic=False):
+    def trans(self, tstep, tstop, tstart=None, tmax=None, uic=False,
+              resume=False):
 
         """SPICE .TRAN command (Transient Analysis)
         General form:
@@ -96,31 +97,68 @@ class Simulator():
         :param tstart: TODO
         :param tmax: TODO
         :param uic: Flag for use initial conditions
+        :param resume: Continue the last run from its current time up to
+        tstop, appending to trans_data, without restarting the devices. Edits
+        made between the runs (set_value, add_device, remove_device) are
+        applied to the running netlist, so unchanged devices keep their state.
         :return: None
         """
 
         # determine the time-series array length and setup the circuit:
 
         n = int(tstop / tstep) + 1
-        self.netlist.start(tstep)
-        self.tmax = tstop
 
-        # allocate the arrays and save to variables for plot():
+        if resume and self.trans_data is not None:
+
+            if tstep != self.netlist.dt:
+                msg = ("Cannot resume a run at a different timestep ({0}s, "
+                       "started at {1}s).".format(tstep, self.netlist.dt))
+                raise ValueError(msg)
+
+            i0 = self.trans_data.shape[1]
+            n = max(n, i0)
+
+            self.trans_time = numpy.arange(n) * tstep
+            self.trans_data = numpy.hstack(
+                (self.trans_data, numpy.zeros((self.trans_data.shape[0],
+                                               n - i0))))
+
+            # re-render the source waveforms over the extended grid:
+
+            for device in self.netlist.devices.values():
+                stimulus = getattr(device, "stimulus", None)
+                if isinstance(stimulus, Stimulus):
+                    stimulus.prerender(tstep, self.trans_time)
+
+        else:
+
+            i0 = 0
+
+            # the time grid is allocated before the netlist is started so that
+            # sources can pre-render their stimulus waveforms on it:
+
+            self.trans_time = numpy.arange(n) * tstep  # array for time values
 
-        self.trans_data = numpy.zeros((self.netlist.nodenum, n))
-        self.trans_time = numpy.zeros(n)  # array for time values
+            self.netlist.start(tstep)
+
+            # allocate the arrays and save to variables for plot():
+
+            self.trans_data = numpy.zeros((self.netlist.nodenum, n))
+
+            self.t = 0.0
+
+        self.tmax = tstop
 
         # step through time evolution of the network and save off across data
         # for each timestep:
 
-        self.t = 0.0
         p1 = 0.0
         p0 = p1
         step = 0.05
 
         itr = []
 
-        for i in range(n):
+        for i in range(i0, n):
 
             self.netlist.simulation_hook(tstep, self.t)
 
@@ -146,6 +184,19 @@ class Simulator():
                 itr = []
                 print(s)
 
+    def resize(self, nodenum):
+
+        """Grows the recorded data when nodes are added to the netlist during
+        (or between) runs. The new rows are zero before the node existed.
+        :param nodenum: new number of nodes
+        :return: None
+        """
+
+        if self.trans_data is not None and nodenum > len(self.trans_data):
+            rows = numpy.zeros((nodenum - len(self.trans_data),
+                                self.trans_data.shape[1]))
+            self.trans_data = numpy.vstack((self.trans_data, rows))
+
     def save(self):
 
         raise NotImplementedError()
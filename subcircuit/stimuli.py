@@ -17,6 +17,8 @@ limitations under the License.
 
 import math
 
+import numpy as np
+
 import subcircuit.interfaces as inter
 
 
@@ -86,6 +88,21 @@ class Pulse(inter.Stimulus):
         else:
             return self.v1
 
+    def render(self, dt, t):
+        t = np.mod(t, self.per)
+        t1 = self.td + self.tr
+        t2 = t1 + self.pw
+        t3 = t2 + self.tf
+        high = (t1 <= t) & (t < t2)
+        rise = (self.td <= t) & (t < t1)
+        fall = (t2 <= t) & (t < t3)
+        return np.select(
+            (high, rise, fall),
+            (self.v2,
+             self.v1 + (self.v2 - self.v1) * (t - self.td) / self.tr,
+             self.v2 + (self.v1 - self.v2) * (t - t2) / self.tf),
+            self.v1)
+
     def __str__(self):
         s = "Pulse({0}, {1}, {2}, {3}, {4}, {5}, {6})".format(self.v1, self.v2,
                                                          self.td, self.tr,
@@ -147,6 +164,16 @@ class Sin(inter.Stimulus):
             return self.vo + self.va * math.sin(
                 2.0 * math.pi * self.freq * (t + self.td) + self.phi)
 
+    def render(self, dt, t):
+        """Computes the stimulus values over an array of times."""
+        t = np.asarray(t, dtype=float)
+        wave = np.sin(2.0 * math.pi * self.freq * (t + self.td) + self.phi)
+        if self.theta:
+            wave *= np.exp(-(t + self.td) / self.theta)
+        wave = self.vo + self.va * wave
+        wave[t < self.td] = 0.0
+        return wave
+
     def __str__(self):
         s = "Sin({0}, {1}, {2}, {3}, {4}, {5})".format(self.vo, self.va,
                                                        self.freq, self.td,
@@ -190,17 +217,26 @@ class Exp(inter.Stimulus):
 
     def step(self, dt, t):
         """Update and return the current value of the Exp stimulus"""
-        if 0.0 >= t < self.td1:
+        if t < self.td1:
             return self.v1
-        elif self.td1 <= t < self.td1:
-            return self.v1 + (self.v2 - self.v2) * (
+        elif t < self.td2:
+            return self.v1 + (self.v2 - self.v1) * (
                    1.0 - math.exp(-(t - self.td1) / self.tau1))
         else:
-            return (1.0 + (self.v2 - self.v1)
+            return (self.v1 + (self.v2 - self.v1)
                     * (1.0 - math.exp(-(t - self.td1) / self.tau1))
                     + (self.v1 - self.v2) * (
                     1.0 - math.exp(-(t - self.td2) / self.tau2)))
 
+    def render(self, dt, t):
+        """Computes the stimulus values over an array of times."""
+        t = np.asarray(t, dtype=float)
+        rise = (self.v2 - self.v1) * (
+            1.0 - np.exp(-np.maximum(t - self.td1, 0.0) / self.tau1))
+        fall = (self.v1 - self.v2) * (
+            1.0 - np.exp(-np.maximum(t - self.td2, 0.0) / self.tau2))
+        return self.v1 + rise + fall
+
     def __str__(self):
         s = "Exp({0}, {1}, {2}, {3}, {4}, {5})".format(self.v1, self.v2,
                                                        self.td1, self.tau1,
@@ -212,37 +248,51 @@ class Exp(inter.Stimulus):
 
 
 class Pwl(inter.Stimulus):
-    """TODO Doc"""
+    """Piece-wise linear stimulus for independent sources."""
+
     def __init__(self, *time_voltage_pairs):
-        self.xp = []
-        self.yp = []
+        """
+        General form:
+
+             PWL(T1 V1 <T2 V2 T3 V3 T4 V4 ...>)
+
+        Examples:
+
+             VCLOCK 7 5 PWL(0 -7 10NS -7 11NS -3 17NS -3 18NS -7 50NS -7)
+
+        Each pair of values (Ti, Vi) specifies that the value of the source is
+        Vi (in Volts or Amps) at time = Ti. The value of the source at
+        intermediate values of time is determined by using linear
+        interpolation on the input values.
+        """
+        pairs = []
         for time, value in time_voltage_pairs:
             try:
-                self.xp.append(float(time))
-                self.yp.append(float(value))
+                pairs.append((float(time), float(value)))
             except ValueError as e:
                 pass
-            pass
+
+        if not pairs:
+            raise ValueError("Pwl requires at least one (time, value) pair.")
+
+        times = [time for time, value in pairs]
+        if any(t1 < t0 for t0, t1 in zip(times, times[1:])):
+            raise ValueError("Pwl times must be non-decreasing.")
+
+        self.table = inter.Table(*pairs)
+        self.xp = self.table.xp
+        self.yp = self.table.yp
+        self.device = None
 
     def start(self, dt):
-        pass
+        return self.step(dt, 0.0)
 
     def step(self, dt, t):
-        x = self.device.get_time()
-        return self._interp_(x)
-
-    def _interp_(self, x):
-        if x <= self.xp[0]:
-            return self.yp[0]
-        elif x >= self.xp[-1]:
-            return self.yp[-1]
-        else:
-            itr = 1
-            while x > self.xp[itr] and itr < (len(self.xp) - 1):
-                itr += 1
-            x0, y0 = self.xp[itr - 1], self.yp[itr - 1]
-            x1, y1 = self.xp[itr], self.yp[itr]
-            return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+        return self.table.output(t)
+
+    def render(self, dt, t):
+        """Computes the stimulus values over an array of times."""
+        return self.table.output(np.asarray(t, dtype=float))
 
     def __str__(self):
         p = ""
@@ -255,6 +305,119 @@ class Pwl(inter.Stimulus):
         return str(self)
 
 
+class PwlFile(inter.Stimulus):
+    """Piece-wise linear stimulus streamed from a file of (time, value)
+    samples, for long recorded waveforms. The file is memory-mapped, so only
+    the pages around the current time are read into memory."""
+
+    def __init__(self, filename, dtype="float64", offset=0):
+        """
+        Define a file driven stimulus.
+        :param filename: Either a .npy file holding an (N, 2) array, or a raw
+        binary file of interleaved (time, value) samples. There must be at
+        least two samples, and times must be non-decreasing (a repeated time
+        is a step to the later sample's value).
+        :param dtype: sample type of a raw binary file, default="float64"
+        :param offset: header bytes to skip in a raw binary file, default=0
+        :return: None
+        """
+        self.filename = filename
+        self.dtype = dtype
+        self.offset = offset
+
+        if filename.endswith(".npy"):
+            data = np.load(filename, mmap_mode="r")
+        else:
+            data = np.memmap(filename, dtype=dtype, mode="r", offset=offset)
+            data = data.reshape(-1, 2)
+
+        self.times = data[:, 0]
+        self.values = data[:, 1]
+
+        if len(self.times) < 2:
+            msg = "PwlFile {0} has fewer than two samples.".format(filename)
+            raise ValueError(msg)
+
+        # check the order a chunk at a time, so the file is not read into
+        # memory at once:
+
+        chunk = 1 << 20
+        for i in range(0, len(self.times) - 1, chunk):
+            if np.any(np.diff(self.times[i:i + chunk + 1]) < 0.0):
+                msg = "PwlFile {0} times are not in order.".format(filename)
+                raise ValueError(msg)
+
+        self.cursor = 0
+        self.window = 64  # samples searched ahead of the cursor
+        self.device = None
+
+    def start(self, dt):
+        self.cursor = 0
+        return self.step(dt, 0.0)
+
+    def step(self, dt, t):
+        times = self.times
+        n = len(times)
+
+        if t <= times[0]:
+            return float(self.values[0])
+
+        elif t >= times[-1]:
+            return float(self.values[-1])
+
+        # sample i spans times[i] <= t < times[i + 1]. Time usually moves
+        # forward a few samples per step, so search a short window ahead of
+        # the cursor before searching the whole file:
+
+        i = self.cursor
+        if times[i] <= t:
+            j = min(i + self.window, n - 1)
+            if t < times[j]:
+                i += int(np.searchsorted(times[i:j + 1], t, side="right")) - 1
+            else:
+                i = int(np.searchsorted(times, t, side="right")) - 1
+        else:
+            i = int(np.searchsorted(times, t, side="right")) - 1
+        self.cursor = i
+
+        t0, t1 = times[i], times[i + 1]
+        v0, v1 = self.values[i], self.values[i + 1]
+
+        if t1 == t0:  # step
+            return float(v1)
+
+        return float(v0 + (v1 - v0) * (t - t0) / (t1 - t0))
+
+    def render(self, dt, t):
+        """Computes the stimulus values over an array of times, reading only
+        the samples around each time."""
+        t = np.asarray(t, dtype=float)
+        times = self.times
+
+        i = np.searchsorted(times, t, side="right") - 1
+        i = np.clip(i, 0, len(times) - 2)
+
+        t0 = times[i]
+        t1 = times[i + 1]
+        v0 = self.values[i]
+        v1 = self.values[i + 1]
+
+        # a step (t1 == t0) takes the later value:
+
+        span = t1 - t0
+        frac = (t >= t1).astype(float)
+        np.divide(t - t0, span, out=frac, where=span > 0.0)
+        frac = np.clip(frac, 0.0, 1.0)
+
+        return v0 + (v1 - v0) * frac
+
+    def __str__(self):
+        s = "PwlFile('{0}')".format(self.filename)
+        return s
+
+    def __repr__(self):
+        return str(self)
+
 
 class Sffm(inter.Stimulus):
     def __init__(self, vo, va, fc, md1, fs):
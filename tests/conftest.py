@@ -0,0 +1,53 @@
+"""Test setup: the package modules are imported both as subcircuit.x and
+(by loader and the gui modules) as top level modules, as when running
+wxsubcircuit.pyw from the package folder.
+
+The device modules import wx for their drawing code only (sandbox, loader),
+so without wxPython a stub module stands in for it and the simulation tests
+still run.
+"""
+
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, "subcircuit")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class WxStub(object):
+
+    """Stands in for any wx class, function or constant: it can be called,
+    subclassed and have any attribute read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return WxStub()
+
+    def __getattr__(self, name):
+        return WxStub()
+
+
+def stub_module(name):
+
+    module = types.ModuleType(name)
+    module.__getattr__ = lambda attr: WxStub
+    module.__path__ = []  # a package, so "from wx.grid import ..." works
+    sys.modules[name] = module
+
+    return module
+
+
+try:
+    import wx
+
+except ImportError:
+    wx = stub_module("wx")
+    for submodule in ("grid", "lib", "adv", "html"):
+        setattr(wx, submodule, stub_module("wx." + submodule))
@@ -0,0 +1,132 @@
+"""MNA device tests.
+"""
+
+import numpy as np
+import pytest
+
+from subcircuit.netlist import Netlist
+from subcircuit.stimuli import Sin
+from subcircuit.devices.r import R
+from subcircuit.devices.l import L
+from subcircuit.devices.v import V
+from subcircuit.devices.t import T
+from subcircuit.devices.lm import LM
+
+
+def line_netlist(source, rload, z0=50.0, td=1e-3, r=0.0):
+
+    netlist = Netlist("line")
+    netlist.device("V1", V((1, 0), source))
+    netlist.device("RS", R((1, 2), z0))
+    netlist.device("T1", T((2, 0, 3, 0), z0, td=td, r=r))
+    netlist.device("RL", R((3, 0), rload))
+
+    return netlist
+
+
+def test_matched_line_delays_the_wave():
+
+    dt, td = 1e-4, 1e-3
+    netlist = line_netlist(Sin(0.0, 10.0, 50.0), 50.0, td=td)
+    netlist.trans(dt, 0.05)
+
+    data = netlist.simulator.trans_data
+    v1 = data[netlist.nodes[1]]
+    v2 = data[netlist.nodes[2]]
+    v3 = data[netlist.nodes[3]]
+    delay = int(round(td / dt))
+
+    # matched at both ends: the line looks like Z0 and nothing reflects:
+
+    assert np.allclose(v2, 0.5 * v1, atol=1e-9)
+    assert np.allclose(v3[delay:], v2[:-delay], atol=1e-9)
+    assert np.allclose(v3[:delay], 0.0)
+
+
+def test_open_line_doubles_the_incident_wave():
+
+    dt, td = 1e-4, 1e-3
+    netlist = line_netlist(Sin(0.0, 10.0, 50.0), 1e12, td=td)
+    netlist.trans(dt, 0.05)
+
+    data = netlist.simulator.trans_data
+    v1 = data[netlist.nodes[1]]
+    v3 = data[netlist.nodes[3]]
+    delay = int(round(td / dt))
+
+    # matched source, so the reflection is absorbed at the sending end:
+
+    assert np.allclose(v3[delay:], v1[:-delay], atol=1e-6)
+
+
+def test_lossy_line_dc_voltage_divider():
+
+    netlist = line_netlist(10.0, 50.0, td=1e-3, r=20.0)
+    netlist.trans(1e-4, 0.2)
+
+    v3 = netlist.simulator.trans_data[netlist.nodes[3]]
+
+    assert np.isclose(v3[-1], 10.0 * 50.0 / (50.0 + 20.0 + 50.0))
+
+
+def test_line_delay_shorter_than_timestep_is_rejected():
+
+    netlist = line_netlist(10.0, 50.0, td=1e-5)
+
+    with pytest.raises(ValueError):
+        netlist.trans(1e-4, 1e-3)
+
+
+def test_single_winding_matches_inductor():
+
+    def rl(inductor):
+        netlist = Netlist("rl")
+        netlist.device("V1", V((1, 0), Sin(0.0, 10.0, 60.0)))
+        netlist.device("R1", R((1, 2), 2.0))
+        netlist.device("L1", inductor)
+        netlist.trans(1e-4, 0.02)
+        node = netlist.devices["L1"].get_current_node()[0]
+        return netlist.simulator.trans_data[node]
+
+    expected = rl(L((2, 0), 0.01))
+    current = rl(LM((2, 0), [[0.01]]))
+
+    assert np.allclose(current, expected, rtol=0.0, atol=1e-12)
+
+
+def test_two_windings_match_backward_euler():
+
+    dt, e, r1, r2 = 1e-4, 10.0, 1.0, 5.0
+    lmat = np.array([[0.02, 0.009], [0.009, 0.005]])
+
+    netlist = Netlist("transformer")
+    netlist.device("V1", V((1, 0), e))
+    netlist.device("R1", R((1, 2), r1))
+    netlist.device("LM1", LM((2, 0, 3, 0), lmat))
+    netlist.device("R2", R((3, 0), r2))
+    netlist.trans(dt, 0.01)
+
+    device = netlist.devices["LM1"]
+    data = netlist.simulator.trans_data
+    currents = np.array([data[device.get_current_node(k)[0]]
+                         for k in range(2)])
+
+    # (Lmat/dt + R) * i = [e, 0] + Lmat/dt * i_old:
+
+    a = lmat / dt + np.diag((r1, r2))
+    i = np.zeros(2)
+    expected = np.zeros_like(currents)
+    for k in range(currents.shape[1]):
+        i = np.linalg.solve(a, np.array((e, 0.0)) + lmat.dot(i) / dt)
+        expected[:, k] = i
+
+    assert np.allclose(currents, expected, rtol=1e-9, atol=1e-12)
+
+
+def test_inductance_matrix_must_be_square():
+
+    with pytest.raises(ValueError):
+        LM((1, 0, 2, 0), [[1.0, 0.5]])
+
+    with pytest.raises(ValueError):
+        LM((1, 0), [[1.0, 0.5], [0.5, 1.0]])
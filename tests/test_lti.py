@@ -0,0 +1,150 @@
+"""Linear time-invariant system tests.
+"""
+
+import numpy as np
+import scipy.signal as signal
+
+from subcircuit.mathutils.lti import StateSpace, TransferFunction, LTIBatch, zoh
+from subcircuit.mathutils.lti import tf2ss, discretize_tf
+
+
+def oscillator(wn=10.0, zeta=0.1):
+
+    a = np.array([[0.0, 1.0], [-wn ** 2, -2.0 * zeta * wn]])
+    b = np.array([[0.0], [wn ** 2]])
+    c = np.array([[1.0, 0.0]])
+
+    return a, b, c
+
+
+def test_zoh_first_order_step_is_exact():
+
+    dt = 0.1
+    ss = StateSpace(np.array([[-1.0]]), np.array([[1.0]]),
+                    np.array([[1.0]]))
+
+    y = [ss.step(np.array([[1.0]]), dt, k * dt)[0, 0] for k in range(50)]
+    t = np.arange(1, 51) * dt
+
+    assert np.allclose(y, 1.0 - np.exp(-t), rtol=0.0, atol=1e-12)
+
+
+def test_zoh_matches_scipy():
+
+    a, b, c = oscillator()
+    ad, bd = zoh(a, b, 0.01)
+    expected = signal.cont2discrete((a, b, c, np.zeros((1, 1))), 0.01,
+                                    method="zoh")
+
+    assert np.allclose(ad, expected[0])
+    assert np.allclose(bd, expected[1])
+
+
+def test_zoh_is_stable_for_stiff_systems():
+
+    a = np.array([[-1e4, 0.0], [0.0, -1.0]])
+    b = np.ones((2, 1))
+    c = np.ones((1, 2))
+    u = np.array([[1.0]])
+
+    exact = StateSpace(a, b, c)
+    euler = StateSpace(a, b, c, method="euler")
+
+    for k in range(100):
+        y = exact.step(u, 0.01, k * 0.01)
+        e = euler.step(u, 0.01, k * 0.01)
+
+    assert np.isclose(y[0, 0], 1e-4 + (1.0 - np.exp(-1.0)))
+    assert abs(e[0, 0]) > 1e6
+
+
+def test_euler_method_is_forward_euler():
+
+    a, b, c = oscillator()
+    ss = StateSpace(a, b, c, method="euler")
+    u = np.array([[1.0]])
+
+    x = np.zeros((2, 1))
+    for k in range(20):
+        y = ss.step(u, 1e-3, k * 1e-3)
+        x = x + (a.dot(x) + b.dot(u)) * 1e-3
+
+    assert np.allclose(y, c.dot(x))
+
+
+def response(a, b, c, d, s):
+
+    return (c.dot(np.linalg.solve(s * np.eye(len(a)) - a, b)) + d)[0, 0]
+
+
+def test_tf2ss_matches_transfer_function():
+
+    # second order and non-monic, with a direct feedthrough term:
+
+    equation = "(3*s**2 + 2*s + 5) / (2*s**2 + 4*s + 8)"
+    a, b, c, d = tf2ss(equation)
+
+    for s in (0.0, 1j, 3.0 + 2j):
+        expected = (3 * s ** 2 + 2 * s + 5) / (2 * s ** 2 + 4 * s + 8)
+        assert np.isclose(response(a, b, c, d, s), expected)
+
+
+def test_tf2ss_is_cached_on_normalized_equation():
+
+    first = tf2ss("1 / (s + 1)")
+    second = tf2ss("1/(S + 1)")
+
+    assert all(x is y for x, y in zip(first, second))
+    assert not first[0].flags.writeable
+
+
+def test_transfer_function_uses_cached_discretization():
+
+    equation = "100 / (s**2 + 2*s + 100)"
+    tf = TransferFunction(equation)
+    tf.reset(1e-3)
+
+    ad, bd = discretize_tf(equation, 1e-3)
+    a, b, c, d = tf2ss(equation)
+    ss = StateSpace(a, b, c, d)
+
+    assert tf.ss.ad is ad
+    assert discretize_tf(equation, 1e-3)[0] is ad
+
+    u = np.array([[1.0]])
+    for k in range(100):
+        y = tf.step(u, 1e-3, k * 1e-3)
+        expected = ss.step(u, 1e-3, k * 1e-3)
+
+    assert np.allclose(y, expected, rtol=1e-12)
+
+
+def test_batch_matches_individual_systems():
+
+    equations = ["1 / (s + 1)", "100 / (s**2 + 2*s + 100)",
+                 "(s + 3) / (s + 2)", "5 / (s**3 + 3*s**2 + 3*s + 1)"]
+    dt = 1e-3
+    rng = np.random.RandomState(0)
+    u = rng.uniform(-1.0, 1.0, (200, len(equations)))
+
+    single = [StateSpace(*tf2ss(equation)) for equation in equations]
+    batched = [StateSpace(*tf2ss(equation)) for equation in equations]
+
+    # inputs in slots 0..3, outputs in slots 4..7 of the value array:
+
+    values = np.zeros(2 * len(equations))
+    n = len(equations)
+    batch = LTIBatch(batched, [[i] for i in range(n)],
+                     [[n + i] for i in range(n)], dt)
+
+    for k in range(len(u)):
+        values[:n] = u[k]
+        batch.step(values, dt)
+        expected = [ss.step(np.array([[u[k, i]]]), dt, k * dt)[0, 0]
+                    for i, ss in enumerate(single)]
+        assert np.allclose(values[n:], expected, rtol=1e-12, atol=1e-14)
+
+    # the system states are views into the batch state:
+
+    for ss, reference in zip(batched, single):
+        assert np.allclose(ss.x, reference.x)
@@ -0,0 +1,100 @@
+"""Model-order reduction (PRIMA) and reduced order model device tests.
+"""
+
+import numpy as np
+
+import subcircuit.mathutils.mor as mor
+
+
+def rc_ladder(n, r=1.0, c=1e-3, rload=10.0):
+
+    """Descriptor matrices of an RC ladder driven by a current into node 0
+    (g*x + c*dx/dt = b*i, v = b'*x).
+    """
+
+    g = np.zeros((n, n))
+    cm = np.zeros((n, n))
+    for k in range(n - 1):
+        g[k:k + 2, k:k + 2] += np.array([[1.0, -1.0], [-1.0, 1.0]]) / r
+    for k in range(n):
+        cm[k, k] = c
+    g[n - 1, n - 1] += 1.0 / rload
+    b = np.zeros((n, 1))
+    b[0, 0] = 1.0
+
+    return g, cm, b
+
+
+def impedance(g, c, b, s):
+
+    return b.T.dot(np.linalg.solve(g + s * c, b))
+
+
+def test_prima_matches_full_model_near_expansion_point():
+
+    g, c, b = rc_ladder(60)
+    gr, cr, br = mor.prima(g, c, b, 8)
+
+    for f in (0.0, 0.1, 1.0):
+        s = 2j * np.pi * f
+        assert np.allclose(impedance(gr, cr, br, s), impedance(g, c, b, s),
+                           rtol=1e-6)
+
+
+def test_prima_full_order_is_exact():
+
+    g, c, b = rc_ladder(12)
+    gr, cr, br = mor.prima(g, c, b, 12)
+
+    for f in (0.0, 100.0, 1e4):
+        s = 2j * np.pi * f
+        assert np.allclose(impedance(gr, cr, br, s), impedance(g, c, b, s),
+                           rtol=1e-8)
+
+
+def test_prima_congruence_keeps_passivity():
+
+    g, c, b = rc_ladder(40)
+    gr, cr, br = mor.prima(g, c, b, 6)
+
+    assert gr.shape == (6, 6)
+    assert np.allclose(gr, gr.T)
+    assert np.allclose(cr, cr.T)
+    assert np.linalg.eigvalsh(gr).min() > -1e-12
+    assert np.linalg.eigvalsh(cr).min() > -1e-12
+
+
+def test_reduced_line_matches_full_netlist():
+
+    from subcircuit.netlist import Netlist
+    from subcircuit.interfaces import Subckt
+    from subcircuit.stimuli import Sin
+    from subcircuit.devices.r import R
+    from subcircuit.devices.l import L
+    from subcircuit.devices.c import C
+    from subcircuit.devices.v import V
+    from subcircuit.devices.x import X
+
+    def line(order):
+        netlist = Netlist("line")
+        section = netlist.subckt("section", Subckt((1, 2)))
+        section.device("L", L((1, 2), 0.001))
+        section.device("C", C((2, 0), 0.0001))
+        netlist.device("V1", V((1, 0), Sin(0.0, 100.0, 60.0)))
+        names = []
+        for i in range(1, 21):
+            names.append("X{0}".format(i))
+            netlist.device(names[-1], X((i, i + 1), subckt="section"))
+        netlist.device("R1", R((21, 0), 5.0))
+        if order:
+            netlist.reduce("ROM1", *names, order=order)
+        netlist.trans(1e-4, 0.03)
+        return netlist.simulator.trans_data[netlist.nodes[21]], netlist
+
+    full, netlist0 = line(None)
+    exact, netlist1 = line(40)  # all the states of the line
+    reduced, netlist2 = line(20)
+
+    assert netlist2.nodenum < netlist0.nodenum
+    assert np.abs(exact - full).max() < 1e-6 * np.abs(full).max()
+    assert np.abs(reduced - full).max() < 0.01 * np.abs(full).max()
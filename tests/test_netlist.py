@@ -0,0 +1,302 @@
+"""Netlist assembly and solver tests.
+"""
+
+import numpy as np
+import pytest
+import scipy.sparse.linalg as sla
+
+from subcircuit.netlist import Netlist, SubCircuitError
+from subcircuit.stimuli import Sin
+from subcircuit.devices.r import R
+from subcircuit.devices.c import C
+from subcircuit.devices.l import L
+from subcircuit.devices.v import V
+from subcircuit.devices.i import I
+from subcircuit.devices.d import D
+
+
+def rc_netlist(r=2.0, c=1e-3, e=10.0):
+
+    netlist = Netlist("rc")
+    netlist.device("V1", V((1, 0), e))
+    netlist.device("R1", R((1, 2), r))
+    netlist.device("C1", C((2, 0), c))
+
+    return netlist
+
+
+def rc_backward_euler(r, c, e, dt, n):
+
+    a = dt / (r * c)
+    v = np.zeros(n)
+    x = 0.0
+    for i in range(n):
+        x = (x + a * e) / (1.0 + a)
+        v[i] = x
+
+    return v
+
+
+def ladder_netlist(sections=20):
+
+    netlist = Netlist("ladder")
+    netlist.device("V1", V((1, 0), Sin(0.0, 100.0, 60.0)))
+    for i in range(1, sections + 1):
+        netlist.device("L{0}".format(i), L((i, i + 1), 0.001))
+        netlist.device("C{0}".format(i), C((i + 1, 0), 0.0001))
+    netlist.device("R1", R((sections + 1, 0), 5.0))
+
+    return netlist
+
+
+def dense_stamp(netlist):
+
+    """Reference (original dense) assembly of the system matrix in node
+    index order.
+    """
+
+    n = netlist.nodenum
+    jac = np.zeros((n, n))
+    for device in netlist.mna_devices:
+        for pi, ni in device.port2node.items():
+            for pj, nj in device.port2node.items():
+                jac[ni, nj] += device.jac[pi, pj]
+
+    return jac[1:, 1:]
+
+
+def test_rc_step_matches_backward_euler():
+
+    netlist = rc_netlist()
+    netlist.trans(1e-4, 2e-3)
+
+    v = netlist.simulator.trans_data[netlist.nodes[2]]
+    expected = rc_backward_euler(2.0, 1e-3, 10.0, 1e-4, len(v))
+
+    assert np.allclose(v, expected, rtol=0.0, atol=1e-12)
+
+
+def test_sparse_stamp_matches_dense_stamp():
+
+    netlist = ladder_netlist()
+    netlist.start(1e-4)
+
+    p = netlist.perm
+    jac = dense_stamp(netlist)
+
+    assert sorted(p) == list(range(netlist.nodenum - 1))
+    assert np.allclose(netlist.sjac.toarray(), jac[np.ix_(p, p)])
+
+
+def test_reordering_reduces_bandwidth():
+
+    # devices added in random order number the nodes randomly:
+
+    rng = np.random.RandomState(0)
+    netlist = Netlist("shuffled")
+    netlist.device("V1", V((1, 0), 1.0))
+    for i in rng.permutation(np.arange(1, 41)):
+        netlist.device("R{0}".format(i), R((int(i), int(i) + 1), 1.0))
+        netlist.device("C{0}".format(i), C((int(i) + 1, 0), 1e-3))
+    netlist.start(1e-4)
+
+    rows, cols = netlist.sjac.nonzero()
+    original = np.abs(netlist.perm[rows] - netlist.perm[cols]).max()
+
+    assert np.abs(rows - cols).max() <= 2
+    assert original > 2
+
+
+def test_pattern_is_kept_between_steps():
+
+    netlist = ladder_netlist()
+    netlist.trans(1e-4, 1e-3)
+
+    indices = netlist.sjac.indices.copy()
+    indptr = netlist.sjac.indptr.copy()
+
+    netlist.step(1e-4, 1e-3)
+
+    assert np.array_equal(netlist.sjac.indices, indices)
+    assert np.array_equal(netlist.sjac.indptr, indptr)
+
+
+def test_low_rank_update_matches_refactor():
+
+    netlist = ladder_netlist()
+    netlist.start(1e-4)
+    netlist.stamp()
+
+    a = netlist.sjac.copy()
+    b = np.arange(1.0, a.shape[0] + 1.0)
+    netlist.solve(a, b)
+
+    # change the values of two rows of the factored matrix:
+
+    a = a.copy()
+    for row in (3, 7):
+        a.data[a.indices == row] *= 1.5
+
+    x = netlist.solve(a, b)
+
+    assert netlist.lu_update is not None
+    assert np.allclose(x, sla.spsolve(a.tocsc(), b))
+
+
+def test_floating_node_is_reported():
+
+    netlist = rc_netlist()
+    netlist.device("R2", R((3, 4), 1.0))
+
+    with pytest.raises(SubCircuitError, match="no path to ground"):
+        netlist.start(1e-4)
+
+
+def test_voltage_source_loop_is_reported():
+
+    netlist = rc_netlist()
+    netlist.device("V2", V((1, 0), 5.0))
+
+    with pytest.raises(SubCircuitError, match="structurally singular"):
+        netlist.start(1e-4)
+
+
+def test_lone_current_source_is_reported():
+
+    netlist = Netlist("isrc")
+    netlist.device("I1", I((1, 0), 1.0))
+
+    with pytest.raises(SubCircuitError):
+        netlist.start(1e-4)
+
+
+def test_current_sources_in_series_are_reported():
+
+    netlist = Netlist("isrc")
+    netlist.device("I1", I((0, 1), 1.0))
+    netlist.device("I2", I((1, 2), 1.0))
+    netlist.device("R1", R((2, 0), 1.0))
+
+    with pytest.raises(SubCircuitError, match="1 \\(I1, I2\\)"):
+        netlist.start(1e-4)
+
+
+def test_current_source_with_load_passes():
+
+    netlist = Netlist("isrc")
+    netlist.device("I1", I((1, 0), 2.0))
+    netlist.device("R1", R((1, 0), 3.0))
+    netlist.trans(1e-4, 1e-3)
+
+    v = netlist.simulator.trans_data[netlist.nodes[1]]
+
+    assert np.allclose(v, 6.0)
+
+
+def test_nonlinear_device_couples_its_ports():
+
+    # the diode stamps only in minor_step, but still connects node 2:
+
+    netlist = Netlist("rect")
+    netlist.device("V1", V((1, 0), 1.0))
+    netlist.device("D1", D((1, 2)))
+    netlist.device("R1", R((2, 0), 100.0))
+    netlist.trans(1e-4, 1e-3)
+
+    v = netlist.simulator.trans_data[netlist.nodes[2]]
+
+    assert 0.0 < v[-1] < 1.0
+
+
+def test_device_added_during_run_grows_data():
+
+    netlist = rc_netlist()
+
+    def hook(dt, t):
+        if "R2" not in netlist.devices and t >= 1e-3:
+            netlist.add_device("R2", R((2, 3), 1.0))
+
+    netlist.simulation_hook = hook
+    netlist.trans(1e-4, 2e-3)
+
+    data = netlist.simulator.trans_data
+    v2 = data[netlist.nodes[2]]
+    v3 = data[netlist.nodes[3]]
+
+    assert data.shape[0] == netlist.nodenum
+    assert np.allclose(v3[:10], 0.0)
+    assert np.allclose(v3[10:], v2[10:])  # no current in the dangling R2
+
+
+def test_set_value_patches_only_the_device_entries():
+
+    netlist = ladder_netlist()
+    netlist.start(1e-4)
+    netlist.stamp()
+
+    data = netlist.sjac.data.copy()
+    netlist.set_value("C5", 0.0002)
+    netlist.stamp()
+
+    device = netlist.devices["C5"]
+    rows = [netlist.perm.tolist().index(n - 1)
+            for n in device.port2node.values() if n]
+    changed = np.flatnonzero(netlist.sjac.data != data)
+
+    assert len(changed)
+    assert set(netlist.sjac.indices[changed]) <= set(rows)
+    assert np.allclose(netlist.sjac.toarray(),
+                       dense_stamp(netlist)[np.ix_(netlist.perm,
+                                                   netlist.perm)])
+
+
+def test_resume_matches_single_run():
+
+    expected = ladder_netlist()
+    expected.trans(1e-4, 4e-3)
+
+    netlist = ladder_netlist()
+    netlist.trans(1e-4, 2e-3)
+    netlist.trans(1e-4, 4e-3, resume=True)
+
+    assert np.allclose(netlist.simulator.trans_data,
+                       expected.simulator.trans_data, rtol=0.0, atol=1e-12)
+
+
+def test_resume_after_edit_keeps_device_state():
+
+    netlist = rc_netlist()
+    netlist.trans(1e-4, 1e-3)
+    netlist.set_value("R1", 4.0)
+    netlist.trans(1e-4, 2e-3, resume=True)
+
+    v = netlist.simulator.trans_data[netlist.nodes[2]]
+
+    # backward euler with the capacitor voltage carried over the edit:
+
+    a = rc_backward_euler(2.0, 1e-3, 10.0, 1e-4, 11)
+    x = a[-1]
+    b = np.zeros(len(v) - 11)
+    for i in range(len(b)):
+        x = (x + 1e-4 / 4e-3 * 10.0) / (1.0 + 1e-4 / 4e-3)
+        b[i] = x
+
+    assert np.allclose(v, np.concatenate((a, b)), rtol=0.0, atol=1e-12)
+
+
+def test_parallel_device_keeps_factorization():
+
+    netlist = ladder_netlist()
+    netlist.trans(1e-4, 1e-3)
+    lu = netlist.lu
+
+    netlist.add_device("R2", R((3, 0), 5.0))  # same nodes as C2
+
+    assert netlist.lu is lu
+
+    netlist.step(1e-4, 1.1e-3)
+
+    assert netlist.lu_update is not None
+    assert np.allclose(netlist.sjac.toarray(),
+                       dense_stamp(netlist)[np.ix_(netlist.perm,
+                                                   netlist.perm)])
@@ -0,0 +1,720 @@
+"""Quantized DEVS-LIM (qdl) solver tests.
+"""
+
+import numpy as np
+import pytest
+import scipy.linalg as sla
+
+import subcircuit.qdl as qdl
+
+
+class Ladder(qdl.Device):
+
+    """RLC ladder of n sections driven by a source atom, built from state
+    atoms with constant coefficients.
+    """
+
+    def __init__(self, name, n, l=1e-3, c=1e-3, r=0.1, g=0.01, e=1.0,
+                 dq=1e-3, atom_type=qdl.StateAtom, **source):
+
+        qdl.Device.__init__(self, name)
+
+        self.e = qdl.SourceAtom("e", u0=e, dq=dq, units="V", **source)
+        self.add_atom(self.e)
+
+        self.i = [atom_type("i{0}".format(k), coefficient=-r / l, dq=dq,
+                            units="A") for k in range(n)]
+        self.v = [atom_type("v{0}".format(k), coefficient=-g / c, dq=dq,
+                            units="V") for k in range(n)]
+
+        for k in range(n):
+            self.add_atoms(self.i[k], self.v[k])
+
+        def connect(atom, other, coefficient):
+            atom.add_connection(other, coefficient=coefficient)
+            atom.add_jacfunc(other, lambda device, *args: coefficient)
+
+        for k in range(n):
+            i, v = self.i[k], self.v[k]
+            i.add_jacfunc(i, lambda device, *args: -r / l)
+            v.add_jacfunc(v, lambda device, *args: -g / c)
+            if k:
+                connect(i, self.v[k - 1], 1.0 / l)
+            else:
+                i.add_connection(self.e, coefficient=1.0 / l)
+            connect(i, v, -1.0 / l)
+            connect(v, i, 1.0 / c)
+            if k + 1 < n:
+                connect(v, self.i[k + 1], -1.0 / c)
+
+
+def ladder_response(n, t, l=1e-3, c=1e-3, r=0.1, g=0.01, e=1.0):
+
+    """Exact response of the ladder states (i0, v0, i1, v1, ...) to the
+    constant source from rest, at the times t.
+    """
+
+    a = np.zeros((2 * n, 2 * n))
+    b = np.zeros(2 * n)
+    for k in range(n):
+        i, v = 2 * k, 2 * k + 1
+        a[i, i] = -r / l
+        a[i, v] = -1.0 / l
+        a[v, i] = 1.0 / c
+        a[v, v] = -g / c
+        if k:
+            a[i, v - 2] = 1.0 / l
+        if k + 1 < n:
+            a[v, i + 2] = -1.0 / c
+    b[0] = e / l
+
+    xf = -np.linalg.solve(a, b)
+
+    return np.array([xf - sla.expm(a * ti).dot(xf) for ti in t]).T
+
+
+def ladder_system(n=3, dq=1e-3, system_type=qdl.System, **kwargs):
+
+    system = system_type(dq=dq, dtmin=1e-12)
+    ladder = Ladder("ladder", n, dq=dq, **kwargs)
+    system.add_devices(ladder)
+    system.initialize(dt=1e-4)
+
+    return system, ladder
+
+
+def test_event_queue_matches_linear_scan():
+
+    rng = np.random.RandomState(0)
+    n = 50
+    queue = qdl.EventQueue(n)
+    times = [qdl._INF] * n
+
+    for k in range(2000):
+
+        key = rng.randint(n)
+        time = rng.uniform(0.0, 10.0)
+        queue.update(key, time)
+        times[key] = time
+
+        assert queue.peek() == min(times)
+
+        if k % 10 == 0:
+            now = rng.uniform(0.0, 2.0)
+            due = queue.pop_due(now)
+            expected = [i for i in range(n) if times[i] <= now]
+            assert sorted(due) == expected
+            assert [times[i] for i in due] == sorted(times[i] for i in due)
+            for i in due:
+                times[i] = qdl._INF  # popped until updated again
+
+    assert len(queue) == sum(1 for i in range(n) if queue.pos[i] >= 0)
+
+
+def test_event_queue_reinserts_popped_keys():
+
+    queue = qdl.EventQueue(3)
+    queue.update(0, 1.0)
+    queue.update(1, 2.0)
+    queue.update(2, 3.0)
+
+    assert queue.pop_due(2.0) == [0, 1]
+    assert queue.peek() == 3.0
+
+    queue.update(1, 0.5)  # back in the queue, now the earliest
+
+    assert queue.peek() == 0.5
+    assert queue.pop_due(10.0) == [1, 2]
+    assert queue.peek() == qdl._INF
+
+
+class SweepSystem(qdl.System):
+
+    """System that propagates triggers by sweeping all the atoms until none
+    is triggered (the update order before the worklist).
+    """
+
+    def propagate(self):
+
+        for k in range(qdl._MAXITER):
+            triggered = False
+            for atom in self.atoms:
+                if atom.triggered:
+                    triggered = True
+                    atom.update(self.time)
+            if not triggered:
+                break
+
+        self.worklist.clear()
+
+
+def test_worklist_matches_sweep():
+
+    system, ladder = ladder_system()
+    system.run(0.01, ode=False, verbose=False)
+
+    reference, expected = ladder_system(system_type=SweepSystem)
+    reference.run(0.01, ode=False, verbose=False)
+
+    assert not system.worklist
+    assert not any(atom.triggered for atom in system.atoms)
+
+    for atom, other in zip(ladder.i + ladder.v, expected.i + expected.v):
+        assert abs(atom.updates - other.updates) <= 0.01 * other.updates
+        q = np.interp(atom.tout, other.tout, other.qout)
+        assert np.abs(q - atom.qout).max() <= 2.0 * atom.dq
+
+
+def test_atom_store_keeps_values_when_attached():
+
+    atom = qdl.StateAtom("x", x0=2.0, dq=1e-3)
+    atom.qhi = 5.0
+
+    store = qdl.AtomStore()
+    store.append([0.0] * len(qdl.AtomStore.fields))
+    atom.attach(store)
+
+    assert atom.id == 1
+    assert atom.store is store
+    assert (atom.x, atom.q, atom.qhi, atom.dq) == (2.0, 2.0, 5.0, 1e-3)
+
+
+def test_atom_store_views_share_memory():
+
+    system, ladder = ladder_system()
+    atoms = ladder.i + ladder.v
+
+    assert [atom.id for atom in system.atoms] == list(range(len(system.atoms)))
+
+    x = system.store.view("x")
+    x[ladder.v[0].id] = 3.0
+    ladder.i[1].x = -4.0
+
+    assert ladder.v[0].x == 3.0
+    assert x[ladder.i[1].id] == -4.0
+
+    # save and restore work on the whole store:
+
+    system.save_state()
+    for atom in atoms:
+        atom.x = atom.q = 1.0
+    system.restore_state()
+
+    assert ladder.v[0].x == 3.0
+    assert np.allclose(system.store.view("qhi") - system.store.view("q"),
+                       system.store.view("dq"))
+
+
+def test_recorder_matches_row_lists():
+
+    rng = np.random.RandomState(0)
+    recorder = qdl.Recorder(chunk_size=7)
+    rows = []
+
+    for k in range(100):
+        row = (k * 0.1, int(rng.randint(5)), rng.uniform())
+        recorder.append(*row)
+        rows.append(row)
+        if k == 50:
+            block = [(5.05, 2, 1.0), (5.06, 4, 2.0)]
+            recorder.extend(*zip(*block))
+            rows.extend(block)
+
+    assert len(recorder) == len(rows)
+
+    time, atom, value = recorder.rows()
+    assert np.allclose(time, [row[0] for row in rows])
+    assert np.array_equal(atom, [row[1] for row in rows])
+    assert np.allclose(value, [row[2] for row in rows])
+
+    for i in range(6):
+        t, v = recorder.select(i)
+        assert np.allclose(t, [row[0] for row in rows if row[1] == i])
+        assert np.allclose(v, [row[2] for row in rows if row[1] == i])
+
+    recorder.append(20.0, 1, 9.0)  # select sees rows added later
+    assert recorder.select(1)[1][-1] == 9.0
+
+
+def test_decimated_and_window_recording():
+
+    system, ladder = ladder_system()
+    system.run(0.01, ode=False, verbose=False)
+    full = ladder.v[2]
+
+    for mode, kwargs in ((qdl.RecordMode.DECIMATED, {"record_every": 10}),
+                         (qdl.RecordMode.WINDOW,
+                          {"record_window": (0.002, 0.004)})):
+
+        def recording_system(dq=1e-3, dtmin=1e-12):
+            return qdl.System(dq=dq, dtmin=dtmin, record=mode, **kwargs)
+
+        other, ladder2 = ladder_system(system_type=recording_system)
+        other.run(0.01, ode=False, verbose=False)
+        atom = ladder2.v[2]
+
+        # same solution, fewer rows:
+
+        assert atom.q == full.q
+        assert len(atom.tout) < len(full.tout)
+        assert set(atom.tout) <= set(full.tout)
+
+        if mode == qdl.RecordMode.WINDOW:
+            t = full.tout
+            assert np.array_equal(atom.tout, t[(t >= 0.002) & (t <= 0.004)])
+
+
+def test_record_off_records_nothing():
+
+    def quiet_system(dq=1e-3, dtmin=1e-12):
+        return qdl.System(dq=dq, dtmin=dtmin, record=qdl.RecordMode.OFF)
+
+    system, ladder = ladder_system(system_type=quiet_system)
+    system.run(0.005, ode=True, verbose=False)
+
+    reference, expected = ladder_system()
+    reference.run(0.005, ode=True, verbose=False)
+
+    assert len(system.qss_out) == 0
+    assert len(system.ss_out) == 0
+    assert len(system.ode_out) == 0
+    assert len(reference.ode_out) > 0
+
+    for atom, other in zip(ladder.i + ladder.v, expected.i + expected.v):
+        assert atom.q == other.q
+        assert atom.updates_ode == other.updates_ode
+
+def test_qss2_output_is_linear_between_events():
+
+    t = np.linspace(0.0, 0.01, 2001)
+    exact = ladder_response(3, t)[5]
+
+    for atom_type in (qdl.Qss2StateAtom, qdl.Liqss2StateAtom):
+
+        system, ladder = ladder_system(atom_type=atom_type)
+        system.run(0.01, ode=False, verbose=False)
+        atom = ladder.v[2]
+
+        tout, qout = atom.hold()
+        foh = np.interp(t, tout, qout)
+        zoh = qout[np.searchsorted(tout, t, side="right") - 1]
+
+        # the lines add at most a quantum to the error at the events, while
+        # holding the event values is far off:
+
+        error = np.abs(qout - ladder_response(3, tout)[5]).max()
+
+        assert np.abs(foh - exact).max() < error + atom.dq
+        assert np.abs(zoh - exact).max() > 10.0 * np.abs(foh - exact).max()
+
+        with pytest.raises(TypeError):
+            atom.zoh()
+
+
+def test_first_order_output_is_held():
+
+    system, ladder = ladder_system()
+    system.run(0.01, ode=False, verbose=False)
+
+    atom = ladder.v[2]
+    t, q = atom.hold()
+
+    assert np.array_equal(t, atom.zoh()[0])
+    assert np.all(np.diff(t) >= 0.0)
+    assert np.all(q[:-1:2] == q[1::2])  # flat between the vertical steps
+
+
+class Bilinear(qdl.Device):
+
+    """Two states with state dependent coefficients:
+    dx/dt = -(1 + y^2)*x + (1 + x^2)*e, dy/dt = x - y.
+    """
+
+    def __init__(self, name, e=1.0):
+
+        qdl.Device.__init__(self, name)
+
+        self.e = qdl.SourceAtom("e", u0=e, dq=1e-3)
+        self.x = qdl.StateAtom("x", coeffunc=lambda dev: -1.0 - dev.y.q**2,
+                               dq=1e-3)
+        self.y = qdl.StateAtom("y", coefficient=-1.0, dq=1e-3)
+
+        self.add_atoms(self.e, self.x, self.y)
+
+        self.x.add_connection(self.e, coeffunc=lambda dev: 1.0 + dev.x.q**2)
+        self.y.add_connection(self.x, coefficient=1.0)
+
+
+def test_ode_matches_atom_derivatives():
+
+    rng = np.random.RandomState(0)
+
+    system, ladder = ladder_system()
+    f, jac = system.build_ode()
+
+    for k in range(5):
+        x = rng.uniform(-1.0, 1.0, system.n)
+        assert np.allclose(f(0.0, x), qdl.System.fode(0.0, x, system))
+        assert np.allclose(jac(0.0, x).toarray(),
+                           system.get_jacobian().toarray())
+
+
+def test_ode_reevaluates_coefficient_functions():
+
+    rng = np.random.RandomState(0)
+
+    system = qdl.System(dq=1e-3, dtmin=1e-12)
+    device = Bilinear("bilinear", e=2.0)
+    system.add_devices(device)
+    system.initialize(dt=1e-4)
+
+    f, jac = system.build_ode()
+
+    for k in range(5):
+        x = rng.uniform(-1.0, 1.0, system.n)
+        expected = qdl.System.fode(0.0, x, system)
+        assert np.allclose(f(0.0, x), expected)
+        assert np.isclose(jac(0.0, x)[0, 0], -1.0 - x[1]**2)
+
+
+def test_ode_evaluates_sources_at_t():
+
+    system, ladder = ladder_system(source_type=qdl.SourceType.SINE, ua=2.0,
+                                   freq=50.0)
+    f, jac = system.build_ode()
+    u, time = ladder.e.u, ladder.e.time
+
+    for t in (0.0, 0.003, 0.0125):
+        e = 1.0 + 2.0 * np.sin(2.0 * np.pi * 50.0 * t)
+        assert np.isclose(f(t, np.zeros(system.n))[0], e / 1e-3)
+
+    assert (ladder.e.u, ladder.e.time) == (u, time)  # source not touched
+
+
+def dense_jacobian(system):
+
+    """Reference (original dense) evaluation of the jacobian cells, where a
+    later registration overwrites an earlier one.
+    """
+
+    jacobian = np.zeros((system.n, system.n))
+    for atom in system.state_atoms:
+        for (other, func), value in zip(atom.jacfuncs,
+                                        atom.get_jacobian_row()):
+            jacobian[atom.index, other.index] = value
+
+    return jacobian
+
+
+def test_jacobian_matches_dense_cells():
+
+    system, ladder = ladder_system(n=4)
+
+    # register a cell twice and an extra one:
+
+    ladder.i[1].add_jacfunc(ladder.v[1], lambda device: 123.0)
+    ladder.v[3].add_jacfunc(ladder.i[0], lambda device: -7.0)
+    system.jacobian = None
+
+    jacobian = system.get_jacobian()
+
+    assert isinstance(jacobian, qdl.sparse.csr_matrix)
+    assert jacobian.has_sorted_indices
+    assert np.array_equal(jacobian.toarray(), dense_jacobian(system))
+    assert jacobian[ladder.i[1].index, ladder.v[1].index] == 123.0
+
+    pattern = system.jacobian
+    system.get_jacobian()
+
+    assert system.jacobian is pattern  # structure is cached between calls
+
+    system.add_devices(Ladder("other", 1))
+
+    assert system.jacobian is None
+    assert np.array_equal(system.get_jacobian().toarray(),
+                          dense_jacobian(system))
+
+
+class DiodeRC(qdl.Device):
+
+    """Capacitor charged through a resistor and clamped by a diode:
+    c*dv/dt = (e - v)/r - isat*(exp(v/vt) - 1).
+    """
+
+    def __init__(self, name, e=5.0, r=100.0, c=1e-6, isat=1e-12, vt=0.025):
+
+        qdl.Device.__init__(self, name)
+
+        self.v = qdl.StateAtom("v", dq=1e-3)
+        self.add_atom(self.v)
+
+        def derfunc(device, v):
+            return ((e - v) / r - isat * (np.exp(v / vt) - 1.0)) / c
+
+        def jacfunc(device):
+            return (-1.0 / r - isat / vt * np.exp(device.v.q / vt)) / c
+
+        self.v.derfunc = derfunc
+        self.v.add_jacfunc(self.v, jacfunc)
+
+
+def test_dc_matches_ladder_steady_state():
+
+    system, ladder = ladder_system(n=4)
+    xdc = system.solve_dc()
+
+    expected = ladder_response(4, [1e6])[:, 0]  # settled
+
+    assert np.allclose(xdc, expected, rtol=1e-9, atol=1e-12)
+    assert np.allclose([atom.x0 for atom in system.state_atoms], expected,
+                       rtol=1e-9, atol=1e-12)
+
+
+def test_newton_dc_matches_scalar_root():
+
+    from scipy.optimize import brentq
+
+    system = qdl.System(dq=1e-3, dtmin=1e-12)
+    device = DiodeRC("diode")
+    system.add_devices(device)
+    system.initialize(dt=1e-4)
+
+    def current(v):
+        return (5.0 - v) / 100.0 - 1e-12 * (np.exp(v / 0.025) - 1.0)
+
+    expected = brentq(current, 0.0, 5.0, xtol=1e-14)
+    x = system.solve_newton([0.0])
+
+    assert x is not None  # converged without the fsolve fallback
+    assert np.isclose(x[0], expected, rtol=1e-10)
+    assert np.isclose(system.solve_dc()[0], expected, rtol=1e-10)
+
+
+def ladder_error(ladder, **kwargs):
+
+    """Largest deviation of the quantized ladder states from the exact
+    response, at their events.
+    """
+
+    n = len(ladder.i)
+    error = 0.0
+    for k in range(n):
+        for j, atom in enumerate((ladder.i[k], ladder.v[k])):
+            exact = ladder_response(n, atom.tout, **kwargs)[2 * k + j]
+            error = max(error, np.abs(atom.qout - exact).max())
+
+    return error
+
+
+def ladder_events(ladder):
+
+    return sum(atom.updates for atom in ladder.i + ladder.v)
+
+
+def test_qss2_error_scales_with_quantum():
+
+    errors = []
+    for dq in (1e-3, 1e-4):
+        system, ladder = ladder_system(dq=dq, atom_type=qdl.Qss2StateAtom)
+        system.run(0.01, ode=False, verbose=False)
+        errors.append(ladder_error(ladder))
+        assert errors[-1] < 10.0 * dq
+
+    assert errors[0] > 5.0 * errors[1]
+
+    # more accurate than first order QSS with a 10x larger quantum, in far
+    # fewer events:
+
+    reference, expected = ladder_system(dq=1e-3)
+    reference.run(0.01, ode=False, verbose=False)
+
+    assert errors[1] < ladder_error(expected)
+    assert 5 * ladder_events(ladder) < ladder_events(expected)
+
+
+def ode_error(ladder):
+
+    """Largest deviation of the held quantized ladder states from the ODE
+    solution of the same run.
+    """
+
+    error = 0.0
+    for atom in ladder.i + ladder.v:
+        t, x = atom.sys.ode_out.select(atom.id)
+        error = max(error, np.abs(np.interp(t, *atom.hold()) - x).max())
+
+    return error
+
+
+def test_function_source_slope_drives_qss2():
+
+    omega = 2.0 * np.pi * 50.0
+
+    def sine(device, t):
+        return 1.0 + np.sin(omega * t)
+
+    system, ladder = ladder_system(atom_type=qdl.Qss2StateAtom,
+                                   source_type=qdl.SourceType.FUNCTION,
+                                   srcfunc=sine)
+
+    for t in (0.0, 0.001, 0.0123):
+        assert np.isclose(ladder.e.slope(t), omega * np.cos(omega * t),
+                          rtol=1e-6)
+
+    system.run(0.02, verbose=False)
+
+    assert ode_error(ladder) < 10.0 * ladder.e.dq
+
+    # a function ramp runs like the built-in ramp source:
+
+    results = []
+    for source in ({"source_type": qdl.SourceType.RAMP, "u1": 0.0,
+                    "u2": 1.0, "t1": 0.0, "t2": 0.01},
+                   {"source_type": qdl.SourceType.FUNCTION,
+                    "srcfunc": lambda device, t: min(t / 0.01, 1.0)}):
+        system, ladder = ladder_system(atom_type=qdl.Qss2StateAtom, **source)
+        system.run(0.02, verbose=False)
+        results.append((ladder_events(ladder), ode_error(ladder),
+                        [atom.q for atom in ladder.i + ladder.v]))
+
+    (events, error, q), (events2, error2, q2) = results
+
+    assert abs(events2 - events) < 0.05 * events
+    assert error2 < 5.0 * ladder.e.dq
+    assert np.allclose(q2, q, atol=2.0 * ladder.e.dq)
+
+def test_liqss2_settles_stiff_ladder_in_few_events():
+
+    # the shunt conductance puts the voltage poles at -g/c = -1e5 1/s, far
+    # faster than the LC dynamics:
+
+    g, tstop = 100.0, 0.02
+    final = ladder_response(3, [tstop], g=g)[:, 0]
+
+    events = []
+    for atom_type in (qdl.Qss2StateAtom, qdl.Liqss2StateAtom):
+        system, ladder = ladder_system(atom_type=atom_type, g=g)
+        system.run(tstop, ode=False, verbose=False)
+        events.append(ladder_events(ladder))
+
+    assert 10 * events[1] < events[0]
+    assert ladder_error(ladder, g=g) < 5.0 * ladder.i[0].dq
+
+    for k in range(3):
+        assert abs(ladder.i[k].q - final[2 * k]) < 2.0 * ladder.i[k].dq
+        assert abs(ladder.v[k].q - final[2 * k + 1]) < 2.0 * ladder.v[k].dq
+
+
+class Section(qdl.Device):
+
+    """One section of the ladder as its own device, fed by the atom inp
+    (the source or the previous section voltage).
+    """
+
+    def __init__(self, name, inp, l=1e-3, c=1e-3, r=0.1, g=0.01, dq=1e-3):
+
+        qdl.Device.__init__(self, name)
+
+        self.c = c
+        self.i = qdl.StateAtom("i", coefficient=-r / l, dq=dq, units="A")
+        self.v = qdl.StateAtom("v", coefficient=-g / c, dq=dq, units="V")
+        self.add_atoms(self.i, self.v)
+
+        self.i.add_connection(inp, coefficient=1.0 / l)
+        self.i.add_connection(self.v, coefficient=-1.0 / l)
+        self.v.add_connection(self.i, coefficient=1.0 / c)
+
+    def load(self, other):
+
+        self.v.add_connection(other.i, coefficient=-1.0 / self.c)
+
+
+def section_system(n=4, dq=1e-3):
+
+    system = qdl.System(dq=dq, dtmin=1e-12)
+
+    source = qdl.Device("source")
+    source.add_atom(qdl.SourceAtom("e", u0=1.0, dq=dq, units="V"))
+    system.add_devices(source)
+
+    sections = []
+    inp = source.atoms[0]
+    for k in range(n):
+        sections.append(Section("s{0}".format(k), inp, dq=dq))
+        inp = sections[k].v
+        if k:
+            sections[k - 1].load(sections[k])
+
+    system.add_devices(*sections)
+    system.initialize(dt=1e-4)
+
+    return system, [source] + sections
+
+
+def test_single_partition_matches_serial_run():
+
+    system, devices = section_system()
+    system.run(0.005, ode=False, verbose=False, partitions=1,
+               sync_window=1e-4)
+
+    reference, expected = section_system()
+    reference.run(0.005, ode=False, verbose=False)
+
+    for device, other in zip(devices[1:], expected[1:]):
+        for atom, ref in ((device.i, other.i), (device.v, other.v)):
+            assert np.array_equal(atom.tout, ref.tout)
+            assert np.array_equal(atom.qout, ref.qout)
+
+
+def test_partition_error_is_bounded_by_window():
+
+    n, tstop, dq = 4, 0.005, 1e-3
+    t = np.linspace(0.0, tstop, 501)
+
+    def held(devices):
+        return np.array([np.interp(t, *atom.hold())
+                         for device in devices[1:]
+                         for atom in (device.i, device.v)])
+
+    reference, devices = section_system(n, dq=dq)
+    reference.run(tstop, ode=False, verbose=False)
+    serial = held(devices)
+
+    # the cut is between sections 1 and 2, which exchange v1 and i2:
+
+    exact = ladder_response(n, t)
+    rate = np.abs(np.diff(exact[[3, 4]], axis=1) / np.diff(t)).max()
+
+    errors = []
+    for window in (1e-4, 1e-5):
+        system, devices = section_system(n, dq=dq)
+        system.run(tstop, ode=False, verbose=False,
+                   partitions=[devices[:3], devices[3:]], sync_window=window)
+        errors.append(np.abs(held(devices) - serial).max())
+
+        # the approximation error of the one window coupling lag:
+
+        assert errors[-1] < window * rate + 3.0 * dq
+
+    assert errors[0] > 5.0 * errors[1]
+
+
+def test_partitioned_run_needs_sync_window():
+
+    system, devices = section_system()
+
+    with pytest.raises(ValueError):
+        system.run(0.005, ode=False, verbose=False, partitions=2)
+
+    with pytest.raises(ValueError):
+        system.run_partitions(2, None)
+
+
+def test_partitioned_run_needs_fork(monkeypatch):
+
+    system, devices = section_system()
+    monkeypatch.setattr(qdl.mp, "get_all_start_methods", lambda: ["spawn"])
+
+    with pytest.raises(RuntimeError):
+        system.run(0.005, ode=False, verbose=False, partitions=2,
+                   sync_window=1e-4)
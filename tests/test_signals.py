@@ -0,0 +1,229 @@
+"""Signal device scheduling and stepping tests.
+"""
+
+import numpy as np
+import pytest
+
+from subcircuit.netlist import Netlist, SubCircuitError
+from subcircuit.devices.source import SignalSource
+from subcircuit.devices.sumnode import Sum
+from subcircuit.devices.tf import TF
+from subcircuit.devices.r import R
+from subcircuit.devices.v import V
+
+
+def test_levelize_orders_after_predecessors():
+
+    succ = [[2], [2], [3], []]
+    levels, remaining = Netlist.levelize(succ)
+
+    assert levels == [[0, 1], [2], [3]]
+    assert remaining == []
+
+
+def test_levelize_reports_unbroken_cycle():
+
+    succ = [[1], [2], [1]]
+
+    levels, remaining = Netlist.levelize(succ)
+    assert remaining == [1, 2]
+
+    levels, remaining = Netlist.levelize(succ, breaks=[2])
+    assert remaining == []
+    assert levels == [[0], [2], [1]]
+
+
+def test_chain_settles_in_one_step():
+
+    # devices added downstream first, so the insertion order is wrong:
+
+    netlist = Netlist("chain")
+    netlist.device("S3", Sum(("d", "c", 0, 0), signs=[2, 1, 1]))
+    netlist.device("S2", Sum(("c", "b", 0, 0), signs=[3, 1, 1]))
+    netlist.device("S1", Sum(("b", "a", "a", 0), signs=[1, 1, 1]))
+    netlist.device("A", SignalSource(("a",), 2.0))
+    netlist.start(1e-3)
+    netlist.step(1e-3, 0.0)
+
+    names = [[device.name for device in level]
+             for level in netlist.signal_schedule]
+
+    assert names == [["A"], ["S1"], ["S2"], ["S3"]]
+    assert netlist.devices["S3"].get_port_value(0) == 2.0 * 3.0 * 4.0
+
+
+def test_algebraic_loop_is_reported():
+
+    netlist = Netlist("loop")
+    netlist.device("A", SignalSource(("a",), 1.0))
+    netlist.device("S1", Sum(("b", "a", "c", 0)))
+    netlist.device("S2", Sum(("c", "b", 0, 0)))
+
+    with pytest.raises(SubCircuitError, match="Algebraic loop"):
+        netlist.start(1e-3)
+
+
+def test_loop_through_strictly_proper_tf_is_allowed():
+
+    # b = a - c with c = 1/(s+1) b is a first order lag with unity feedback:
+
+    dt = 1e-3
+    netlist = Netlist("feedback")
+    netlist.device("A", SignalSource(("a",), 1.0))
+    netlist.device("S1", Sum(("b", "a", 0, "c")))
+    netlist.device("TF1", TF(("b", "c"), "1 / (s + 1)"))
+    netlist.start(dt)
+
+    for i in range(8000):
+        netlist.step(dt, i * dt)
+
+    assert not netlist.devices["TF1"].feedthrough
+    assert np.isclose(netlist.devices["TF1"].get_port_value(1), 0.5,
+                      atol=1e-3)
+
+
+def test_sampled_devices_hold_between_hits():
+
+    dt, period = 1e-3, 1e-2
+    netlist = Netlist("multirate")
+    netlist.device("A", SignalSource(("a",), 1.0))
+    netlist.device("TF1", TF(("a", "b"), "1 / (s + 1)", sample_period=period))
+    netlist.device("TF2", TF(("a", "c"), "2 / (s + 1)", sample_period=period))
+    netlist.device("TF3", TF(("a", "d"), "1 / (s + 1)"))
+    netlist.start(dt)
+
+    b = []
+    c = []
+    d = []
+    for i in range(100):
+        netlist.step(dt, i * dt)
+        b.append(netlist.devices["TF1"].get_port_value(1))
+        c.append(netlist.devices["TF2"].get_port_value(1))
+        d.append(netlist.devices["TF3"].get_port_value(1))
+
+    # TF1 and TF2 step once per period (as one batch), with the period as
+    # their timestep; TF3 steps every dt:
+
+    assert any(batch is not None and p == period
+               for p, batch, others in netlist.signal_plan)
+
+    hits = np.arange(100) // 10 + 1
+    assert np.allclose(b, 1.0 - np.exp(-hits * period), rtol=1e-12)
+    assert np.allclose(c, 2.0 * (1.0 - np.exp(-hits * period)), rtol=1e-12)
+    assert np.allclose(d, 1.0 - np.exp(-np.arange(1, 101) * dt), rtol=1e-12)
+
+
+def rc_divider(netlist):
+
+    # an electrical circuit that needs Newton iterations alongside the
+    # signal devices:
+
+    netlist.device("V1", V((1, 0), 10.0))
+    netlist.device("R1", R((1, 2), 1.0))
+    netlist.device("R2", R((2, 0), 1.0))
+
+
+def test_sampled_devices_hold_in_mixed_netlist():
+
+    dt, period = 1e-3, 1e-2
+    netlist = Netlist("mixed")
+    rc_divider(netlist)
+    netlist.device("A", SignalSource(("a",), 1.0))
+    netlist.device("TF1", TF(("a", "b"), "1 / (s + 1)", sample_period=period))
+    netlist.device("TF2", TF(("a", "c"), "1 / (s + 1)"))
+    netlist.start(dt)
+
+    b = []
+    c = []
+    for i in range(30):
+        netlist.step(dt, i * dt)
+        b.append(netlist.devices["TF1"].get_port_value(1))
+        c.append(netlist.devices["TF2"].get_port_value(1))
+
+    # the signal devices only step in signal_step, once per (sampled) step,
+    # not in every Newton iteration of the electrical circuit:
+
+    hits = np.arange(30) // 10 + 1
+    assert np.isclose(netlist.across[netlist.nodes[2]], 5.0)
+    assert np.allclose(b, 1.0 - np.exp(-hits * period), rtol=1e-12)
+    assert np.allclose(c, 1.0 - np.exp(-np.arange(1, 31) * dt), rtol=1e-12)
+
+
+def test_batched_tfs_in_mixed_netlist_share_the_batch_state():
+
+    dt = 1e-3
+    netlist = Netlist("mixed")
+    rc_divider(netlist)
+    netlist.device("A", SignalSource(("a",), 1.0))
+    netlist.device("TF1", TF(("a", "b"), "1 / (s + 1)"))
+    netlist.device("TF2", TF(("a", "c"), "2 / (s + 2)"))
+    netlist.start(dt)
+
+    for i in range(20):
+        netlist.step(dt, i * dt)
+
+    batch = [batch for p, batch, others in netlist.signal_plan if batch][0]
+    tf1 = netlist.devices["TF1"]
+    tf2 = netlist.devices["TF2"]
+
+    assert np.isclose(tf1.get_port_value(1), 1.0 - np.exp(-20 * dt),
+                      rtol=1e-12)
+    assert np.isclose(tf2.get_port_value(1), 1.0 - np.exp(-40 * dt),
+                      rtol=1e-12)
+
+    # stepping a device on its own updates the batch state in place:
+
+    tf1.step(dt, 20 * dt)
+
+    for device in (tf1, tf2):
+        assert np.shares_memory(device.tf.ss.x, batch.x)
+        assert np.shares_memory(device.tf.ss.y, batch.y)
+
+    assert np.allclose(batch.x[:1], tf1.tf.ss.x)
+
+
+def test_chain_settles_in_one_step_in_mixed_netlist():
+
+    # as test_chain_settles_in_one_step, with a TF in the chain (which must
+    # step exactly once) and an electrical circuit in the same netlist:
+
+    dt = 1e-3
+    netlist = Netlist("chain")
+    rc_divider(netlist)
+    netlist.device("S2", Sum(("d", "c", 0, 0), signs=[3, 1, 1]))
+    netlist.device("TF1", TF(("b", "c"), "1 / (s + 1)"))
+    netlist.device("S1", Sum(("b", "a", "a", 0), signs=[1, 1, 1]))
+    netlist.device("A", SignalSource(("a",), 2.0))
+    netlist.start(dt)
+    netlist.step(dt, 0.0)
+
+    names = [[device.name for device in level]
+             for level in netlist.signal_schedule]
+
+    assert names == [["A"], ["S1"], ["TF1"], ["S2"]]
+    assert np.isclose(netlist.devices["S2"].get_port_value(0),
+                      3.0 * 4.0 * (1.0 - np.exp(-dt)), rtol=1e-12)
+
+
+def test_period_shorter_than_timestep_steps_every_hit():
+
+    dt, period = 1e-3, 2.5e-4
+    netlist = Netlist("multirate")
+    netlist.device("A", SignalSource(("a",), 1.0))
+    netlist.device("TF1", TF(("a", "b"), "1 / (s + 1)", sample_period=period))
+    netlist.device("TF2", TF(("a", "c"), "2 / (s + 2)", sample_period=period))
+    netlist.start(dt)
+
+    b = []
+    c = []
+    for i in range(20):
+        netlist.step(dt, i * dt)
+        b.append(netlist.devices["TF1"].get_port_value(1))
+        c.append(netlist.devices["TF2"].get_port_value(1))
+
+    # hits at 0, 0.25, 0.5, ... ms: 1 in the first step, then 4 per step,
+    # so no simulated time is dropped:
+
+    hits = 4 * np.arange(20) + 1
+    assert np.allclose(b, 1.0 - np.exp(-hits * period), rtol=1e-12)
+    assert np.allclose(c, 1.0 - np.exp(-2.0 * hits * period), rtol=1e-12)
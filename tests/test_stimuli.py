@@ -0,0 +1,138 @@
+"""Stimulus and lookup table tests.
+"""
+
+import numpy as np
+import pytest
+
+from subcircuit.interfaces import Table
+from subcircuit.stimuli import Pulse, Sin, Exp, Pwl, PwlFile
+
+
+def test_table_matches_interp_in_any_direction():
+
+    rng = np.random.RandomState(0)
+    xp = np.cumsum(rng.uniform(0.1, 1.0, 50))
+    yp = rng.uniform(-1.0, 1.0, 50)
+    table = Table(*zip(xp, yp))
+
+    sweep = np.linspace(xp[0] - 1.0, xp[-1] + 1.0, 2001)
+
+    for x in (sweep, sweep[::-1], rng.permutation(sweep)):
+        y = [table.output(xi) for xi in x]
+        assert np.allclose(y, np.interp(x, xp, yp), rtol=0.0, atol=1e-12)
+
+
+def test_table_vectorized_lookup():
+
+    table = Table((0.0, 0.0), (1.0, 2.0), (3.0, -2.0))
+    x = np.array([-1.0, 0.5, 2.0, 5.0])
+
+    y = table.output(x)
+
+    assert np.allclose(y, [0.0, 1.0, 0.0, -2.0])
+    assert np.allclose(y, [table.output(xi) for xi in x])
+
+
+def test_table_step_takes_the_new_value():
+
+    table = Table((0.0, 0.0), (1.0, 0.0), (1.0, 5.0), (2.0, 5.0))
+
+    assert table.output(0.999) == 0.0
+    assert table.output(1.0) == 5.0
+    assert table.output(1.5) == 5.0
+    assert table.output(0.5) == 0.0  # backwards across the step
+
+
+def stimuli():
+
+    return [Pulse(-1.0, 1.0, 1e-3, 2e-4, 3e-4, 2e-3, 5e-3),
+            Sin(0.5, 2.0, 250.0, td=1e-3, theta=0.01, phi=0.3),
+            Exp(0.0, 4.0, 1e-3, 5e-4, 4e-3, 1e-3),
+            Pwl((0.0, 0.0), (2e-3, 1.0), (2e-3, 3.0), (6e-3, -1.0))]
+
+
+def test_render_matches_step():
+
+    dt = 1e-4
+    t = np.arange(101) * dt
+
+    for stimulus in stimuli():
+        stimulus.start(dt)
+        expected = [stimulus.step(dt, ti) for ti in t]
+        assert np.allclose(stimulus.render(dt, t), expected, rtol=1e-12,
+                           atol=1e-12), stimulus
+
+
+def test_prerendered_value_matches_step():
+
+    dt = 1e-4
+    t = np.arange(101) * dt
+
+    for stimulus in stimuli():
+        stimulus.start(dt)
+        stimulus.prerender(dt, t)
+
+        on_grid = [stimulus.value(dt, ti) for ti in t]
+        off_grid = [stimulus.value(dt, ti + 0.5 * dt) for ti in t]
+        other_dt = [stimulus.value(dt / 2, ti) for ti in t]
+
+        assert np.array_equal(on_grid, stimulus.wave)
+        assert np.allclose(off_grid,
+                           [stimulus.step(dt, ti + 0.5 * dt) for ti in t])
+        assert np.allclose(other_dt, [stimulus.step(dt, ti) for ti in t])
+
+
+def pwl_file(tmpdir, samples):
+
+    filename = str(tmpdir.join("wave.npy"))
+    np.save(filename, np.array(samples, dtype=float))
+
+    return PwlFile(filename)
+
+
+def test_pwl_file_matches_pwl(tmpdir):
+
+    rng = np.random.RandomState(0)
+    times = np.cumsum(rng.uniform(1e-4, 1e-3, 500))
+    values = rng.uniform(-1.0, 1.0, 500)
+    samples = list(zip(times, values))
+
+    stimulus = pwl_file(tmpdir, samples)
+    reference = Pwl(*samples)
+
+    dt = 1e-4
+    t = np.arange(int(times[-1] / dt) + 20) * dt
+
+    stimulus.start(dt)
+    y = [stimulus.step(dt, ti) for ti in t]
+
+    assert np.allclose(y, reference.render(dt, t), rtol=0.0, atol=1e-12)
+    assert np.allclose(stimulus.render(dt, t), y, rtol=0.0, atol=1e-12)
+
+    stimulus.start(dt)  # backwards in time (cursor reset by bisection):
+    assert np.allclose([stimulus.step(dt, ti) for ti in t[::-1]], y[::-1])
+
+
+def test_pwl_file_repeated_time_is_a_step(tmpdir):
+
+    samples = [(0.0, 0.0), (1.0, 0.0), (1.0, 5.0), (2.0, 5.0), (2.0, 1.0)]
+    stimulus = pwl_file(tmpdir, samples)
+    stimulus.start(0.1)
+
+    t = np.array([-1.0, 0.5, 0.999, 1.0, 1.5, 2.0, 3.0])
+    expected = [0.0, 0.0, 0.0, 5.0, 5.0, 1.0, 1.0]
+
+    assert np.allclose([stimulus.step(0.1, ti) for ti in t], expected)
+    assert np.allclose(stimulus.render(0.1, t), expected)
+
+
+def test_pwl_file_rejects_bad_samples(tmpdir):
+
+    with pytest.raises(ValueError):
+        pwl_file(tmpdir, [(0.0, 1.0)])
+
+    with pytest.raises(ValueError):
+        pwl_file(tmpdir, [(0.0, 1.0), (2.0, 1.0), (1.0, 0.0)])
+
+    with pytest.raises(ValueError):
+        Pwl((0.0, 1.0), (2.0, 1.0), (1.0, 0.0))